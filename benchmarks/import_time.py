@@ -0,0 +1,61 @@
+"""
+BENCHMARK: IMPORT TIME
+------------------------
+Measure the wall time of importing the library (and its modules) in a fresh
+interpreter. Every measurement runs in a new subprocess, so nothing is cached
+in `sys.modules`. The median of all repetitions is reported.
+
+USAGE: python benchmarks/import_time.py [--repeat N] [statement ...]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+DEFAULT_STATEMENTS = [
+    "pass",
+    "import intelino.trainlib",
+    "from intelino.trainlib import enums, messages, exc",
+    "from intelino.trainlib.enums import SpeedLevel",
+    "from intelino.trainlib import Train",
+    "from intelino.trainlib import TrainScanner",
+]
+
+TIMER = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement: str, repeat: int) -> float:
+    """Median import time in seconds."""
+    timings = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", TIMER.format(statement=statement)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure library import time.")
+    parser.add_argument("statements", nargs="*", default=DEFAULT_STATEMENTS)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    width = max(len(statement) for statement in args.statements)
+    for statement in args.statements:
+        elapsed_ms = measure(statement, args.repeat) * 1000
+        print(f"{statement:<{width}}  {elapsed_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
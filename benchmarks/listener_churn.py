@@ -0,0 +1,103 @@
+"""
+BENCHMARK: LISTENER CHURN
+---------------------------
+Stress the event listener registry: mutator threads add and remove listeners
+in a tight loop while a dispatcher thread delivers events the way the train's
+event loop does (snapshot of the listeners, then call each of them). A stable
+listener is registered for the whole run, so it must receive every event.
+
+Reports the lost events, the errors of the mutators and the dispatcher, the
+mutation rate and the median dispatch time per event.
+
+USAGE: python benchmarks/listener_churn.py [--threads N] [--events N]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from intelino.trainlib.listeners import ListenerRegistry
+from intelino.trainlib.messages import EventId
+
+EVENT_ID = EventId.FRONT_COLOR_CHANGED
+# listeners every mutator cycles through
+LISTENERS_PER_THREAD = 20
+
+
+def run(threads: int, events: int) -> dict:
+    """Stress the registry and return the counters of the run."""
+    registry = ListenerRegistry()
+    received = [0]
+    errors = []
+    mutations = [0] * threads
+    stop = threading.Event()
+
+    def stable():
+        received[0] += 1
+
+    registry.add(EVENT_ID, stable)
+
+    def mutate(index: int):
+        listeners = [lambda: None for _ in range(LISTENERS_PER_THREAD)]
+        count = 0
+        while not stop.is_set():
+            listener = listeners[count % LISTENERS_PER_THREAD]
+            try:
+                registry.add(EVENT_ID, listener)
+                registry.remove(EVENT_ID, listener)
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+            count += 2
+        mutations[index] = count
+
+    mutators = [
+        threading.Thread(target=mutate, args=(index,)) for index in range(threads)
+    ]
+    for mutator in mutators:
+        mutator.start()
+
+    dispatch_times = []
+    start = time.perf_counter()
+    try:
+        for _ in range(events):
+            dispatched = time.perf_counter()
+            try:
+                for listener in registry.get(EVENT_ID):
+                    listener()
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+            dispatch_times.append(time.perf_counter() - dispatched)
+            # let the mutators run between the events
+            time.sleep(0)
+    finally:
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for mutator in mutators:
+            mutator.join()
+
+    return {
+        "lost": events - received[0],
+        "errors": errors,
+        "mutations_per_s": sum(mutations) / elapsed,
+        "dispatch_us": statistics.median(dispatch_times) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the listener registry.")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+
+    result = run(args.threads, args.events)
+    print(f"events          {args.events:10d}")
+    print(f"lost events     {result['lost']:10d}")
+    print(f"errors          {len(result['errors']):10d}")
+    for error in result["errors"][:3]:
+        print(f"  {error!r}")
+    print(f"mutations       {result['mutations_per_s']:10.0f} /s")
+    print(f"dispatch        {result['dispatch_us']:10.2f} us (median)")
+
+
+if __name__ == "__main__":
+    main()
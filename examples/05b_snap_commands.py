@@ -6,9 +6,9 @@ TOPIC: Color Snap Commands, Events
 SETUP: build any loop track and add WHITE-RED, WHITE-GREEN and WHITE-BLUE snap commands
 
 NOTES: This example shows how to disable the default snap command actions and 
-define custom behaviors. Snap command detection event notifications are used to trigger
-the custom actions. In this case, we simply update the top LED color based 
-on the second color of each detected snap command.
+define custom behaviors. Snap command patterns are used to trigger the custom
+actions. In this case, we simply update the top LED color based on the second
+color of each detected snap command.
 """
 
 from intelino.trainlib import TrainScanner, Train
@@ -20,20 +20,20 @@ from intelino.trainlib.enums import (
 from intelino.trainlib.messages import TrainMsgEventSnapCommandDetected
 
 
-def handle_snap_commands(train: Train, msg: TrainMsgEventSnapCommandDetected):
-    # Note: the `SnapColorValue` enum is imported as `C` for a shorter notation
-
-    if msg.colors == (C.WHITE, C.RED, C.BLACK, C.BLACK):
-        # exact match (the missing snaps are detected as black to length 4)
-        train.set_top_led_color(r=255, g=0, b=0)
+# Note: the `SnapColorValue` enum is imported as `C` for a shorter notation
+SNAP_PATTERNS = [
+    # exact match (the missing snaps are detected as black to length 4)
+    (C.WHITE, C.RED, C.BLACK, C.BLACK),
+    # exact match with implicit blacks
+    (C.WHITE, C.GREEN),
+    # partial / prefix match
+    (C.WHITE, C.BLUE, ...),
+]
 
-    elif msg.colors == (C.WHITE, C.GREEN):
-        # exact match with implicit blacks
-        train.set_top_led_color(r=0, g=255, b=0)
 
-    elif msg.colors.start_with(C.WHITE, C.BLUE):
-        # partial / prefix match
-        train.set_top_led_color(r=0, g=0, b=255)
+def handle_snap_commands(train: Train, msg: TrainMsgEventSnapCommandDetected):
+    # only called for the snap commands matching one of the patterns
+    train.set_top_led_color(*msg.colors[1].to_rgb_bytes())
 
 
 def main():
@@ -42,7 +42,8 @@ def main():
         # - built in snaps including split track snaps (so no random steering)
         # - custom snaps (starting with white-magenta)
         train.set_snap_command_execution(False)
-        train.add_snap_command_detection_listener(handle_snap_commands)
+        for pattern in SNAP_PATTERNS:
+            train.on_snap(pattern, handle_snap_commands)
 
         train.drive_at_speed_level(
             SpeedLevel.LEVEL2, MovementDirection.FORWARD, play_feedback=False
@@ -52,7 +53,8 @@ def main():
 
         # cleanup
         train.stop_driving()
-        train.remove_snap_command_detection_listener(handle_snap_commands)
+        for pattern in SNAP_PATTERNS:
+            train.off_snap(pattern, handle_snap_commands)
         train.set_snap_command_execution(True)
 
 
@@ -7,10 +7,12 @@ SETUP: no track needed
 
 NOTES: Easily connect to multiple trains and set their LEDs to the same randomly-picked color.
 You can set the `train_count` variable to the number of trains you have availble.
+The color changes are scheduled on a timeline, so all trains change at the same time.
 """
 import random
 import time
 from intelino.trainlib import TrainScanner
+from intelino.trainlib.timeline import Timeline
 
 
 def random_rgb_color():
@@ -31,13 +33,17 @@ def main():
 
     print("connected train count:", len(trains))
 
-    # set the same random color on all trains
-    for _ in range(10):
+    # set the same random color on all trains at the same time
+    timeline = Timeline()
+    for i in range(10):
         color = random_rgb_color()
         for train in trains:
-            train.set_top_led_color(*color)
-            train.set_headlight_color(front=color, back=color)
-        time.sleep(blink_delay)
+            timeline.at(i * blink_delay, train, "set_top_led_color", *color)
+            timeline.at(
+                i * blink_delay, train, "set_headlight_color", front=color, back=color
+            )
+    timeline.run()
+    time.sleep(blink_delay)
 
     print("disconnecting...")
 
@@ -18,10 +18,29 @@ two classes it is important from which package they are imported::
    from intelino.trainlib import TrainScanner, Train
 
 All other classes can be also imported from ``intelino.trainlib_async``.
+
+Both classes (and the re-exported modules :mod:`enums`, :mod:`messages` and
+:mod:`exc`) are imported lazily on first access, so importing the package
+alone does not load the async library, Rx or the Bluetooth backend.
 """
 
-from .train import Train
-from .train_scanner import TrainScanner
+from typing import TYPE_CHECKING
+
+from .helpers import lazy_attributes
+
+if TYPE_CHECKING:
+    from .train import Train
+    from .train_scanner import TrainScanner
 
 
 __version__ = "1.0.0"
+
+__all__ = ["Train", "TrainScanner"]
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    {
+        "Train": ".train",
+        "TrainScanner": ".train_scanner",
+    },
+)
@@ -0,0 +1,424 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Command-line fleet tool.
+
+Usage::
+
+    python3 -m intelino.trainlib scan
+    python3 -m intelino.trainlib monitor --count 3
+    python3 -m intelino.trainlib record events.jsonl --duration 60
+    python3 -m intelino.trainlib bench --samples 50
+    python3 -m intelino.trainlib calibrate --count 2
+    python3 -m intelino.trainlib gateway --count 3
+"""
+
+import argparse
+import asyncio
+import dataclasses
+from enum import Enum
+import json
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from . import TrainScanner, Train
+from .fleet import Fleet
+from .messages import EventId, SnapCommand, TrainMsgEvent, TrainMsgMovement
+
+
+def _connect(args: argparse.Namespace) -> List[Train]:
+    scanner = TrainScanner(timeout=args.timeout)
+    kwargs: Dict[str, Any] = {}
+    if args.adapter:
+        kwargs["adapter"] = args.adapter
+
+    if args.address:
+        return [
+            TrainScanner(address, timeout=args.timeout).get_train(**kwargs)
+            for address in args.address
+        ]
+
+    if args.count:
+        return scanner.get_trains(args.count, **kwargs)
+
+    return scanner.get_trains(at_most=args.at_most, **kwargs)
+
+
+def _disconnect(trains: List[Train]):
+    report = Fleet(trains).disconnect()
+    for train_id, reason in report.unclean.items():
+        print(f"{train_id} did not disconnect cleanly: {reason}", file=sys.stderr)
+
+
+def _percentile(values: Sequence[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, SnapCommand):
+        return [str(color) for color in value]
+    if isinstance(value, Enum):
+        return value.name
+    return value
+
+
+def _event_record(train: Train, msg: TrainMsgEvent) -> Dict[str, Any]:
+    record = {
+        "time": time.time(),
+        "train": train.id,
+        "event": type(msg).__name__,
+    }
+    for field in dataclasses.fields(msg):
+        if field.name != "raw_packet":
+            record[field.name] = _json_value(getattr(msg, field.name))
+    record["raw"] = str(msg.raw_packet)
+    return record
+
+
+def scan(args: argparse.Namespace) -> int:
+    """Stream discovered trains with their signal strength."""
+    # pylint: disable=import-outside-toplevel
+    from bleak import BleakScanner
+
+    seen: Dict[str, int] = {}
+
+    def on_detection(device, advertisement):
+        if not (device.name and device.name.lower().startswith("intelino")):
+            return
+        rssi = advertisement.rssi
+        if args.all or device.address not in seen:
+            print(f"{device.address} : {device.name} (RSSI {rssi})", flush=True)
+        seen[device.address] = rssi
+
+    async def run_scanner(kwargs: Dict[str, Any]):
+        async with BleakScanner(detection_callback=on_detection, **kwargs):
+            await asyncio.sleep(args.timeout)
+
+    async def run():
+        await asyncio.gather(
+            *(
+                run_scanner({"adapter": adapter} if adapter else {})
+                for adapter in (args.adapter or [None])
+            )
+        )
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+    print(f"Trains ({len(seen)})", file=sys.stderr)
+    return 0
+
+
+def monitor(args: argparse.Namespace) -> int:
+    """Print a live table of speed, direction and distance of the trains."""
+    trains = _connect(args)
+    clear = "\x1b[H\x1b[J" if sys.stdout.isatty() else ""
+
+    try:
+        while True:
+            lines = [f"{'ID':<20} {'NAME':<16} {'DIRECTION':<10} {'CM/S':>6} {'CM':>8}"]
+            for train in trains:
+                lines.append(
+                    f"{train.id:<20} {train.name:<16} {train.direction.name:<10} "
+                    f"{train.speed_cmps:>6.1f} {train.distance_cm:>8}"
+                )
+            print(clear + "\n".join(lines), flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _disconnect(trains)
+
+    return 0
+
+
+def record(args: argparse.Namespace) -> int:
+    """Write all events of the trains to a file as JSON lines."""
+    trains = _connect(args)
+    lock = threading.Lock()
+    count = 0
+
+    with open(args.output, "a", encoding="utf-8") as output:
+
+        def write_event(train: Train, msg: TrainMsgEvent):
+            nonlocal count
+            line = json.dumps(_event_record(train, msg))
+            with lock:
+                output.write(line + "\n")
+                count += 1
+
+        for train in trains:
+            for event_id in EventId:
+                train._add_listener(event_id, write_event)
+
+        try:
+            if args.duration:
+                time.sleep(args.duration)
+            else:
+                threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            _disconnect(trains)
+
+    print(f"Recorded {count} events to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _print_stats(label: str, values_ms: List[float]):
+    if not values_ms:
+        print(f"  {label:<28} no samples")
+        return
+    print(
+        f"  {label:<28} n={len(values_ms):<4} "
+        f"min={min(values_ms):7.2f} "
+        f"median={statistics.median(values_ms):7.2f} "
+        f"p95={_percentile(values_ms, 95):7.2f} "
+        f"max={max(values_ms):7.2f} ms"
+    )
+
+
+def _print_histogram(label: str, histogram: Dict[str, Any]):
+    if not histogram["count"]:
+        print(f"  {label:<28} no samples")
+        return
+    # the quantiles are bucket upper bounds (capped by the maximum)
+    p50 = min(histogram["p50"], histogram["max"]) * 1000
+    p95 = min(histogram["p95"], histogram["max"]) * 1000
+    print(
+        f"  {label:<28} n={histogram['count']:<4} "
+        f"mean={histogram['mean'] * 1000:7.2f} "
+        f"p50<={p50:6.2f} "
+        f"p95<={p95:6.2f} "
+        f"max={histogram['max'] * 1000:7.2f} ms"
+    )
+
+
+def _bench_notification_intervals(train: Train, duration: float) -> List[float]:
+    arrivals: List[float] = []
+
+    def on_message(msg):
+        if isinstance(msg, TrainMsgMovement):
+            arrivals.append(time.perf_counter())
+
+    async def subscribe():
+        return train._async_train.notifications.subscribe(on_message)
+
+    # the events (e.g. driving over snaps) meanwhile are dispatched to this
+    # listener, which records the notification-to-listener latency
+    def on_event(_train, _msg):
+        pass
+
+    train.add_front_color_change_listener(on_event)
+    train.add_back_color_change_listener(on_event)
+    train.add_snap_command_detection_listener(on_event)
+    subscription = train._schedule(subscribe()).result()
+    try:
+        time.sleep(duration)
+    finally:
+        subscription.dispose()
+        train.remove_front_color_change_listener(on_event)
+        train.remove_back_color_change_listener(on_event)
+        train.remove_snap_command_detection_listener(on_event)
+
+    return [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+
+
+def bench(args: argparse.Namespace) -> int:
+    """Measure command round trips and notification timing per train."""
+    trains = _connect(args)
+
+    try:
+        for train in trains:
+            writes: List[float] = []
+            round_trips: List[float] = []
+
+            for _ in range(args.samples):
+                start = time.perf_counter()
+                train.set_top_led_color(0, 0, 0)
+                writes.append((time.perf_counter() - start) * 1000)
+
+            for _ in range(args.samples):
+                start = time.perf_counter()
+                # single movement notification request (get once)
+                train.send_command_with_response(0xB7, [0x00])
+                round_trips.append((time.perf_counter() - start) * 1000)
+
+            intervals = _bench_notification_intervals(train, args.duration)
+
+            print(f"{train.id} ({train.name})")
+            _print_stats("command write", writes)
+            _print_stats("command round trip", round_trips)
+            _print_stats("notification interval", intervals)
+            if intervals:
+                jitter = statistics.pstdev(intervals)
+                print(f"  {'notification jitter':<28} stdev={jitter:.2f} ms")
+            _print_histogram(
+                "event to listener",
+                train.metrics.snapshot()["listener_start_delay"],
+            )
+    finally:
+        _disconnect(trains)
+
+    return 0
+
+
+def calibrate(args: argparse.Namespace) -> int:
+    """Measure and cache the speeds of the trains (on a free track)."""
+    # pylint: disable=import-outside-toplevel
+    from .calibration import DEFAULT_CACHE_PATH, SpeedProfileCache
+    from .calibration import calibrate as calibrate_train
+
+    cache = SpeedProfileCache(args.cache or DEFAULT_CACHE_PATH)
+    trains = _connect(args)
+
+    try:
+        for train in trains:
+            profile = calibrate_train(train)
+            cache.put(profile)
+
+            print(f"{train.id} ({train.name})")
+            for command, speed in sorted(profile.speeds.items()):
+                print(f"  {'command ' + str(command) + ' cm/s':<28} {speed:6.2f} cm/s")
+            for level, speed in sorted(profile.levels.items()):
+                print(f"  {'speed level ' + str(level):<28} {speed:6.2f} cm/s")
+        print(f"Saved to {cache.path}", file=sys.stderr)
+    finally:
+        _disconnect(trains)
+
+    return 0
+
+
+def gateway(args: argparse.Namespace) -> int:
+    """Own the train connections and serve them to local clients."""
+    # pylint: disable=import-outside-toplevel
+    from .gateway import DEFAULT_SOCKET_PATH, Gateway
+
+    trains = _connect(args)
+
+    try:
+        with Gateway(trains, args.socket or DEFAULT_SOCKET_PATH) as server:
+            print(f"Serving {len(trains)} trains at {server.path}", file=sys.stderr)
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _disconnect(trains)
+
+    return 0
+
+
+def _add_connection_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-a",
+        "--address",
+        action="append",
+        help="Bluetooth/UUID address of a train (can be repeated).",
+    )
+    parser.add_argument(
+        "-n", "--count", type=int, help="Exact number of trains to connect to."
+    )
+    parser.add_argument(
+        "--at-most", type=int, help="Connect to at most N trains (default: all)."
+    )
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python3 -m intelino.trainlib", description="intelino fleet tool."
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=5.0,
+        help="Discovery timeout in seconds (default: 5.0).",
+    )
+    parser.add_argument(
+        "--adapter",
+        action="append",
+        help="Bluetooth adapter to use (can be repeated to use several at once).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help=scan.__doc__)
+    scan_parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Print every advertisement, not only newly discovered trains.",
+    )
+    scan_parser.set_defaults(func=scan)
+
+    monitor_parser = subparsers.add_parser("monitor", help=monitor.__doc__)
+    _add_connection_arguments(monitor_parser)
+    monitor_parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Refresh interval in seconds (default: 0.5).",
+    )
+    monitor_parser.set_defaults(func=monitor)
+
+    record_parser = subparsers.add_parser("record", help=record.__doc__)
+    _add_connection_arguments(record_parser)
+    record_parser.add_argument("output", help="Output file (appended).")
+    record_parser.add_argument(
+        "-d", "--duration", type=float, help="Recording time in seconds."
+    )
+    record_parser.set_defaults(func=record)
+
+    bench_parser = subparsers.add_parser("bench", help=bench.__doc__)
+    _add_connection_arguments(bench_parser)
+    bench_parser.add_argument(
+        "-s",
+        "--samples",
+        type=int,
+        default=20,
+        help="Number of commands per measurement (default: 20).",
+    )
+    bench_parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        default=3.0,
+        help="Notification sampling time in seconds (default: 3.0). Events "
+        "meanwhile (e.g. driving over snaps) measure the listener latency.",
+    )
+    bench_parser.set_defaults(func=bench)
+
+    calibrate_parser = subparsers.add_parser("calibrate", help=calibrate.__doc__)
+    _add_connection_arguments(calibrate_parser)
+    calibrate_parser.add_argument(
+        "--cache", help="Profile cache file (default: in $XDG_CACHE_HOME)."
+    )
+    calibrate_parser.set_defaults(func=calibrate)
+
+    gateway_parser = subparsers.add_parser("gateway", help=gateway.__doc__)
+    _add_connection_arguments(gateway_parser)
+    gateway_parser.add_argument(
+        "--socket", help="Unix socket path (default: in $XDG_RUNTIME_DIR)."
+    )
+    gateway_parser.set_defaults(func=gateway)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Top LED animations driven by the travelled distance or the time.
+
+An animation is a color function of the distance (in cm) or the time (in
+seconds since the start). It runs on the train's event loop: a distance
+animation is evaluated when a movement notification arrives, a time
+animation every frame, both at most ``max_fps`` times per second, and the
+LED is written only when the color changes::
+
+    def rainbow(distance_cm: float):
+        r, g, b = colorsys.hsv_to_rgb(distance_cm % 100 / 100, 1, 1)
+        return int(255 * r), int(255 * g), int(255 * b)
+
+    train.start_led_animation(LedAnimation(rainbow))
+    ...
+    train.stop_led_animation()
+
+The color function is called on the event loop, so it must be fast and must
+not call the blocking train methods.
+"""
+
+from typing import Callable, Iterable, Optional, Tuple
+
+
+DISTANCE = "distance"
+TIME = "time"
+
+
+class LedAnimation:
+    """Color function of the distance or the time with a frame-rate limit."""
+
+    def __init__(
+        self,
+        color: Callable[[float], Iterable[int]],
+        by: str = DISTANCE,
+        max_fps: float = 10.0,
+    ):
+        """
+        Args:
+            color: Function returning the ``(r, g, b)`` color at a distance
+                in cm or at a time in seconds.
+            by (str): ``"distance"`` (:data:`DISTANCE`) or ``"time"``
+                (:data:`TIME`).
+            max_fps (float): Maximum number of evaluated frames per second.
+
+        Raises:
+            ValueError: If ``by`` or ``max_fps`` is invalid.
+        """
+        if by not in (DISTANCE, TIME):
+            raise ValueError(f"Unknown animation variable {by!r}!")
+        if max_fps <= 0:
+            raise ValueError("The frame rate must be positive!")
+
+        self.color = color
+        self.by = by
+        self.max_fps = max_fps
+
+        # number of evaluated frames and written colors
+        self.frames = 0
+        self.writes = 0
+
+        self.__last: Optional[Tuple[int, int, int]] = None
+
+    @property
+    def frame_interval_s(self) -> float:
+        return 1.0 / self.max_fps
+
+    def frame(self, x: float) -> Optional[Tuple[int, int, int]]:
+        """Evaluate a frame.
+
+        Returns:
+            The color to write, or ``None`` if it did not change.
+        """
+        self.frames += 1
+        r, g, b = (max(0, min(255, int(v))) for v in self.color(x))
+        color = (r, g, b)
+        if color == self.__last:
+            return None
+        self.__last = color
+        self.writes += 1
+        return color
+
+    def reset(self):
+        """Forget the last written color (the next frame is written)."""
+        self.__last = None
@@ -0,0 +1,234 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Per-train speed calibration.
+
+The trains accept whole cm/s speed commands, adjust them to their speed
+increment and drive the speed levels at unknown speeds, so the reported
+speed differs from the command. :func:`calibrate` drives a train at a range
+of commands and at the speed levels and measures the reported speeds. The
+:class:`SpeedProfile` then picks the command landing closest to a target
+speed, and the profiles are cached on disk by train id::
+
+    profile = load_or_calibrate(train)  # calibrates on the first run only
+    train.drive_at_speed(profile.command_for(40))
+
+    # feed-forward of the closed-loop speed control
+    train.start_speed_control(SpeedController(40, feed_forward=profile.command_for))
+
+Calibrate on a layout with enough free track for a few seconds of driving at
+every command (about 25 s in total with the defaults).
+"""
+
+from dataclasses import dataclass, field
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Sequence, Tuple
+
+from .enums import SpeedLevel
+
+if TYPE_CHECKING:
+    from .train import Train
+
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "intelino-trainlib",
+    "speed-profiles.json",
+)
+
+# commanded speeds measured by default (cm/s)
+DEFAULT_COMMANDS: Tuple[int, ...] = tuple(range(15, 76, 5))
+DEFAULT_LEVELS: Tuple[SpeedLevel, ...] = (
+    SpeedLevel.LEVEL1,
+    SpeedLevel.LEVEL2,
+    SpeedLevel.LEVEL3,
+)
+# whole cm/s commands accepted by the trains
+MIN_COMMAND_CMPS = 15
+MAX_COMMAND_CMPS = 75
+
+
+@dataclass
+class SpeedProfile:
+    """Measured speeds of a train."""
+
+    train_id: str
+    # commanded speed -> measured speed (cm/s)
+    speeds: Dict[int, float] = field(default_factory=dict)
+    # speed level -> measured speed (cm/s)
+    levels: Dict[int, float] = field(default_factory=dict)
+    # unix time of the calibration
+    calibrated: float = 0.0
+
+    def speed_at(self, command_cmps: float) -> float:
+        """Expected speed at a command (interpolated between the measured
+        commands, constant beyond them).
+
+        Raises:
+            ValueError: If the profile has no measured commands.
+        """
+        if not self.speeds:
+            raise ValueError(f"Speed profile of {self.train_id} is empty!")
+
+        points = sorted(self.speeds.items())
+        if command_cmps <= points[0][0]:
+            return points[0][1]
+        for (c0, s0), (c1, s1) in zip(points, points[1:]):
+            if command_cmps <= c1:
+                return s0 + (s1 - s0) * (command_cmps - c0) / (c1 - c0)
+        return points[-1][1]
+
+    def command_for(self, target_cmps: float) -> int:
+        """Command with the expected speed closest to the target.
+
+        Raises:
+            ValueError: If the profile has no measured commands.
+        """
+        return min(
+            range(MIN_COMMAND_CMPS, MAX_COMMAND_CMPS + 1),
+            key=lambda command: abs(self.speed_at(command) - target_cmps),
+        )
+
+    def level_speed(self, level: SpeedLevel) -> Optional[float]:
+        """Measured speed of a speed level (``None`` if not calibrated)."""
+        return self.levels.get(int(level))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "speeds": {str(c): s for c, s in sorted(self.speeds.items())},
+            "levels": {str(level): s for level, s in sorted(self.levels.items())},
+            "calibrated": self.calibrated,
+        }
+
+    @classmethod
+    def from_dict(cls, train_id: str, data: Dict[str, Any]) -> "SpeedProfile":
+        return cls(
+            train_id,
+            {int(c): float(s) for c, s in data.get("speeds", {}).items()},
+            {int(level): float(s) for level, s in data.get("levels", {}).items()},
+            float(data.get("calibrated", 0.0)),
+        )
+
+
+class SpeedProfileCache:
+    """Speed profiles of the trains in a JSON file keyed by the train id.
+
+    Every change rewrites the file atomically; an unreadable file is treated
+    as empty.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def __read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as source:
+                data = json.load(source)
+        except (OSError, ValueError):
+            return {}
+        trains = data.get("trains") if isinstance(data, dict) else None
+        return trains if isinstance(trains, dict) else {}
+
+    def __write(self, trains: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as output:
+            json.dump({"version": 1, "trains": trains}, output, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, train_id: str) -> Optional[SpeedProfile]:
+        with self.__lock:
+            data = self.__read().get(train_id)
+        return SpeedProfile.from_dict(train_id, data) if data else None
+
+    def put(self, profile: SpeedProfile):
+        with self.__lock:
+            trains = self.__read()
+            trains[profile.train_id] = profile.to_dict()
+            self.__write(trains)
+
+    def remove(self, train_id: str):
+        """Forget the profile of a train (to calibrate it again)."""
+        with self.__lock:
+            trains = self.__read()
+            if trains.pop(train_id, None) is not None:
+                self.__write(trains)
+
+
+def _measure(train: "Train", settle_s: float, measure_s: float) -> float:
+    clock = train.clock
+    clock.sleep(settle_s)
+    # mean of the reported speeds (one sample per movement notification
+    # interval at most)
+    samples = []
+    end = clock.time() + measure_s
+    while clock.time() < end:
+        samples.append(train.speed_cmps)
+        clock.sleep(0.05)
+    return sum(samples) / len(samples)
+
+
+def calibrate(
+    train: "Train",
+    commands: Iterable[int] = DEFAULT_COMMANDS,
+    levels: Sequence[SpeedLevel] = DEFAULT_LEVELS,
+    settle_s: float = 1.0,
+    measure_s: float = 0.5,
+) -> SpeedProfile:
+    """Measure the speeds of a train at the commands and the speed levels.
+
+    The train drives forward and stops at the end.
+
+    Args:
+        train: Connected train on a free track.
+        commands: Commanded speeds in cm/s (15-75).
+        levels: Speed levels.
+        settle_s: Time to reach a speed before measuring it.
+        measure_s: Time to average the reported speed over.
+
+    Raises:
+        ValueError: If ``settle_s`` is negative or ``measure_s`` is not
+            positive.
+    """
+    if settle_s < 0:
+        raise ValueError(f"settle_s must not be negative (got {settle_s})!")
+    if measure_s <= 0:
+        raise ValueError(f"measure_s must be positive (got {measure_s})!")
+
+    profile = SpeedProfile(train.id, calibrated=time.time())
+    try:
+        for command in commands:
+            train.drive_at_speed(command, play_feedback=False)
+            profile.speeds[int(command)] = _measure(train, settle_s, measure_s)
+        for level in levels:
+            train.drive_at_speed_level(level, play_feedback=False)
+            profile.levels[int(level)] = _measure(train, settle_s, measure_s)
+    finally:
+        train.stop_driving()
+    return profile
+
+
+def load_or_calibrate(
+    train: "Train", cache: Optional[SpeedProfileCache] = None, **kwargs
+) -> SpeedProfile:
+    """Cached profile of the train, calibrated (and cached) if missing.
+
+    Args:
+        train: Connected train.
+        cache: Profile cache (defaults to :data:`DEFAULT_CACHE_PATH`).
+        kwargs: Arguments of :func:`calibrate`.
+    """
+    cache = cache or SpeedProfileCache()
+    profile = cache.get(train.id)
+    if profile is None:
+        profile = calibrate(train, **kwargs)
+        cache.put(profile)
+    return profile
@@ -0,0 +1,347 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Clocks measuring the built-in waits and timeouts.
+
+The trains sleep (e.g. while decoupling a wagon) and enforce the command
+timeouts on a :class:`Clock`. The default :class:`SystemClock` uses the
+wall clock; a :class:`VirtualClock` runs on virtual time, so code waiting
+for seconds can be tested in milliseconds::
+
+    clock = VirtualClock(auto_advance=True)
+    set_clock(clock)
+    train.decouple_wagon()  # returns in milliseconds of real time
+
+A clock is set per train (``Train(..., clock=...)``) or process-wide with
+:func:`set_clock` for all trains without their own clock. The simulator
+(:mod:`trainlib.simulator`) drives a virtual clock with its simulated time.
+"""
+
+import abc
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+class Clock(abc.ABC):
+    """Time source of the waits and timeouts."""
+
+    @abc.abstractmethod
+    def time(self) -> float:
+        """Monotonic time in seconds."""
+
+    @abc.abstractmethod
+    def sleep(self, seconds: float) -> None:
+        """Block the calling thread."""
+
+    @abc.abstractmethod
+    async def sleep_async(self, seconds: float) -> None:
+        """Suspend the calling coroutine."""
+
+    @abc.abstractmethod
+    def acquire(self, lock: threading.Lock, timeout: Optional[float]) -> bool:
+        """Acquire a lock, giving up after the timeout (``None`` waits
+        forever)."""
+
+    @abc.abstractmethod
+    def result(
+        self, future: "concurrent.futures.Future[T]", timeout: Optional[float]
+    ) -> T:
+        """Result of a future.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the future is not done before
+                the timeout.
+        """
+
+    @abc.abstractmethod
+    async def wait_for(self, awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+        """Await with a timeout (like :func:`asyncio.wait_for`).
+
+        Raises:
+            asyncio.TimeoutError: If the awaitable is cancelled on timeout.
+        """
+
+
+class SystemClock(Clock):
+    """Wall clock (``time.monotonic``) with the standard blocking calls."""
+
+    def time(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    def acquire(self, lock: threading.Lock, timeout: Optional[float]) -> bool:
+        return lock.acquire(timeout=-1 if timeout is None else timeout)
+
+    def result(
+        self, future: "concurrent.futures.Future[T]", timeout: Optional[float]
+    ) -> T:
+        return future.result(timeout)
+
+    async def wait_for(self, awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+        return await asyncio.wait_for(awaitable, timeout)
+
+
+class _Timer:
+    __slots__ = ("deadline", "callback", "sleep", "cancelled")
+
+    def __init__(self, deadline: float, callback: Callable[[], None], sleep: bool):
+        self.deadline = deadline
+        self.callback = callback
+        # end of a sleep (a timeout guards real work instead)
+        self.sleep = sleep
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class VirtualClock(Clock):
+    """Clock advanced explicitly, independent of the wall clock.
+
+    Waits end when the clock is advanced past their deadlines with
+    :meth:`advance` (or by the simulator). With ``auto_advance`` the clock
+    jumps to the end of the next sleep by itself once nothing happened on the
+    clock for ``idle_s`` real seconds, i.e. when the threads are blocked on
+    virtual time. Timeouts do not trigger jumps, as they guard real work (a
+    command to a train); they expire when the clock passes them.
+    """
+
+    # real seconds between lock acquisition attempts
+    POLL_INTERVAL_S = 0.001
+
+    def __init__(
+        self, start: float = 0.0, auto_advance: bool = False, idle_s: float = 0.005
+    ):
+        """
+        Args:
+            start (float): Initial time in seconds.
+            auto_advance (bool): Jump to the next deadline when idle.
+            idle_s (float): Real time without activity before a jump.
+        """
+        self.auto_advance = auto_advance
+        self.idle_s = idle_s
+
+        self.__time = start
+        self.__condition = threading.Condition()
+        self.__timers: List[Tuple[float, int, _Timer]] = []
+        self.__sequence = itertools.count()
+        # activity counter for the idle detection
+        self.__generation = 0
+        self.__sleeping = 0
+        self.__jumper: Optional[threading.Thread] = None
+
+    def time(self) -> float:
+        return self.__time
+
+    @property
+    def sleeping(self) -> int:
+        """Number of sleeps (blocking and async) waiting for the clock."""
+        return self.__sleeping
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        """Earliest pending deadline (``None`` if there is none)."""
+        with self.__condition:
+            self.__prune()
+            return self.__timers[0][0] if self.__timers else None
+
+    def __prune(self):
+        while self.__timers and self.__timers[0][2].cancelled:
+            heapq.heappop(self.__timers)
+
+    def call_at(
+        self, deadline: float, callback: Callable[[], None], sleep: bool = False
+    ) -> _Timer:
+        """Run the callback (on the advancing thread) once the clock reaches
+        the deadline. The returned timer can be cancelled. ``auto_advance``
+        jumps to the deadlines of the ``sleep`` timers only."""
+        timer = _Timer(deadline, callback, sleep)
+        with self.__condition:
+            if deadline > self.__time:
+                heapq.heappush(self.__timers, (deadline, next(self.__sequence), timer))
+                self.__generation += 1
+                self.__condition.notify_all()
+                if self.auto_advance and self.__jumper is None:
+                    self.__jumper = threading.Thread(target=self.__jump, daemon=True)
+                    self.__jumper.start()
+                return timer
+        callback()
+        return timer
+
+    def advance_to(self, when: float) -> None:
+        """Move the clock forward to the time, running the due timers in
+        order of their deadlines."""
+        while True:
+            with self.__condition:
+                self.__prune()
+                if not self.__timers or self.__timers[0][0] > when:
+                    self.__time = max(self.__time, when)
+                    self.__generation += 1
+                    return
+                deadline, _, timer = heapq.heappop(self.__timers)
+                self.__time = max(self.__time, deadline)
+                self.__generation += 1
+            timer.callback()
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward by the duration."""
+        self.advance_to(self.__time + seconds)
+
+    def __jump(self):
+        with self.__condition:
+            generation = -1
+            while True:
+                if generation == self.__generation:
+                    deadline = min(
+                        (
+                            timer.deadline
+                            for _, _, timer in self.__timers
+                            if timer.sleep and not timer.cancelled
+                        ),
+                        default=None,
+                    )
+                    if deadline is not None:
+                        self.__condition.release()
+                        try:
+                            self.advance_to(deadline)
+                        finally:
+                            self.__condition.acquire()
+                generation = self.__generation
+                self.__condition.wait(self.idle_s if self.__timers else None)
+
+    def sleep(self, seconds: float) -> None:
+        done = threading.Event()
+        with self.__condition:
+            self.__sleeping += 1
+        try:
+            self.call_at(self.__time + seconds, done.set, sleep=True)
+            done.wait()
+        finally:
+            with self.__condition:
+                self.__sleeping -= 1
+
+    async def sleep_async(self, seconds: float) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(
+                    lambda: future.done() or future.set_result(None)
+                )
+            except RuntimeError:
+                # the loop is closed
+                pass
+
+        with self.__condition:
+            self.__sleeping += 1
+        timer = self.call_at(self.__time + seconds, wake, sleep=True)
+        try:
+            await future
+        finally:
+            timer.cancel()
+            with self.__condition:
+                self.__sleeping -= 1
+
+    def acquire(self, lock: threading.Lock, timeout: Optional[float]) -> bool:
+        if timeout is None:
+            return lock.acquire()
+        if lock.acquire(blocking=False):
+            return True
+
+        expired = threading.Event()
+        timer = self.call_at(self.__time + timeout, expired.set)
+        try:
+            while not expired.is_set():
+                if lock.acquire(timeout=self.POLL_INTERVAL_S):
+                    return True
+            return lock.acquire(blocking=False)
+        finally:
+            timer.cancel()
+
+    def result(
+        self, future: "concurrent.futures.Future[T]", timeout: Optional[float]
+    ) -> T:
+        if timeout is None:
+            return future.result()
+
+        finished = threading.Event()
+        timer = self.call_at(self.__time + timeout, finished.set)
+        future.add_done_callback(lambda _: finished.set())
+        try:
+            finished.wait()
+        finally:
+            timer.cancel()
+        if not future.done():
+            raise concurrent.futures.TimeoutError()
+        return future.result()
+
+    async def wait_for(self, awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+        if timeout is None:
+            return await awaitable
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        expired = loop.create_future()
+
+        def expire():
+            try:
+                loop.call_soon_threadsafe(
+                    lambda: expired.done() or expired.set_result(None)
+                )
+            except RuntimeError:
+                # the loop is closed
+                pass
+
+        # a timeout, not a sleep: auto_advance must not jump to it
+        timer = self.call_at(self.__time + timeout, expire)
+        try:
+            await asyncio.wait({task, expired}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # like asyncio.wait_for, a cancelled wait cancels the awaitable
+            task.cancel()
+            raise
+        finally:
+            timer.cancel()
+            expired.cancel()
+        if not task.done():
+            task.cancel()
+            raise asyncio.TimeoutError()
+        return task.result()
+
+
+_clock: Clock = SystemClock()
+
+
+def set_clock(clock: Optional[Clock]) -> Clock:
+    """Set (or reset with ``None``) the process-wide clock used by all trains
+    without their own clock.
+
+    Returns:
+        The previous clock.
+    """
+    global _clock
+    previous = _clock
+    _clock = clock or SystemClock()
+    return previous
+
+
+def get_clock() -> Clock:
+    return _clock
@@ -0,0 +1,69 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Cache of the settings applied to a train.
+
+Commands setting a device state (LEDs, snap command behavior) are skipped
+when the train already has the requested state, which saves the BLE link
+for the movement commands in loops re-sending the same values::
+
+    while True:
+        train.set_top_led_color(*color_at(train.distance_cm))  # mostly cached
+
+    train.set_top_led_color(255, 0, 0, force=True)  # always written
+"""
+
+from typing import Dict, Hashable, Optional
+
+
+TOP_LED = "top_led"
+HEADLIGHT = "headlight"
+SNAP_COMMAND_FEEDBACK = "snap_command_feedback"
+SNAP_COMMAND_EXECUTION = "snap_command_execution"
+
+
+class DeviceStateCache:
+    """Write-through cache of the last applied device settings of a train.
+
+    A setting is stored before its command is written (and dropped if the
+    write fails), so a command following an unfinished one is compared
+    with the state the train is going to have. The cache is used from the
+    train's event loop only.
+    """
+
+    def __init__(self):
+        self.__state: Dict[str, Hashable] = {}
+
+        # number of skipped and written commands
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, key: str, value: Hashable, force: bool = False) -> bool:
+        """Store a setting.
+
+        Returns:
+            Whether the command must be written (the setting changed, it is
+            unknown or ``force`` is set).
+        """
+        if not force and key in self.__state and self.__state[key] == value:
+            self.hits += 1
+            return False
+
+        self.__state[key] = value
+        self.misses += 1
+        return True
+
+    def get(self, key: str) -> Optional[Hashable]:
+        """Cached value of a setting (``None`` if unknown)."""
+        return self.__state.get(key)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Forget a setting or all of them (``None``)."""
+        if key is None:
+            self.__state.clear()
+        else:
+            self.__state.pop(key, None)
@@ -0,0 +1,24 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Exceptions of the blocking library (re-exported by :mod:`exc`)."""
+
+from intelino.trainlib_async.exc import TrainlibError
+
+
+class TrainTimeoutError(TrainlibError):
+    """A blocking call did not finish before its deadline. The command was
+    cancelled."""
+
+    pass
+
+
+class TrainRemoteError(TrainlibError):
+    """A remote train call failed (e.g. the connection to the process owning
+    the train was lost) or raised an exception unknown to this library."""
+
+    pass
@@ -0,0 +1,152 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Noise filtering of color sensor events.
+
+On worn track the color sensors flicker between colors, and every transition
+is reported as an event. A :class:`ColorEventFilter` set on a train drops
+such events before they are dispatched to the listeners::
+
+    train.color_event_filter = ColorEventFilter(min_dwell_s=0.05)
+"""
+
+import asyncio
+from typing import Callable, Dict, Optional
+
+from .clock import Clock, get_clock
+from .enums import ColorSensor, SnapColorValue
+from .messages import TrainMsgEventSensorColorChangedBase
+
+
+class _SensorState:
+    __slots__ = ("color", "distance_cm", "pending")
+
+    def __init__(self):
+        self.color: Optional[SnapColorValue] = None
+        self.distance_cm: Optional[float] = None
+        self.pending: Optional["asyncio.Task[None]"] = None
+
+
+class ColorEventFilter:
+    """Per-train filter of front and back color sensor events.
+
+    Every sensor is filtered independently:
+
+    * duplicate suppression drops a color equal to the last delivered color
+      of the sensor (e.g. A, A delivers A once; together with the dwell time
+      a flicker A, B, A shorter than ``min_dwell_s`` delivers A once),
+    * distance debounce drops colors reported less than ``min_distance_cm``
+      (by the train's odometer) after the last delivered color,
+    * minimum dwell time delays every color by ``min_dwell_s`` and drops it
+      if the sensor reports another color in the meantime.
+
+    The filter runs on the train's event loop thread. It is not shared
+    between trains; create one filter per train.
+    """
+
+    def __init__(
+        self,
+        min_dwell_s: float = 0.0,
+        min_distance_cm: float = 0.0,
+        suppress_duplicates: bool = True,
+    ):
+        """
+        Args:
+            min_dwell_s (float): Minimum time in seconds a color must be seen
+                before it is delivered. 0 delivers immediately.
+            min_distance_cm (float): Minimum travelled distance between two
+                delivered colors of a sensor. 0 disables the debounce.
+            suppress_duplicates (bool): Drop repeated colors.
+        """
+        self.min_dwell_s = min_dwell_s
+        self.min_distance_cm = min_distance_cm
+        self.suppress_duplicates = suppress_duplicates
+
+        # number of delivered and dropped events
+        self.passed = 0
+        self.dropped = 0
+
+        self.__sensors: Dict[ColorSensor, _SensorState] = {}
+
+    def process(
+        self,
+        msg: TrainMsgEventSensorColorChangedBase,
+        distance_cm: float,
+        deliver: Callable[[TrainMsgEventSensorColorChangedBase], None],
+        loop: asyncio.AbstractEventLoop,
+        clock: Optional[Clock] = None,
+    ) -> None:
+        """Deliver the event now, later (dwell time) or never.
+
+        Args:
+            msg: Color event.
+            distance_cm: Current distance of the train.
+            deliver: Listener dispatch.
+            loop: The running event loop (for the dwell timer).
+            clock: Clock of the dwell timer (the train's clock). Defaults to
+                the process-wide clock.
+        """
+        state = self.__sensors.get(msg.sensor)
+        if state is None:
+            state = self.__sensors[msg.sensor] = _SensorState()
+
+        if state.pending is not None:
+            # the sensor changed again before the previous color settled
+            state.pending.cancel()
+            state.pending = None
+            self.dropped += 1
+
+        if self.suppress_duplicates and msg.color == state.color:
+            self.dropped += 1
+            return
+
+        if (
+            self.min_distance_cm > 0
+            and state.distance_cm is not None
+            and abs(distance_cm - state.distance_cm) < self.min_distance_cm
+        ):
+            self.dropped += 1
+            return
+
+        if self.min_dwell_s > 0:
+            state.pending = loop.create_task(
+                self.__settle(clock or get_clock(), state, msg, distance_cm, deliver)
+            )
+        else:
+            self.__deliver(state, msg, distance_cm, deliver)
+
+    async def __settle(
+        self,
+        clock: Clock,
+        state: _SensorState,
+        msg: TrainMsgEventSensorColorChangedBase,
+        distance_cm: float,
+        deliver: Callable[[TrainMsgEventSensorColorChangedBase], None],
+    ):
+        await clock.sleep_async(self.min_dwell_s)
+        self.__deliver(state, msg, distance_cm, deliver)
+
+    def __deliver(
+        self,
+        state: _SensorState,
+        msg: TrainMsgEventSensorColorChangedBase,
+        distance_cm: float,
+        deliver: Callable[[TrainMsgEventSensorColorChangedBase], None],
+    ):
+        state.pending = None
+        state.color = msg.color
+        state.distance_cm = distance_cm
+        self.passed += 1
+        deliver(msg)
+
+    def reset(self):
+        """Forget the last colors and cancel the pending events (call it on
+        the train's event loop)."""
+        for state in self.__sensors.values():
+            if state.pending is not None:
+                state.pending.cancel()
+        self.__sensors.clear()
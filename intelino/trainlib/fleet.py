@@ -0,0 +1,256 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Group of trains controlled together.
+
+Starting trains one by one from a ``for`` loop staggers them by one command
+round trip each. :meth:`Fleet.start_together` and :meth:`Fleet.stop_together`
+stage the command on the event loop of every train first and release all of
+them at a single instant (``loop.call_at``), so the trains start (or stop)
+within a fraction of a millisecond of each other::
+
+    fleet = Fleet(TrainScanner().get_trains(3))
+    report = fleet.start_together(40)
+    print(f"skew {report.skew_s * 1000:.2f} ms")
+    ...
+    fleet.stop_together()
+
+:meth:`Fleet.disconnect` disconnects all trains at once under a global
+deadline, so an unresponsive train does not stall the shutdown of the
+others::
+
+    report = fleet.disconnect(deadline_s=3.0)
+    for train_id, reason in report.unclean.items():
+        print(f"{train_id} did not disconnect cleanly: {reason}")
+"""
+
+import asyncio
+import concurrent.futures
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterator,
+    List,
+    Sequence,
+    Union,
+)
+
+from .enums import MovementDirection, StopDrivingFeedbackType
+
+if TYPE_CHECKING:
+    from .train import Train
+
+
+# minimal time between staging the commands and releasing them
+BARRIER_MARGIN_S = 0.005
+# time for the disconnections to finish after force-stopping the event loops
+FORCE_STOP_GRACE_S = 0.5
+
+
+@dataclass
+class BarrierReport:
+    """Timing of a command released on many trains at once.
+
+    All times are ``time.monotonic`` seconds (the event loops' time).
+    """
+
+    barrier: float
+    # train id -> time the command was released on the train's event loop
+    released: Dict[str, float] = field(default_factory=dict)
+    # train id -> time the command was written to the train
+    completed: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def skew_s(self) -> float:
+        """Time between the first and the last train receiving the command."""
+        if not self.completed:
+            return 0.0
+        return max(self.completed.values()) - min(self.completed.values())
+
+    @property
+    def release_skew_s(self) -> float:
+        """Time between the first and the last release on the event loops."""
+        if not self.released:
+            return 0.0
+        return max(self.released.values()) - min(self.released.values())
+
+
+@dataclass
+class ShutdownReport:
+    """Result of disconnecting a fleet."""
+
+    # ids of the trains disconnected within the deadline
+    clean: List[str] = field(default_factory=list)
+    # train id -> reason of the unclean disconnection
+    unclean: Dict[str, str] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+
+class Fleet:
+    """Trains of this process commanded together (see :mod:`trainlib.fleet`)."""
+
+    def __init__(self, trains: Sequence["Train"]):
+        self.trains: List["Train"] = list(trains)
+
+    def __iter__(self) -> Iterator["Train"]:
+        return iter(self.trains)
+
+    def __len__(self) -> int:
+        return len(self.trains)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def start_together(
+        self,
+        speed_cmps: Union[int, float],
+        direction: MovementDirection = MovementDirection.FORWARD,
+        play_feedback: bool = True,
+    ) -> BarrierReport:
+        """Drive all trains at the speed (:meth:`Train.drive_at_speed`),
+        released at a single instant.
+
+        Raises:
+            TrainTimeoutError: If a command timed out (the other trains
+                started anyway).
+        """
+        return self.__together(
+            lambda train: train.aio.drive_at_speed(speed_cmps, direction, play_feedback)
+        )
+
+    def stop_together(
+        self,
+        play_feedback_type: StopDrivingFeedbackType = StopDrivingFeedbackType.MOVEMENT_STOP,
+    ) -> BarrierReport:
+        """Stop all trains (:meth:`Train.stop_driving`), released at a single
+        instant.
+
+        Raises:
+            TrainTimeoutError: If a command timed out (the other trains
+                stopped anyway).
+        """
+        return self.__together(lambda train: train.aio.stop_driving(play_feedback_type))
+
+    def __together(
+        self, command: Callable[["Train"], Coroutine[Any, Any, Any]]
+    ) -> BarrierReport:
+        staged: List[concurrent.futures.Future] = []
+        barriers: List["asyncio.Future[float]"] = []
+        done: List[concurrent.futures.Future] = []
+        report = BarrierReport(barrier=0.0)
+
+        async def stage(train: "Train", ready: concurrent.futures.Future):
+            barrier = asyncio.get_running_loop().create_future()
+            ready.set_result(barrier)
+            await barrier
+            report.released[train.id] = time.monotonic()
+            try:
+                await command(train)
+            finally:
+                report.completed[train.id] = time.monotonic()
+
+        # 1. stage a waiting coroutine on every event loop
+        started = time.monotonic()
+        for train in self.trains:
+            ready: concurrent.futures.Future = concurrent.futures.Future()
+            staged.append(ready)
+            done.append(train._schedule(stage(train, ready)))
+        for ready in staged:
+            barriers.append(ready.result())
+
+        # 2. release them all at one instant on the loops' own clocks
+        margin = max(BARRIER_MARGIN_S, 2 * (time.monotonic() - started))
+        report.barrier = time.monotonic() + margin
+        for train, barrier in zip(self.trains, barriers):
+            loop = train._event_loop
+            loop.call_soon_threadsafe(
+                lambda loop=loop, barrier=barrier: loop.call_at(
+                    report.barrier,
+                    lambda: barrier.done() or barrier.set_result(report.barrier),
+                )
+            )
+
+        errors = []
+        for future in done:
+            try:
+                future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        return report
+
+    def disconnect(self, deadline_s: float = 5.0) -> ShutdownReport:
+        """Disconnect all trains concurrently.
+
+        The event loops of the trains not disconnected within the deadline
+        are force-stopped, so the call returns within ``deadline_s`` plus
+        :data:`FORCE_STOP_GRACE_S`.
+
+        Args:
+            deadline_s: Deadline in seconds for the whole fleet.
+
+        Returns:
+            The trains disconnected cleanly and the reasons of the others.
+        """
+        start = time.monotonic()
+        deadline = start + deadline_s
+        report = ShutdownReport()
+        errors: Dict[str, str] = {}
+
+        def disconnect(train: "Train"):
+            try:
+                train.disconnect(max(0.0, deadline - time.monotonic()))
+            except Exception as error:  # pylint: disable=broad-except
+                errors[train.id] = repr(error)
+
+        workers = []
+        for train in self.trains:
+            # daemon threads: a stalled train must not block the process exit
+            worker = threading.Thread(
+                target=disconnect,
+                args=(train,),
+                name=f"trainlib-disconnect-{train.id}",
+                daemon=True,
+            )
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+        stalled = [worker.is_alive() for worker in workers]
+        for train, train_stalled in zip(self.trains, stalled):
+            if train_stalled:
+                train._force_stop()
+        grace = time.monotonic() + FORCE_STOP_GRACE_S
+        for worker, train_stalled in zip(workers, stalled):
+            if train_stalled:
+                worker.join(max(0.0, grace - time.monotonic()))
+
+        for train, worker, train_stalled in zip(self.trains, workers, stalled):
+            if train._loop_running:
+                report.unclean[train.id] = "disconnect stalled, event loop running"
+            elif worker.is_alive():
+                report.unclean[train.id] = "disconnect stalled, event loop stopped"
+            elif train.id in errors:
+                report.unclean[train.id] = errors[train.id]
+            elif train_stalled:
+                report.unclean[train.id] = "disconnect timed out"
+            else:
+                report.clean.append(train.id)
+        report.elapsed_s = time.monotonic() - start
+        return report
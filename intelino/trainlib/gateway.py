@@ -0,0 +1,148 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Local gateway owning the train connections.
+
+The gateway connects to the trains once and serves any number of local
+client processes over a Unix socket. Clients attach without scanning or
+connecting, get :class:`~intelino.trainlib.remote.RemoteTrain` proxies and
+all receive the telemetry and events of the trains.
+
+Running the gateway::
+
+    python3 -m intelino.trainlib gateway --count 3
+
+Attaching from another process::
+
+    with gateway.connect() as client:
+        for train in client.trains:
+            train.drive_at_speed(40)
+"""
+
+import os
+import socket
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from .remote import SocketChannel, TrainClient, TrainHost
+
+if TYPE_CHECKING:
+    from .train import Train
+
+
+DEFAULT_SOCKET_PATH = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir()),
+    "intelino-trainlib.sock",
+)
+
+
+class Gateway:
+    """Serve connected trains to local clients over a Unix socket.
+
+    The socket is accessible only by the owner (mode ``0600``). The gateway
+    does not own the trains; disconnect them after :meth:`close`.
+    """
+
+    def __init__(self, trains: Iterable["Train"], path: str = DEFAULT_SOCKET_PATH):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__channels: List[SocketChannel] = []
+        self.__thread: Optional[threading.Thread] = None
+
+        if os.path.exists(path):
+            # stale socket of a gateway that did not exit cleanly
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+            else:
+                probe.close()
+                raise OSError(f"A gateway is already running at {path}!")
+
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            self.__socket.bind(path)
+        finally:
+            os.umask(umask)
+        self.__socket.listen()
+        self.__host = TrainHost(trains)
+
+    @property
+    def trains(self) -> List["Train"]:
+        return self.__host.trains
+
+    def serve_forever(self):
+        """Accept clients until :meth:`close` is called (blocking)."""
+        while True:
+            try:
+                sock, _ = self.__socket.accept()
+            except OSError:
+                break
+
+            channel = SocketChannel(sock)
+            with self.__lock:
+                self.__channels.append(channel)
+            threading.Thread(
+                target=self.__serve_client, args=(channel,), daemon=True
+            ).start()
+
+    def __serve_client(self, channel: SocketChannel):
+        try:
+            self.__host.serve(channel)
+        finally:
+            with self.__lock:
+                self.__channels.remove(channel)
+
+    def start(self):
+        """Accept clients in a background thread."""
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        """Stop accepting clients, disconnect the current ones and remove the
+        socket."""
+        try:
+            self.__socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.__socket.close()
+        if self.__thread is not None:
+            self.__thread.join()
+
+        with self.__lock:
+            channels = list(self.__channels)
+        for channel in channels:
+            channel.close()
+
+        self.__host.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def connect(path: str = DEFAULT_SOCKET_PATH) -> TrainClient:
+    """Attach to a running gateway.
+
+    Raises:
+        OSError: If no gateway is running at the path.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return TrainClient(SocketChannel(sock))
@@ -5,4 +5,92 @@
 # BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
 # THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
 
-"""Not used yet."""
+"""Internal helpers."""
+
+import importlib
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def lazy_attributes(
+    module_name: str, attributes: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Create module level ``__getattr__`` and ``__dir__`` functions (PEP 562)
+    importing the given attributes on first access.
+
+    Args:
+        module_name (str): ``__name__`` of the module using the functions.
+        attributes (dict): Attribute name to (relative) module name mapping.
+    """
+    module_globals = vars(importlib.import_module(module_name))
+
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+        module = importlib.import_module(
+            attributes[name], module_globals["__package__"]
+        )
+        value = getattr(module, name)
+        # cache it, so __getattr__ is called only once per attribute
+        module_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(module_globals) | set(attributes))
+
+    return __getattr__, __dir__
+
+
+def lazy_reexport(
+    module_name: str, source_name: str, attributes: Optional[Dict[str, str]] = None
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Create module level ``__getattr__`` and ``__dir__`` functions (PEP 562)
+    re-exporting all public names of the source module, which is imported on
+    first attribute access.
+
+    Args:
+        module_name (str): ``__name__`` of the module using the functions.
+        source_name (str): Absolute name of the re-exported module.
+        attributes (dict): Additional attribute name to (relative) module
+            name mapping.
+    """
+    module_globals = vars(importlib.import_module(module_name))
+    extra_attributes = attributes or {}
+
+    def source() -> ModuleType:
+        return importlib.import_module(source_name)
+
+    def public_names() -> List[str]:
+        names = [name for name in dir(source()) if not name.startswith("_")]
+        return names + list(extra_attributes)
+
+    def __getattr__(name: str) -> Any:
+        if name == "__all__":
+            # used by `from module import *`
+            return public_names()
+
+        if name.startswith("_"):
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+        try:
+            if name in extra_attributes:
+                module = importlib.import_module(
+                    extra_attributes[name], module_globals["__package__"]
+                )
+            else:
+                module = source()
+            value = getattr(module, name)
+        except AttributeError:
+            raise AttributeError(
+                f"module {module_name!r} has no attribute {name!r}"
+            ) from None
+
+        # cache it, so __getattr__ is called only once per attribute
+        module_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(module_globals) | set(public_names()))
+
+    return __getattr__, __dir__
@@ -0,0 +1,227 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Event listener API shared by the blocking train classes."""
+
+import abc
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Sequence, Tuple
+
+from .messages import (
+    EventId,
+    TrainMsgEventBackColorChanged,
+    TrainMsgEventButtonPressDetected,
+    TrainMsgEventFrontColorChanged,
+    TrainMsgEventLowBattery,
+    TrainMsgEventMovementDirectionChanged,
+    TrainMsgEventSnapCommandDetected,
+    TrainMsgEventSnapCommandExecuted,
+    TrainMsgEventSplitDecision,
+)
+
+if TYPE_CHECKING:
+    from .sequences import ColorSequence, ColorSequenceMatch
+    from .train import Train
+
+
+class ListenerRegistry:
+    """Copy-on-write registry of event listeners.
+
+    Every event id maps to an immutable tuple of listeners. Mutators build a
+    new tuple under a lock and swap it in, so the dispatch on the event loop
+    thread reads a consistent snapshot without locking, even while other
+    threads add or remove listeners.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__listeners: Dict[EventId, Tuple[Callable, ...]] = {}
+
+    def add(self, event_id: EventId, listener: Callable):
+        with self.__lock:
+            current = self.__listeners.get(event_id, ())
+            if listener not in current:
+                self.__listeners[event_id] = current + (listener,)
+
+    def remove(self, event_id: EventId, listener: Callable):
+        """Remove a listener. Raises ``KeyError`` if it is not registered."""
+        with self.__lock:
+            current = self.__listeners.get(event_id, ())
+            if listener not in current:
+                raise KeyError(listener)
+            self.__listeners[event_id] = tuple(
+                func for func in current if func != listener
+            )
+
+    def get(self, event_id: EventId) -> Tuple[Callable, ...]:
+        """Snapshot of the listeners of an event (lock-free)."""
+        return self.__listeners.get(event_id, ())
+
+
+class TrainEventListeners(abc.ABC):
+    """Typed ``add_*_listener`` / ``remove_*_listener`` methods.
+
+    Listeners are called as ``listener(train, msg)``. Subclasses store and
+    dispatch them in :meth:`_add_listener` and :meth:`_remove_listener`
+    (and similarly the snap patterns and color sequences).
+    """
+
+    @abc.abstractmethod
+    def _add_listener(self, event_id: EventId, listener: Callable):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _remove_listener(self, event_id: EventId, listener: Callable):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _add_snap_pattern(self, pattern: Sequence, listener: Callable):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _remove_snap_pattern(self, pattern: Sequence, listener: Callable):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _add_color_sequence(self, sequence: "ColorSequence", listener: Callable):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _remove_color_sequence(self, sequence: "ColorSequence", listener: Callable):
+        raise NotImplementedError()
+
+    def add_movement_direction_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventMovementDirectionChanged], None]
+    ):
+        self._add_listener(EventId.MOVEMENT_DIRECTION_CHANGED, listener)
+
+    def remove_movement_direction_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventMovementDirectionChanged], None]
+    ):
+        self._remove_listener(EventId.MOVEMENT_DIRECTION_CHANGED, listener)
+
+    def add_low_battery_listener(
+        self, listener: Callable[["Train", TrainMsgEventLowBattery], None]
+    ):
+        self._add_listener(EventId.LOW_BATTERY, listener)
+
+    def remove_low_battery_listener(
+        self, listener: Callable[["Train", TrainMsgEventLowBattery], None]
+    ):
+        self._remove_listener(EventId.LOW_BATTERY, listener)
+
+    def add_button_press_listener(
+        self, listener: Callable[["Train", TrainMsgEventButtonPressDetected], None]
+    ):
+        self._add_listener(EventId.BUTTON_PRESS_DETECTED, listener)
+
+    def remove_button_press_listener(
+        self, listener: Callable[["Train", TrainMsgEventButtonPressDetected], None]
+    ):
+        self._remove_listener(EventId.BUTTON_PRESS_DETECTED, listener)
+
+    def add_snap_command_detection_listener(
+        self, listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None]
+    ):
+        self._add_listener(EventId.SNAP_COMMAND_DETECTED, listener)
+
+    def remove_snap_command_detection_listener(
+        self, listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None]
+    ):
+        self._remove_listener(EventId.SNAP_COMMAND_DETECTED, listener)
+
+    def on_snap(
+        self,
+        pattern: Sequence,
+        listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None],
+    ):
+        """Call the listener only for detected snap commands matching the
+        pattern (see :mod:`trainlib.snaps`).
+
+        Example:
+            Note: :class:`SnapColorValue` is imported as ``C`` in this example.
+
+            >>> # exact match with implicit blacks
+            >>> train.on_snap((C.WHITE, C.GREEN), handle_green)
+            >>> # prefix match
+            >>> train.on_snap((C.WHITE, C.BLUE, ...), handle_blue)
+            >>> # wildcard (any color on the second position)
+            >>> train.on_snap((C.WHITE, ANY, C.RED), handle_any_red)
+
+        Raises:
+            ValueError: If the pattern is longer than 4 colors.
+        """
+        self._add_snap_pattern(pattern, listener)
+
+    def off_snap(
+        self,
+        pattern: Sequence,
+        listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None],
+    ):
+        """Remove a listener registered with :meth:`on_snap`."""
+        self._remove_snap_pattern(pattern, listener)
+
+    def add_color_sequence_listener(
+        self,
+        sequence: "ColorSequence",
+        listener: Callable[["Train", "ColorSequenceMatch"], None],
+    ):
+        """Call the listener whenever the color sensors report the sequence
+        (see :mod:`trainlib.sequences`).
+
+        Example:
+            >>> marker = ColorSequence("W R+ (G|B) K", max_gap_cm=20)
+            >>> train.add_color_sequence_listener(marker, handle_marker)
+        """
+        self._add_color_sequence(sequence, listener)
+
+    def remove_color_sequence_listener(
+        self,
+        sequence: "ColorSequence",
+        listener: Callable[["Train", "ColorSequenceMatch"], None],
+    ):
+        self._remove_color_sequence(sequence, listener)
+
+    def add_snap_command_execution_listener(
+        self, listener: Callable[["Train", TrainMsgEventSnapCommandExecuted], None]
+    ):
+        self._add_listener(EventId.SNAP_COMMAND_EXECUTED, listener)
+
+    def remove_snap_command_execution_listener(
+        self, listener: Callable[["Train", TrainMsgEventSnapCommandExecuted], None]
+    ):
+        self._remove_listener(EventId.SNAP_COMMAND_EXECUTED, listener)
+
+    def add_front_color_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventFrontColorChanged], None]
+    ):
+        self._add_listener(EventId.FRONT_COLOR_CHANGED, listener)
+
+    def remove_front_color_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventFrontColorChanged], None]
+    ):
+        self._remove_listener(EventId.FRONT_COLOR_CHANGED, listener)
+
+    def add_back_color_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventBackColorChanged], None]
+    ):
+        self._add_listener(EventId.BACK_COLOR_CHANGED, listener)
+
+    def remove_back_color_change_listener(
+        self, listener: Callable[["Train", TrainMsgEventBackColorChanged], None]
+    ):
+        self._remove_listener(EventId.BACK_COLOR_CHANGED, listener)
+
+    def add_split_decision_listener(
+        self, listener: Callable[["Train", TrainMsgEventSplitDecision], None]
+    ):
+        self._add_listener(EventId.SPLIT_DECISION, listener)
+
+    def remove_split_decision_listener(
+        self, listener: Callable[["Train", TrainMsgEventSplitDecision], None]
+    ):
+        self._remove_listener(EventId.SPLIT_DECISION, listener)
@@ -5,6 +5,14 @@
 # BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
 # THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
 
-"""Re-export from the async library."""
+"""Re-export from the async library (imported on first attribute access)."""
 
-from intelino.trainlib_async.messages import *
+from typing import TYPE_CHECKING
+
+from .helpers import lazy_reexport
+
+if TYPE_CHECKING:
+    from intelino.trainlib_async.messages import *
+
+
+__getattr__, __dir__ = lazy_reexport(__name__, "intelino.trainlib_async.messages")
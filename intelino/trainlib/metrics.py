@@ -0,0 +1,403 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Runtime metrics of the blocking trains.
+
+Every :class:`Train` collects its own :class:`TrainMetrics` (command round
+trips per command type, lock wait time, listener threads in flight, event
+rates and the delay between a notification and the start of its listeners).
+All train metrics are also registered in the process-wide :data:`REGISTRY`.
+
+Pulling the metrics::
+
+    snapshot = train.metrics.snapshot()
+    fleet_snapshot = metrics.REGISTRY.snapshot()
+
+Exporting them for Prometheus (node exporter textfile collector)::
+
+    writer = metrics.PrometheusFileWriter("/var/lib/node_exporter/intelino.prom")
+    writer.start()
+"""
+
+import bisect
+from collections import defaultdict, deque
+import os
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import weakref
+
+from .messages import EventId
+
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+"""Default histogram bucket upper bounds in seconds."""
+
+
+class Histogram:
+    """Histogram with fixed bucket upper bounds (not thread-safe by itself)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds: Tuple[float, ...] = tuple(sorted(buckets))
+        # the last bucket counts values above the highest bound (+Inf)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0-1) as the upper bound of its bucket."""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max
+
+    def cumulative_buckets(self) -> List[Tuple[float, int]]:
+        """List of ``(upper_bound, cumulative_count)`` including ``inf``."""
+        result = []
+        cumulative = 0
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window (with 1 s resolution)."""
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self.total = 0
+        self.__slots: Deque[List[int]] = deque()
+
+    def __prune(self, now: int):
+        while self.__slots and self.__slots[0][0] <= now - self.window:
+            self.__slots.popleft()
+
+    def mark(self, count: int = 1):
+        now = int(time.monotonic())
+        self.total += count
+        if self.__slots and self.__slots[-1][0] == now:
+            self.__slots[-1][1] += count
+        else:
+            self.__slots.append([now, count])
+            self.__prune(now)
+
+    @property
+    def rate(self) -> float:
+        self.__prune(int(time.monotonic()))
+        return sum(count for _, count in self.__slots) / self.window
+
+
+class TrainMetrics:
+    """Metrics of a single blocking train. All methods are thread-safe."""
+
+    def __init__(self, train_id: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.train_id = train_id
+        self.__buckets = buckets
+        self.__lock = threading.Lock()
+
+        self.__command_latency: Dict[str, Histogram] = {}
+        self.__lock_wait = Histogram(buckets)
+        self.__listener_start_delay = Histogram(buckets)
+        self.__events: Dict[EventId, RateMeter] = defaultdict(RateMeter)
+        self.__movement_notifications = RateMeter()
+        self.__listeners_in_flight = 0
+        self.__listeners_in_flight_max = 0
+
+    def observe_command(self, command: str, seconds: float):
+        """Command round trip (from submitting to the result)."""
+        with self.__lock:
+            histogram = self.__command_latency.get(command)
+            if histogram is None:
+                histogram = self.__command_latency[command] = Histogram(self.__buckets)
+            histogram.observe(seconds)
+
+    def command_latency(self, command: str) -> float:
+        """Mean round trip of a command (0 if it was not sent yet)."""
+        with self.__lock:
+            histogram = self.__command_latency.get(command)
+            return histogram.mean if histogram is not None else 0.0
+
+    def observe_lock_wait(self, seconds: float):
+        """Time spent waiting for the train's command lock."""
+        with self.__lock:
+            self.__lock_wait.observe(seconds)
+
+    def mark_movement_notification(self):
+        with self.__lock:
+            self.__movement_notifications.mark()
+
+    def mark_event(self, event_id: EventId):
+        with self.__lock:
+            self.__events[event_id].mark()
+
+    def listener_dispatched(self):
+        """A listener call was dispatched (its thread is starting)."""
+        with self.__lock:
+            self.__listeners_in_flight += 1
+            self.__listeners_in_flight_max = max(
+                self.__listeners_in_flight_max, self.__listeners_in_flight
+            )
+
+    def listener_started(self, start_delay: float):
+        """A listener started ``start_delay`` seconds after its notification."""
+        with self.__lock:
+            self.__listener_start_delay.observe(start_delay)
+
+    def listener_finished(self):
+        with self.__lock:
+            self.__listeners_in_flight -= 1
+
+    @property
+    def listeners_in_flight(self) -> int:
+        return self.__listeners_in_flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain dictionary of the current values (durations in seconds)."""
+        with self.__lock:
+            return {
+                "train": self.train_id,
+                "commands": {
+                    command: histogram.snapshot()
+                    for command, histogram in self.__command_latency.items()
+                },
+                "lock_wait": self.__lock_wait.snapshot(),
+                "listener_start_delay": self.__listener_start_delay.snapshot(),
+                "listeners_in_flight": self.__listeners_in_flight,
+                "listeners_in_flight_max": self.__listeners_in_flight_max,
+                "movement_notifications": {
+                    "total": self.__movement_notifications.total,
+                    "rate": self.__movement_notifications.rate,
+                },
+                "events": {
+                    event_id.name: {"total": meter.total, "rate": meter.rate}
+                    for event_id, meter in self.__events.items()
+                },
+            }
+
+    def prometheus_samples(self) -> Dict[str, List[str]]:
+        """Samples in the Prometheus text format grouped by metric name."""
+        train = _escape(self.train_id)
+        samples: Dict[str, List[str]] = defaultdict(list)
+
+        def add_histogram(name: str, histogram: Histogram, labels: str):
+            lines = samples[name]
+            for bound, count in histogram.cumulative_buckets():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        def add(name: str, labels: str, value: Any):
+            samples[name].append(f"{name}{{{labels}}} {value!r}")
+
+        with self.__lock:
+            for command, histogram in sorted(self.__command_latency.items()):
+                add_histogram(
+                    "intelino_command_duration_seconds",
+                    histogram,
+                    f'train="{train}",command="{_escape(command)}"',
+                )
+            add_histogram(
+                "intelino_lock_wait_seconds", self.__lock_wait, f'train="{train}"'
+            )
+            add_histogram(
+                "intelino_listener_start_delay_seconds",
+                self.__listener_start_delay,
+                f'train="{train}"',
+            )
+            add(
+                "intelino_listeners_in_flight",
+                f'train="{train}"',
+                self.__listeners_in_flight,
+            )
+            add(
+                "intelino_movement_notifications_total",
+                f'train="{train}"',
+                self.__movement_notifications.total,
+            )
+            for event_id, meter in sorted(self.__events.items()):
+                labels = f'train="{train}",event="{event_id.name}"'
+                add("intelino_events_total", labels, meter.total)
+                add("intelino_event_rate", labels, meter.rate)
+
+        return samples
+
+
+_PROMETHEUS_HEADER = {
+    "intelino_command_duration_seconds": (
+        "histogram",
+        "Command round trip per command type.",
+    ),
+    "intelino_lock_wait_seconds": ("histogram", "Wait time for the command lock."),
+    "intelino_listener_start_delay_seconds": (
+        "histogram",
+        "Time from notification to listener start.",
+    ),
+    "intelino_listeners_in_flight": ("gauge", "Running listener threads."),
+    "intelino_movement_notifications_total": (
+        "counter",
+        "Received movement notifications.",
+    ),
+    "intelino_events_total": ("counter", "Received events."),
+    "intelino_event_rate": ("gauge", "Events per second (10 s window)."),
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Process-wide collection of train metrics (weakly referenced)."""
+
+    def __init__(self):
+        self.__metrics: "weakref.WeakValueDictionary[str, TrainMetrics]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def register(self, metrics: TrainMetrics):
+        self.__metrics[metrics.train_id] = metrics
+
+    def unregister(self, metrics: TrainMetrics):
+        if self.__metrics.get(metrics.train_id) is metrics:
+            del self.__metrics[metrics.train_id]
+
+    def trains(self) -> List[TrainMetrics]:
+        return list(self.__metrics.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-train snapshots and process-wide totals."""
+        trains = [metrics.snapshot() for metrics in self.trains()]
+        events: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"total": 0, "rate": 0.0}
+        )
+        for train in trains:
+            for name, values in train["events"].items():
+                events[name]["total"] += values["total"]
+                events[name]["rate"] += values["rate"]
+
+        return {
+            "trains": trains,
+            "listeners_in_flight": sum(t["listeners_in_flight"] for t in trains),
+            "events": dict(events),
+        }
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        samples: Dict[str, List[str]] = defaultdict(list)
+        for metrics in self.trains():
+            for name, lines in metrics.prometheus_samples().items():
+                samples[name].extend(lines)
+
+        output: List[str] = []
+        for name, (metric_type, description) in _PROMETHEUS_HEADER.items():
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(samples.get(name, ()))
+        return "\n".join(output) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+"""Process-wide registry used by all :class:`Train` instances."""
+
+
+def write_prometheus(path: str, registry: MetricsRegistry = REGISTRY):
+    """Atomically write all metrics to a file in the Prometheus text format."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as output:
+        output.write(registry.to_prometheus())
+    os.replace(tmp_path, path)
+
+
+class PrometheusFileWriter:
+    """Periodically write the metrics to a file from a daemon thread."""
+
+    def __init__(
+        self,
+        path: str,
+        interval: float = 10.0,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.__stop = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            write_prometheus(self.path, self.registry)
+
+    def start(self):
+        self.__stop.clear()
+        write_prometheus(self.path, self.registry)
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stop the thread and write the final values."""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        write_prometheus(self.path, self.registry)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def command_name(coroutine: Any) -> str:
+    """Command type label of a train coroutine, e.g. ``drive_at_speed``."""
+    return getattr(coroutine, "__name__", type(coroutine).__name__).lstrip("_")
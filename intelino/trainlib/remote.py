@@ -0,0 +1,823 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Remote (proxy) trains over local inter-process channels.
+
+A :class:`TrainHost` serves connected blocking trains to any number of
+:class:`TrainClient` connections. Clients get :class:`RemoteTrain` proxies
+with the blocking commands, the state and the listeners of :class:`Train`
+(not the awaitable :attr:`Train.aio`, nor the features running on the
+train's event loop, like speed control, LED animations or event filters).
+Raw train notifications (movement and events) are forwarded to the
+subscribed clients, which decode them and keep the local state (speed,
+direction, distance) just like :class:`Train`.
+
+The wire format is compact and binary: every frame is a type byte followed
+by a tagged value (see :func:`encode_frame`). Channels only move whole
+frames, so the same protocol runs over a ``multiprocessing`` pipe
+(:class:`PipeChannel`) or a Unix socket (:class:`SocketChannel`).
+"""
+
+import abc
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+import queue
+import socket
+import struct
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from intelino.trainlib_async.train_ble_packet import TrainBlePacket
+
+from . import exc
+from .enums import (
+    MovementDirection,
+    SteeringDecision,
+    SpeedLevel,
+    StopDrivingFeedbackType,
+)
+from .errors import TrainRemoteError
+from .listeners import ListenerRegistry, TrainEventListeners
+from .messages import (
+    EventId,
+    TrainMsg,
+    TrainMsgEvent,
+    TrainMsgEventSensorColorChangedBase,
+    TrainMsgEventSnapCommandDetected,
+    TrainMsgMovement,
+)
+from .sequences import ColorSequence, ColorSequenceRecognizers
+from .snaps import SnapPatternIndex
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+    from .train import Train
+
+
+# frame types
+CALL = 1
+RESULT = 2
+ERROR = 3
+NOTIFY = 4
+CLOSE = 5
+
+# value tags
+_NONE = ord("N")
+_TRUE = ord("T")
+_FALSE = ord("F")
+_INT = ord("i")
+_FLOAT = ord("d")
+_STR = ord("s")
+_BYTES = ord("b")
+_LIST = ord("l")
+_DICT = ord("m")
+
+_U8 = struct.Struct("!B")
+_U32 = struct.Struct("!I")
+_I64 = struct.Struct("!q")
+_F64 = struct.Struct("!d")
+
+
+def _encode(value: Any, out: bytearray):
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        out += _I64.pack(value)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out.append(_STR)
+        out += _U32.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(_BYTES)
+        out += _U32.pack(len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        out += _U32.pack(len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _encode(str(key), out)
+            _encode(item, out)
+    else:
+        raise TypeError(f"Value {value!r} cannot be sent to a remote train!")
+
+
+def _decode(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _INT:
+        return _I64.unpack_from(data, offset)[0], offset + _I64.size
+    if tag == _FLOAT:
+        return _F64.unpack_from(data, offset)[0], offset + _F64.size
+    if tag in (_STR, _BYTES):
+        (length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        chunk = bytes(data[offset : offset + length])
+        return (chunk.decode("utf-8") if tag == _STR else chunk), offset + length
+    if tag == _LIST:
+        (length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        items = []
+        for _ in range(length):
+            item, offset = _decode(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == _DICT:
+        (length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        result = {}
+        for _ in range(length):
+            key, offset = _decode(data, offset)
+            result[key], offset = _decode(data, offset)
+        return result, offset
+
+    raise ValueError(f"Unknown value tag {tag!r}!")
+
+
+def encode_frame(frame_type: int, value: Any) -> bytes:
+    """Encode a frame: type byte and a tagged value (None, bool, int, float,
+    str, bytes, list/tuple and dict with str keys)."""
+    out = bytearray(_U8.pack(frame_type))
+    _encode(value, out)
+    return bytes(out)
+
+
+def decode_frame(data: bytes) -> Tuple[int, Any]:
+    value, _ = _decode(data, 1)
+    return data[0], value
+
+
+class Channel(abc.ABC):
+    """Bidirectional channel transporting whole frames."""
+
+    @abc.abstractmethod
+    def send(self, data: bytes) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def recv(self) -> bytes:
+        """Receive a frame. Raises ``EOFError`` if the channel is closed."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        raise NotImplementedError()
+
+
+class PipeChannel(Channel):
+    """Channel over a ``multiprocessing`` connection (pipe)."""
+
+    def __init__(self, connection: "Connection"):
+        self.connection = connection
+
+    def send(self, data: bytes) -> None:
+        self.connection.send_bytes(data)
+
+    def recv(self) -> bytes:
+        try:
+            return self.connection.recv_bytes()
+        except OSError as error:
+            raise EOFError(str(error)) from error
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SocketChannel(Channel):
+    """Channel over a stream socket with length-prefixed frames."""
+
+    def __init__(self, sock: socket.socket):
+        self.socket = sock
+
+    def send(self, data: bytes) -> None:
+        self.socket.sendall(_U32.pack(len(data)) + data)
+
+    def __recv_exactly(self, size: int) -> bytes:
+        chunks = []
+        while size:
+            try:
+                chunk = self.socket.recv(min(size, 65536))
+            except OSError as error:
+                raise EOFError(str(error)) from error
+            if not chunk:
+                raise EOFError("Socket closed.")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def recv(self) -> bytes:
+        (length,) = _U32.unpack(self.__recv_exactly(_U32.size))
+        return self.__recv_exactly(length)
+
+    def close(self) -> None:
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+class _Peer:
+    """Outgoing frames of a channel sent from a writer thread, so neither
+    user threads nor train event loops block on a slow peer."""
+
+    def __init__(self, channel: Channel):
+        self.channel = channel
+        self.__queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            data = self.__queue.get()
+            if data is None:
+                break
+            try:
+                self.channel.send(data)
+            except (OSError, EOFError, ValueError):
+                break
+
+    def send(self, frame_type: int, value: Any):
+        self.__queue.put(encode_frame(frame_type, value))
+
+    def close(self):
+        self.__queue.put(None)
+        if self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+
+class TrainHost:
+    """Serve connected blocking trains to remote clients.
+
+    Every train executes the calls of all clients in order in its own worker
+    thread. The host does not own the trains; disconnect them after
+    :meth:`close`.
+    """
+
+    COMMANDS = frozenset(
+        {
+            "send_command",
+            "send_command_with_response",
+            "drive_at_speed",
+            "drive_at_speed_level",
+            "stop_driving",
+            "set_next_split_steering_decision",
+            "queue_split_decisions",
+            "clear_split_decisions",
+            "set_top_led_color",
+            "set_headlight_color",
+            "set_snap_command_feedback",
+            "set_snap_command_execution",
+            "clear_custom_snap_commands",
+            "decouple_wagon",
+        }
+    )
+    """Train methods callable by clients."""
+
+    def __init__(self, trains: Iterable["Train"]):
+        self.__trains: Dict[str, "Train"] = {train.id: train for train in trains}
+        self.__executors = {
+            train_id: ThreadPoolExecutor(1, thread_name_prefix=f"host-{train_id}")
+            for train_id in self.__trains
+        }
+        self.__lock = threading.Lock()
+        self.__subscribers: Dict[str, Set[_Peer]] = defaultdict(set)
+        self.__subscriptions = [
+            self.__forward_notifications(train) for train in self.__trains.values()
+        ]
+
+    def __forward_notifications(self, train: "Train"):
+        train_id = train.id
+
+        def forward(msg: TrainMsg):
+            peers = self.__subscribers.get(train_id)
+            if peers:
+                frame = [train_id, bytes(msg.raw_packet.data)]
+                for peer in list(peers):
+                    peer.send(NOTIFY, frame)
+
+        async def subscribe():
+            return train._async_train.notifications.subscribe(forward)
+
+        return train._schedule(subscribe()).result()
+
+    @property
+    def trains(self) -> List["Train"]:
+        return list(self.__trains.values())
+
+    def serve(self, channel: Channel):
+        """Serve a client until it disconnects (blocking)."""
+        peer = _Peer(channel)
+        try:
+            while True:
+                try:
+                    frame_type, value = decode_frame(channel.recv())
+                except EOFError:
+                    break
+                if frame_type == CALL:
+                    self.__call(peer, *value)
+                elif frame_type == CLOSE:
+                    break
+        finally:
+            with self.__lock:
+                for peers in self.__subscribers.values():
+                    peers.discard(peer)
+            peer.close()
+            channel.close()
+
+    def __call(
+        self,
+        peer: _Peer,
+        call_id: int,
+        train_id: str,
+        method: str,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+    ):
+        if not train_id:
+            self.__respond(peer, call_id, lambda: self.__host_call(peer, method, args))
+            return
+
+        train = self.__trains.get(train_id)
+        if train is None:
+            peer.send(ERROR, [call_id, "TrainNotFoundError", f"No train {train_id}!"])
+            return
+
+        self.__executors[train_id].submit(
+            self.__respond,
+            peer,
+            call_id,
+            lambda: self.__train_call(train, method, args, kwargs),
+        )
+
+    def __respond(self, peer: _Peer, call_id: int, call: Callable[[], Any]):
+        try:
+            result = call()
+        except Exception as error:  # pylint: disable=broad-except
+            peer.send(ERROR, [call_id, type(error).__name__, str(error)])
+        else:
+            peer.send(RESULT, [call_id, result])
+
+    def __host_call(self, peer: _Peer, method: str, args: List[Any]) -> Any:
+        if method == "trains":
+            return [[train.id, train.name] for train in self.__trains.values()]
+
+        if method in ("subscribe", "unsubscribe"):
+            with self.__lock:
+                for train_id in args[0]:
+                    peers = self.__subscribers[train_id]
+                    if method == "subscribe":
+                        peers.add(peer)
+                    else:
+                        peers.discard(peer)
+            return None
+
+        raise TrainRemoteError(f"Unknown host method '{method}'!")
+
+    def __train_call(
+        self, train: "Train", method: str, args: List[Any], kwargs: Dict[str, Any]
+    ) -> Any:
+        if method == "state":
+            return [
+                train.alias,
+                train.is_connected,
+                train.distance_cm,
+                train.direction,
+                train.speed_cmps,
+                train.next_split_decision,
+            ]
+
+        if method not in self.COMMANDS:
+            raise TrainRemoteError(f"Method '{method}' cannot be called remotely!")
+
+        result = getattr(train, method)(*args, **kwargs)
+        if method == "send_command_with_response":
+            return bytes(result.raw_packet.data)
+        return result
+
+    def close(self):
+        """Stop forwarding notifications and finish the pending calls."""
+        for subscription in self.__subscriptions:
+            subscription.dispose()
+        for executor in self.__executors.values():
+            executor.shutdown()
+
+
+class TrainClient:
+    """Client side of a :class:`TrainHost` connection.
+
+    Example:
+        >>> client = TrainClient(SocketChannel(sock))
+        >>> for train in client.trains:
+        ...     train.drive_at_speed(40)
+        >>> client.close()
+    """
+
+    def __init__(self, channel: Channel):
+        self.__channel = channel
+        self.__peer = _Peer(channel)
+        self.__call_ids = itertools.count(1)
+        self.__pending: Dict[int, Future] = {}
+        self.__lock = threading.Lock()
+        self.__closed = False
+        self.__remote_trains: Dict[str, RemoteTrain] = {}
+
+        self.__reader = threading.Thread(target=self.__read, daemon=True)
+        self.__reader.start()
+
+        for train_id, name in self.call("", "trains"):
+            self.__remote_trains[train_id] = RemoteTrain(self, train_id, name)
+        self.call("", "subscribe", list(self.__remote_trains))
+
+    def __read(self):
+        try:
+            while True:
+                frame_type, value = decode_frame(self.__channel.recv())
+                if frame_type == NOTIFY:
+                    train = self.__remote_trains.get(value[0])
+                    if train is not None:
+                        train._handle_packet(value[1])
+                elif frame_type in (RESULT, ERROR):
+                    with self.__lock:
+                        future = self.__pending.pop(value[0], None)
+                    if future is None:
+                        continue
+                    if frame_type == RESULT:
+                        future.set_result(value[1])
+                    else:
+                        future.set_exception(_remote_exception(value[1], value[2]))
+        except (EOFError, OSError, ValueError):
+            pass
+        finally:
+            with self.__lock:
+                self.__closed = True
+                pending = list(self.__pending.values())
+                self.__pending.clear()
+            for future in pending:
+                future.set_exception(TrainRemoteError("Connection closed!"))
+
+    @property
+    def trains(self) -> List["RemoteTrain"]:
+        """Proxies of all trains served by the host."""
+        return list(self.__remote_trains.values())
+
+    def call(self, train_id: str, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Call a train method remotely (blocking) and return its result."""
+        future: Future = Future()
+        with self.__lock:
+            if self.__closed:
+                raise TrainRemoteError("Connection closed!")
+            call_id = next(self.__call_ids)
+            self.__pending[call_id] = future
+        self.__peer.send(CALL, [call_id, train_id, method, list(args), kwargs])
+        return future.result()
+
+    def close(self):
+        # the host closes the channel, which stops the reader
+        self.__peer.send(CLOSE, None)
+        self.__peer.close()
+        self.__reader.join()
+        self.__channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _remote_exception(type_name: str, message: str) -> Exception:
+    error_type = getattr(exc, type_name, None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        return error_type(message)
+    return TrainRemoteError(f"{type_name}: {message}")
+
+
+class RemoteTrain(TrainEventListeners):
+    """Proxy of a :class:`Train` owned by another process.
+
+    Commands are blocking calls of the remote train. The local state
+    (direction, speed, distance) and the listeners are driven by the
+    notifications forwarded by the host.
+    """
+
+    def __init__(self, client: TrainClient, train_id: str, name: str):
+        self.__client = client
+        self.__id = train_id
+        self.__name = name
+        self.__detached = False
+        # deadline of the commands called without a timeout; None leaves it
+        # to the default_timeout of the host's train
+        self.default_timeout: Optional[float] = None
+
+        (
+            alias,
+            self.__is_connected,
+            distance_cm,
+            direction,
+            speed_cmps,
+            next_split_decision,
+        ) = client.call(train_id, "state")
+        # user-defined nickname, initially the one of the host's train
+        self.alias: str = alias
+        self.__distance_cm_at_attach = distance_cm
+        self.__odometer_offset: Optional[float] = None
+        self.__odometer_last = 0.0
+        self.__direction = MovementDirection(direction)
+        self.__speed_cmps = speed_cmps
+        self.__next_split_decision = SteeringDecision(next_split_decision)
+
+        self.__listeners = ListenerRegistry()
+        self.__snap_patterns = SnapPatternIndex()
+        self.__color_sequences = ColorSequenceRecognizers()
+
+    def __call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self.__detached:
+            raise TrainRemoteError(f"Train {self.__id} is detached!")
+        deadline = "deadline" if method == "send_command_with_response" else "timeout"
+        if deadline in kwargs and kwargs[deadline] is None:
+            kwargs[deadline] = self.default_timeout
+        return self.__client.call(self.__id, method, *args, **kwargs)
+
+    def _handle_packet(self, data: bytes):
+        if self.__detached:
+            return
+        msg = TrainBlePacket(bytearray(data)).msg
+
+        if isinstance(msg, TrainMsgMovement):
+            if self.__odometer_offset is None:
+                self.__odometer_offset = msg.lifetime_odometer_meters - (
+                    self.__distance_cm_at_attach / 100
+                )
+            self.__odometer_last = msg.lifetime_odometer_meters
+            self.__direction = msg.direction
+            self.__speed_cmps = msg.speed_cmps
+            self.__next_split_decision = msg.next_split_decision
+
+        elif isinstance(msg, TrainMsgEvent.__args__):  # type: ignore
+            listeners = self.__listeners.get(msg.event_id)
+            if isinstance(msg, TrainMsgEventSnapCommandDetected):
+                listeners += self.__snap_patterns.match(msg.colors)
+            for func in listeners:
+                threading.Thread(target=func, args=(self, msg)).start()
+
+            if self.__color_sequences and isinstance(
+                msg, TrainMsgEventSensorColorChangedBase
+            ):
+                for func, match in self.__color_sequences.feed(msg, self.distance_cm):
+                    threading.Thread(target=func, args=(self, match)).start()
+
+    def _add_listener(self, event_id: EventId, listener: Callable):
+        self.__listeners.add(event_id, listener)
+
+    def _remove_listener(self, event_id: EventId, listener: Callable):
+        self.__listeners.remove(event_id, listener)
+
+    def _add_snap_pattern(self, pattern: Sequence, listener: Callable):
+        self.__snap_patterns.add(pattern, listener)
+
+    def _remove_snap_pattern(self, pattern: Sequence, listener: Callable):
+        self.__snap_patterns.remove(pattern, listener)
+
+    def _add_color_sequence(self, sequence: ColorSequence, listener: Callable):
+        self.__color_sequences.add(sequence, listener)
+
+    def _remove_color_sequence(self, sequence: ColorSequence, listener: Callable):
+        self.__color_sequences.remove(sequence, listener)
+
+    @property
+    def id(self) -> str:
+        """Connection ID / address."""
+        return self.__id
+
+    @property
+    def name(self) -> str:
+        """Advertised name."""
+        return self.__name
+
+    @property
+    def is_connected(self) -> bool:
+        if self.__detached:
+            return False
+        self.__is_connected = self.__call("state")[1]
+        return self.__is_connected
+
+    def disconnect(self, timeout: Optional[float] = None):
+        """Detach from the remote train: stop receiving its notifications and
+        refuse further commands. The host's train stays connected (the host
+        owns it).
+
+        Args:
+            timeout: Unused, for compatibility with :meth:`Train.disconnect`.
+        """
+        if self.__detached:
+            return
+        self.__detached = True
+        self.__client.call("", "unsubscribe", [self.__id])
+
+    @property
+    def distance_cm(self) -> int:
+        if self.__odometer_offset is None:
+            return self.__distance_cm_at_attach
+        return int((self.__odometer_last - self.__odometer_offset) * 100)
+
+    @distance_cm.setter
+    def distance_cm(self, value: int) -> None:
+        if self.__odometer_offset is None:
+            self.__distance_cm_at_attach = value
+        else:
+            self.__odometer_offset = self.__odometer_last - (value / 100)
+
+    @property
+    def direction(self) -> MovementDirection:
+        return self.__direction
+
+    @property
+    def speed_cmps(self) -> float:
+        return self.__speed_cmps
+
+    @property
+    def next_split_decision(self) -> SteeringDecision:
+        return self.__next_split_decision
+
+    def send_command(
+        self,
+        command_id: int,
+        payload: Iterable[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        return self.__call(
+            "send_command", command_id, list(payload or []), timeout=timeout
+        )
+
+    def send_command_with_response(
+        self,
+        command_id: int,
+        payload: Iterable[int] = None,
+        timeout: float = 3.0,
+        deadline: Optional[float] = None,
+    ) -> TrainMsg:
+        data = self.__call(
+            "send_command_with_response",
+            command_id,
+            list(payload or []),
+            timeout=timeout,
+            deadline=deadline,
+        )
+        return TrainBlePacket(bytearray(data)).msg
+
+    def drive_at_speed(
+        self,
+        speed_cmps: Union[int, float],
+        direction: MovementDirection = MovementDirection.FORWARD,
+        play_feedback: bool = True,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """See :meth:`Train.drive_at_speed`."""
+        return self.__call(
+            "drive_at_speed", speed_cmps, direction, play_feedback, timeout=timeout
+        )
+
+    def drive_at_speed_level(
+        self,
+        speed_level: SpeedLevel,
+        direction: MovementDirection = MovementDirection.FORWARD,
+        play_feedback: bool = True,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """See :meth:`Train.drive_at_speed_level`."""
+        return self.__call(
+            "drive_at_speed_level",
+            speed_level,
+            direction,
+            play_feedback,
+            timeout=timeout,
+        )
+
+    def stop_driving(
+        self,
+        play_feedback_type: StopDrivingFeedbackType = StopDrivingFeedbackType.MOVEMENT_STOP,
+        timeout: Optional[float] = None,
+    ):
+        """See :meth:`Train.stop_driving`."""
+        return self.__call("stop_driving", play_feedback_type, timeout=timeout)
+
+    def set_next_split_steering_decision(
+        self,
+        next_decision: SteeringDecision,
+        timeout: Optional[float] = None,
+        wait_for_state: bool = True,
+    ) -> None:
+        """See :meth:`Train.set_next_split_steering_decision`."""
+        return self.__call(
+            "set_next_split_steering_decision",
+            next_decision,
+            timeout=timeout,
+            wait_for_state=wait_for_state,
+        )
+
+    def queue_split_decisions(
+        self, decisions: Iterable[SteeringDecision], timeout: Optional[float] = None
+    ) -> None:
+        """See :meth:`Train.queue_split_decisions`."""
+        return self.__call(
+            "queue_split_decisions", [int(d) for d in decisions], timeout=timeout
+        )
+
+    def clear_split_decisions(self, timeout: Optional[float] = None) -> None:
+        """See :meth:`Train.clear_split_decisions`."""
+        return self.__call("clear_split_decisions", timeout=timeout)
+
+    def set_top_led_color(
+        self,
+        r: int,
+        g: int,
+        b: int,
+        timeout: Optional[float] = None,
+        force: bool = False,
+    ) -> None:
+        """See :meth:`Train.set_top_led_color`."""
+        return self.__call("set_top_led_color", r, g, b, timeout=timeout, force=force)
+
+    def set_headlight_color(
+        self,
+        front: Iterable[int] = None,
+        back: Iterable[int] = None,
+        timeout: Optional[float] = None,
+        force: bool = False,
+    ):
+        """See :meth:`Train.set_headlight_color`."""
+        return self.__call(
+            "set_headlight_color",
+            None if front is None else list(front),
+            None if back is None else list(back),
+            timeout=timeout,
+            force=force,
+        )
+
+    def set_snap_command_feedback(
+        self,
+        sound: bool,
+        lights: bool,
+        timeout: Optional[float] = None,
+        force: bool = False,
+    ):
+        """See :meth:`Train.set_snap_command_feedback`."""
+        return self.__call(
+            "set_snap_command_feedback", sound, lights, timeout=timeout, force=force
+        )
+
+    def set_snap_command_execution(
+        self, on: bool, timeout: Optional[float] = None, force: bool = False
+    ):
+        """See :meth:`Train.set_snap_command_execution`."""
+        return self.__call(
+            "set_snap_command_execution", on, timeout=timeout, force=force
+        )
+
+    def clear_custom_snap_commands(self, timeout: Optional[float] = None):
+        """See :meth:`Train.clear_custom_snap_commands`."""
+        return self.__call("clear_custom_snap_commands", timeout=timeout)
+
+    def decouple_wagon(
+        self, play_feedback: bool = True, timeout: Optional[float] = None
+    ):
+        """See :meth:`Train.decouple_wagon`."""
+        return self.__call("decouple_wagon", play_feedback, timeout=timeout)
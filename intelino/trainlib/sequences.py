@@ -0,0 +1,381 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Recognition of color sequences in the color sensor events.
+
+A :class:`ColorSequence` is a regular-expression-like pattern over the
+colors reported by a color sensor. It is compiled to a finite automaton that
+advances with every color event, so no event history is kept. This allows
+custom track markers longer than the 4-color snap commands::
+
+    marker = ColorSequence("W R+ (G|B) K", max_gap_cm=20)
+    train.add_color_sequence_listener(marker, on_marker)
+
+Pattern syntax (whitespace is ignored):
+
+=============  ==========================================================
+``K R G B``    black, red, green, blue
+``Y M C W``    yellow, magenta, cyan, white (full names work as well)
+``.``          any color
+``[RGB]``      any of the listed colors
+``( | )``      grouping and alternatives
+``* + ?``      zero or more, one or more, optional
+=============  ==========================================================
+
+A sequence matches as soon as its last color is reported, anywhere in the
+stream of colors. Optional windows limit the distance or the time between
+two consecutive colors; a larger gap starts the recognition over.
+"""
+
+from dataclasses import dataclass
+import threading
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .enums import ColorSensor, SnapColorValue
+from .messages import EventId, TrainMsgEventSensorColorChangedBase
+
+
+_COLOR_LETTERS = {
+    "K": SnapColorValue.BLACK,
+    "R": SnapColorValue.RED,
+    "G": SnapColorValue.GREEN,
+    "B": SnapColorValue.BLUE,
+    "Y": SnapColorValue.YELLOW,
+    "M": SnapColorValue.MAGENTA,
+    "C": SnapColorValue.CYAN,
+    "W": SnapColorValue.WHITE,
+}
+_ALL_COLORS = frozenset(_COLOR_LETTERS.values())
+
+# token: (kind, colors) where kind is "colors" or an operator character
+_Token = Tuple[str, FrozenSet[SnapColorValue]]
+
+
+def _tokenize(pattern: str) -> List[_Token]:
+    tokens: List[_Token] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char.isspace():
+            i += 1
+        elif char.isalpha():
+            end = i
+            while end < len(pattern) and pattern[end].isalpha():
+                end += 1
+            word = pattern[i:end].upper()
+            if word in SnapColorValue.__members__ and word != "UNKNOWN":
+                tokens.append(("colors", frozenset({SnapColorValue[word]})))
+            else:
+                for letter in word:
+                    if letter not in _COLOR_LETTERS:
+                        raise ValueError(f"Unknown color '{letter}' in {pattern!r}!")
+                    tokens.append(("colors", frozenset({_COLOR_LETTERS[letter]})))
+            i = end
+        elif char == ".":
+            tokens.append(("colors", _ALL_COLORS))
+            i += 1
+        elif char == "[":
+            end = pattern.find("]", i)
+            if end < 0:
+                raise ValueError(f"Missing ']' in {pattern!r}!")
+            colors = _tokenize(pattern[i + 1 : end])
+            if not colors or any(kind != "colors" for kind, _ in colors):
+                raise ValueError(f"Invalid color class in {pattern!r}!")
+            tokens.append(("colors", frozenset().union(*(c for _, c in colors))))
+            i = end + 1
+        elif char in "()|*+?":
+            tokens.append((char, frozenset()))
+            i += 1
+        else:
+            raise ValueError(f"Unexpected '{char}' in {pattern!r}!")
+    return tokens
+
+
+class _Nfa:
+    """Thompson NFA: every state has epsilon edges and at most one color
+    edge."""
+
+    def __init__(self):
+        self.epsilon: List[List[int]] = []
+        self.edges: List[Optional[Tuple[FrozenSet[SnapColorValue], int]]] = []
+
+    def state(self) -> int:
+        self.epsilon.append([])
+        self.edges.append(None)
+        return len(self.edges) - 1
+
+
+# NFA fragment: (start state, accept state)
+_Fragment = Tuple[int, int]
+
+
+class _Parser:
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.tokens = _tokenize(pattern)
+        self.position = 0
+        self.nfa = _Nfa()
+
+    def __peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def parse(self) -> _Fragment:
+        fragment = self.__alternation()
+        if self.__peek() is not None:
+            raise ValueError(f"Unexpected '{self.__peek()}' in {self.pattern!r}!")
+        return fragment
+
+    def __alternation(self) -> _Fragment:
+        fragments = [self.__concatenation()]
+        while self.__peek() == "|":
+            self.position += 1
+            fragments.append(self.__concatenation())
+        if len(fragments) == 1:
+            return fragments[0]
+
+        start, accept = self.nfa.state(), self.nfa.state()
+        for fragment_start, fragment_accept in fragments:
+            self.nfa.epsilon[start].append(fragment_start)
+            self.nfa.epsilon[fragment_accept].append(accept)
+        return start, accept
+
+    def __concatenation(self) -> _Fragment:
+        fragments = []
+        while self.__peek() not in (None, "|", ")"):
+            fragments.append(self.__repetition())
+        if not fragments:
+            state = self.nfa.state()
+            return state, state
+
+        for (_, previous_accept), (next_start, _) in zip(fragments, fragments[1:]):
+            self.nfa.epsilon[previous_accept].append(next_start)
+        return fragments[0][0], fragments[-1][1]
+
+    def __repetition(self) -> _Fragment:
+        fragment = self.__atom()
+        while self.__peek() in ("*", "+", "?"):
+            operator = self.tokens[self.position][0]
+            self.position += 1
+            inner_start, inner_accept = fragment
+            start, accept = self.nfa.state(), self.nfa.state()
+            self.nfa.epsilon[start].append(inner_start)
+            self.nfa.epsilon[inner_accept].append(accept)
+            if operator in ("*", "?"):
+                self.nfa.epsilon[start].append(accept)
+            if operator in ("*", "+"):
+                self.nfa.epsilon[inner_accept].append(inner_start)
+            fragment = start, accept
+        return fragment
+
+    def __atom(self) -> _Fragment:
+        kind, colors = self.tokens[self.position]
+        self.position += 1
+
+        if kind == "colors":
+            start, accept = self.nfa.state(), self.nfa.state()
+            self.nfa.edges[start] = (colors, accept)
+            return start, accept
+
+        if kind == "(":
+            fragment = self.__alternation()
+            if self.__peek() != ")":
+                raise ValueError(f"Missing ')' in {self.pattern!r}!")
+            self.position += 1
+            return fragment
+
+        raise ValueError(f"Unexpected '{kind}' in {self.pattern!r}!")
+
+
+class ColorSequence:
+    """Compiled color sequence pattern.
+
+    The NFA is turned into a DFA lazily: every reachable set of NFA states is
+    computed once and cached, so advancing takes a dictionary lookup per
+    color in the steady state.
+    """
+
+    def __init__(
+        self,
+        pattern: str,
+        sensor: Optional[ColorSensor] = None,
+        max_gap_cm: Optional[float] = None,
+        max_gap_s: Optional[float] = None,
+    ):
+        """
+        Args:
+            pattern (str): Sequence pattern (see :mod:`trainlib.sequences`).
+            sensor (ColorSensor): Recognize the colors of this sensor only.
+                Defaults to both sensors (each one independently).
+            max_gap_cm (float): Maximum travelled distance between two
+                consecutive colors of the sequence.
+            max_gap_s (float): Maximum time between two consecutive colors of
+                the sequence (by the train's event timestamps).
+
+        Raises:
+            ValueError: If the pattern is invalid or matches no colors.
+        """
+        self.pattern = pattern
+        self.sensor = sensor
+        self.max_gap_cm = max_gap_cm
+        self.max_gap_s = max_gap_s
+
+        parser = _Parser(pattern)
+        start, self.__accept = parser.parse()
+        self.__nfa = parser.nfa
+
+        self.__transitions: Dict[
+            Tuple[FrozenSet[int], SnapColorValue], Tuple[FrozenSet[int], bool]
+        ] = {}
+        self.initial = self.__closure([start])
+        if self.__accept in self.initial:
+            raise ValueError(f"Pattern {pattern!r} matches an empty sequence!")
+
+    def __repr__(self) -> str:
+        return f"ColorSequence({self.pattern!r})"
+
+    def __closure(self, states: Sequence[int]) -> FrozenSet[int]:
+        result = set(states)
+        stack = list(states)
+        while stack:
+            for target in self.__nfa.epsilon[stack.pop()]:
+                if target not in result:
+                    result.add(target)
+                    stack.append(target)
+        return frozenset(result)
+
+    def advance(
+        self, state: FrozenSet[int], color: SnapColorValue
+    ) -> Tuple[FrozenSet[int], bool]:
+        """Advance a recognition state by a color.
+
+        Returns:
+            The next state and whether the sequence matched. After a match
+            the state starts over.
+        """
+        key = (state, color)
+        transition = self.__transitions.get(key)
+        if transition is None:
+            moved = []
+            for nfa_state in state:
+                edge = self.__nfa.edges[nfa_state]
+                if edge is not None and color in edge[0]:
+                    moved.append(edge[1])
+            next_state = self.__closure(moved)
+            if self.__accept in next_state:
+                transition = (self.initial, True)
+            else:
+                # unanchored: a new sequence can start with every color
+                transition = (next_state | self.initial, False)
+            self.__transitions[key] = transition
+        return transition
+
+
+@dataclass(frozen=True)
+class ColorSequenceMatch:
+    """Recognized color sequence passed to the listeners."""
+
+    sequence: ColorSequence
+    # color event completing the sequence
+    msg: TrainMsgEventSensorColorChangedBase
+    # distance of the train when the sequence completed
+    distance_cm: float
+
+    @property
+    def event_id(self) -> EventId:
+        return self.msg.event_id
+
+    @property
+    def sensor(self) -> ColorSensor:
+        return self.msg.sensor
+
+
+class _Recognizer:
+    __slots__ = ("sequence", "listener", "states")
+
+    def __init__(self, sequence: ColorSequence, listener: Callable):
+        self.sequence = sequence
+        self.listener = listener
+        # per sensor: (automaton state, last distance, last timestamp)
+        self.states: Dict[ColorSensor, Tuple[FrozenSet[int], float, int]] = {}
+
+
+class ColorSequenceRecognizers:
+    """Color sequence listeners of a train.
+
+    The registry is copy-on-write like the event listeners; :meth:`feed` is
+    called from a single thread (the one dispatching the events).
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__recognizers: Tuple[_Recognizer, ...] = ()
+
+    def add(self, sequence: ColorSequence, listener: Callable):
+        """Add a sequence listener (adding it again does nothing)."""
+        with self.__lock:
+            if any(
+                r.sequence is sequence and r.listener == listener
+                for r in self.__recognizers
+            ):
+                return
+            self.__recognizers += (_Recognizer(sequence, listener),)
+
+    def remove(self, sequence: ColorSequence, listener: Callable):
+        """Raises ``KeyError`` if the listener is not registered."""
+        with self.__lock:
+            recognizers = tuple(
+                r
+                for r in self.__recognizers
+                if not (r.sequence is sequence and r.listener == listener)
+            )
+            if len(recognizers) == len(self.__recognizers):
+                raise KeyError(sequence)
+            self.__recognizers = recognizers
+
+    def feed(
+        self, msg: TrainMsgEventSensorColorChangedBase, distance_cm: float
+    ) -> List[Tuple[Callable, ColorSequenceMatch]]:
+        """Advance all sequences by a color event.
+
+        Returns:
+            Listeners of the completed sequences with their matches.
+        """
+        matches = []
+        for recognizer in self.__recognizers:
+            sequence = recognizer.sequence
+            if sequence.sensor is not None and sequence.sensor != msg.sensor:
+                continue
+
+            previous = recognizer.states.get(msg.sensor)
+            if previous is None:
+                state = sequence.initial
+            else:
+                state, last_distance_cm, last_timestamp_ms = previous
+                elapsed_s = ((msg.timestamp_ms - last_timestamp_ms) % 2**32) / 1000
+                if (
+                    sequence.max_gap_cm is not None
+                    and abs(distance_cm - last_distance_cm) > sequence.max_gap_cm
+                ) or (
+                    sequence.max_gap_s is not None and elapsed_s > sequence.max_gap_s
+                ):
+                    state = sequence.initial
+
+            state, matched = sequence.advance(state, msg.color)
+            recognizer.states[msg.sensor] = (state, distance_cm, msg.timestamp_ms)
+            if matched:
+                matches.append(
+                    (
+                        recognizer.listener,
+                        ColorSequenceMatch(sequence, msg, distance_cm),
+                    )
+                )
+        return matches
+
+    def __bool__(self) -> bool:
+        return bool(self.__recognizers)
@@ -0,0 +1,171 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Fleet sharded across worker processes.
+
+Every :class:`Train` runs its own event loop thread, so a single process
+with dozens of trains is limited by the GIL and by the connection limit of
+one Bluetooth adapter. The :class:`ShardCoordinator` spawns worker processes
+that own a subset of the trains each (optionally pinned to an adapter) and
+exposes them as :class:`~intelino.trainlib.remote.RemoteTrain` proxies.
+Commands and notifications travel over ``multiprocessing`` pipes.
+
+Example::
+
+    with ShardCoordinator(count=40, workers=4, adapters=["hci0", "hci1"]) as fleet:
+        for train in fleet.trains:
+            train.drive_at_speed(40)
+"""
+
+import asyncio
+import multiprocessing
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+from intelino.trainlib_async.train_factory import TrainFactory
+
+from .errors import TrainRemoteError
+from .remote import PipeChannel, RemoteTrain, TrainClient, TrainHost
+from .train_scanner import TrainScanner, _discover
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+
+def _worker_main(
+    connection: "Connection",
+    addresses: List[str],
+    adapter: Optional[str],
+    timeout: float,
+):
+    kwargs = {"adapter": adapter} if adapter else {}
+    trains = []
+    channel = PipeChannel(connection)
+
+    try:
+        for address in addresses:
+            trains.append(TrainScanner(address, timeout=timeout).get_train(**kwargs))
+    except Exception as error:  # pylint: disable=broad-except
+        connection.send_bytes(f"{type(error).__name__}: {error}".encode("utf-8"))
+        for train in trains:
+            train.disconnect()
+        channel.close()
+        return
+
+    # an empty message reports a successful startup
+    connection.send_bytes(b"")
+
+    host = TrainHost(trains)
+    try:
+        host.serve(channel)
+    finally:
+        host.close()
+        for train in trains:
+            train.disconnect()
+        channel.close()
+
+
+def discover(
+    count: Optional[int] = None,
+    timeout: float = 5.0,
+    adapters: Optional[Sequence[str]] = None,
+) -> List[str]:
+    """Discover train addresses (on all adapters at once) without connecting
+    to them."""
+    trains = asyncio.run(
+        _discover(
+            TrainFactory.create_trains,
+            list(adapters or [None]),
+            count=count,
+            timeout=timeout,
+            connect=False,
+        )
+    )
+    return [train.id for train, _ in trains][:count]
+
+
+class ShardCoordinator:
+    """Spawn worker processes owning the trains and proxy them.
+
+    The trains are assigned to the workers round-robin; worker ``i`` uses the
+    adapter ``adapters[i % len(adapters)]``. Without addresses, the trains
+    are discovered first (``count`` trains, or all within ``timeout``).
+
+    Raises:
+        TrainRemoteError: If a worker could not connect to its trains.
+    """
+
+    def __init__(
+        self,
+        addresses: Optional[Sequence[str]] = None,
+        count: Optional[int] = None,
+        workers: Optional[int] = None,
+        adapters: Optional[Sequence[str]] = None,
+        timeout: float = 5.0,
+    ):
+        if addresses is None:
+            addresses = discover(count, timeout, adapters)
+
+        workers = min(workers or multiprocessing.cpu_count(), len(addresses))
+        shards = [list(addresses[i::workers]) for i in range(workers)]
+
+        context = multiprocessing.get_context("spawn")
+        self.__processes: List[multiprocessing.process.BaseProcess] = []
+        self.__clients: List[TrainClient] = []
+
+        connections: List["Connection"] = []
+        try:
+            for i, shard in enumerate(shards):
+                parent, child = context.Pipe()
+                adapter = adapters[i % len(adapters)] if adapters else None
+                process = context.Process(
+                    target=_worker_main,
+                    args=(child, shard, adapter, timeout),
+                    name=f"trainlib-shard-{i}",
+                    daemon=True,
+                )
+                process.start()
+                child.close()
+                self.__processes.append(process)
+                connections.append(parent)
+
+            # the workers connect to their trains in parallel
+            while connections:
+                try:
+                    error = connections[0].recv_bytes()
+                except EOFError:
+                    error = b"Worker exited."
+                if error:
+                    raise TrainRemoteError(error.decode("utf-8"))
+                self.__clients.append(TrainClient(PipeChannel(connections.pop(0))))
+        except BaseException:
+            for connection in connections:
+                connection.close()
+            self.close()
+            raise
+
+    @property
+    def trains(self) -> List[RemoteTrain]:
+        """Proxies of all trains of all workers."""
+        return [train for client in self.__clients for train in client.trains]
+
+    def close(self, timeout: float = 10.0):
+        """Disconnect all trains and stop the workers."""
+        for client in self.__clients:
+            client.close()
+        self.__clients.clear()
+
+        for process in self.__processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.__processes.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,764 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Discrete-event simulator of trains on a track layout.
+
+The simulator models trains driving on a layout of track segments with
+color snaps and split tracks. Every simulated train has a BLE driver that
+answers the commands and produces movement notifications and events in the
+same binary format as the hardware, so the regular :class:`Train` and
+:class:`TrainScanner` APIs (and the code built on them) run unchanged::
+
+    loop = Segment("loop", 300, next="loop").add_snap(50, [C.WHITE, C.RED])
+    sim = Simulator(TrackLayout([loop]))
+    sim.add_train("loop")
+
+    with sim.install():
+        train = TrainScanner().get_train()
+        train.add_snap_command_detection_listener(on_snap)
+        train.drive_at_speed(40)
+        sim.run(3600)  # one simulated hour in a few seconds
+
+Time is virtual and advances in steps as fast as possible. After every step
+with notifications, the simulator waits until the trains' event loops and
+listeners have processed them, so the listeners react "instantly" in
+simulated time. The simulated time is a :class:`~trainlib.clock.VirtualClock`
+installed as the trains' clock, so the built-in waits (e.g. decoupling) and
+the command timeouts take simulated time, and listeners sleeping on the
+clock do not hold the simulation back.
+
+Simulated time only passes in :meth:`Simulator.step` (and :meth:`~Simulator.run`
+etc.). A blocking wait on the simulated time (``train.clock.sleep``,
+:meth:`Train.decouple_wagon`, :func:`~trainlib.calibration.calibrate` ...)
+in the thread driving the simulation therefore hangs. Either step the
+simulator from another thread, or let :meth:`Simulator.install` step it in
+the background whenever a thread waits on the simulated time::
+
+    with sim.install(background=True):
+        train = TrainScanner().get_train()
+        train.drive_at_speed(40)
+        train.clock.sleep(10)  # ten simulated seconds
+        train.decouple_wagon()
+
+The model is simplified: speeds change with a constant acceleration, the
+built-in snap actions are not executed, and collisions are detected only
+between trains on the same segment.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import random
+import struct
+import threading
+import time
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from intelino.trainlib_async import Train as AsyncTrain
+from intelino.trainlib_async.drivers.train_ble_driver import TrainBleDriver
+from intelino.trainlib_async.train_ble_device import TrainBleDevice
+from intelino.trainlib_async.train_ble_packet import TrainBlePacket
+
+from .clock import VirtualClock, set_clock
+from .enums import MovementDirection, SnapColorValue, SteeringDecision
+from .messages import EventId
+from .metrics import REGISTRY
+
+
+# width of a color snap
+SNAP_WIDTH_CM = 1.5
+# distance between the front and the back color sensor
+TRAIN_LENGTH_CM = 10.5
+# speeds of the speed levels 1, 2 and 3
+SPEED_LEVELS_CMPS = {0: 0.0, 1: 20.0, 2: 30.0, 3: 45.0}
+ACCELERATION_CMPS2 = 60.0
+MAX_SPEED_CMPS = 75.0
+# real time between checks for waits on the simulated time (background mode)
+BACKGROUND_POLL_S = 0.001
+
+# old (BLE API) split decision values
+_OLD_DECISIONS = {
+    SteeringDecision.NONE: 0,
+    SteeringDecision.LEFT: 1,
+    SteeringDecision.RIGHT: 2,
+    SteeringDecision.STRAIGHT: 3,
+}
+_NEW_DECISIONS = {old: new for new, old in _OLD_DECISIONS.items()}
+
+
+@dataclass
+class Split:
+    """Split track at the end of a segment leading to two segments."""
+
+    left: str
+    right: str
+
+
+@dataclass
+class Segment:
+    """Track segment with color snaps.
+
+    ``next`` is the following segment (name), a :class:`Split` or ``None``
+    (dead end). ``colors`` are ``(offset_cm, color)`` snaps.
+    """
+
+    name: str
+    length_cm: float
+    next: Union[str, Split, None] = None
+    colors: List[Tuple[float, SnapColorValue]] = field(default_factory=list)
+
+    def add_snap(self, offset_cm: float, colors: Sequence[SnapColorValue]) -> "Segment":
+        """Add a snap command (adjacent color snaps) at the offset."""
+        for i, color in enumerate(colors):
+            self.colors.append((offset_cm + i * SNAP_WIDTH_CM, SnapColorValue(color)))
+        self.colors.sort()
+        return self
+
+
+def _transitions(segment: Segment, forward: bool) -> List[Tuple[float, SnapColorValue]]:
+    """Positions where the color under a sensor changes, in the order of
+    driving through the segment in the given direction."""
+    changes: Dict[float, SnapColorValue] = {}
+    for offset, color in segment.colors:
+        enter, leave = (
+            (offset, offset + SNAP_WIDTH_CM)
+            if forward
+            else (offset + SNAP_WIDTH_CM, offset)
+        )
+        changes.setdefault(leave, SnapColorValue.BLACK)
+        changes[enter] = color
+    return sorted(changes.items(), reverse=not forward)
+
+
+class TrackLayout:
+    """Track layout of connected segments.
+
+    Driving backward follows the segment connections in reverse. When
+    several segments lead to the same segment (a merge), the first one
+    defined is used.
+
+    Raises:
+        ValueError: If a segment leads to an unknown segment.
+    """
+
+    def __init__(self, segments: Sequence[Segment]):
+        self.segments: Dict[str, Segment] = {s.name: s for s in segments}
+        self.previous: Dict[str, str] = {}
+
+        for segment in segments:
+            if isinstance(segment.next, Split):
+                successors = [segment.next.left, segment.next.right]
+            else:
+                successors = [segment.next] if segment.next else []
+            for name in successors:
+                if name not in self.segments:
+                    raise ValueError(
+                        f"Segment '{segment.name}' leads to unknown segment '{name}'!"
+                    )
+                self.previous.setdefault(name, segment.name)
+
+        self.forward_transitions = {
+            name: _transitions(s, True) for name, s in self.segments.items()
+        }
+        self.backward_transitions = {
+            name: _transitions(s, False) for name, s in self.segments.items()
+        }
+
+    @classmethod
+    def loop(
+        cls,
+        length_cm: float = 300.0,
+        snaps: Sequence[Tuple[float, Sequence[SnapColorValue]]] = (),
+    ) -> "TrackLayout":
+        """Single loop named ``"loop"`` with snaps at the given offsets."""
+        segment = Segment("loop", length_cm, next="loop")
+        for offset, colors in snaps:
+            segment.add_snap(offset, colors)
+        return cls([segment])
+
+
+@dataclass
+class Collision:
+    """Two trains overlapping on a segment (recorded once per contact)."""
+
+    time_s: float
+    trains: Tuple[str, str]
+    segment: str
+
+
+class SimulatedTrain:
+    """Physical state and firmware of a simulated train."""
+
+    def __init__(
+        self,
+        simulator: "Simulator",
+        address: str,
+        name: str,
+        segment: str,
+        offset_cm: float,
+        length_cm: float,
+    ):
+        self.simulator = simulator
+        self.address = address
+        self.name = name
+        self.segment = segment
+        self.offset_cm = offset_cm
+        self.length_cm = length_cm
+
+        self.direction = MovementDirection.STOP
+        self.speed_cmps = 0.0
+        self.target_speed_cmps = 0.0
+        self.odometer_cm = 0.0
+        self.next_split_decision = SteeringDecision.NONE
+
+        self.streaming = False
+        self.stream_interval_s = 0.1
+        self.next_stream_s = 0.0
+
+        # settings written by commands (LEDs, snap feedback etc.) by command id
+        self.settings: Dict[int, List[int]] = {}
+        self.decouplings: List[float] = []
+
+        self.__snap: Optional[List[SnapColorValue]] = None
+        self.__snap_counter = 0
+        # colors waiting for the trailing sensor: (odometer_cm, color)
+        self.__trailing: Deque[Tuple[float, SnapColorValue]] = deque()
+
+        self.driver = SimulatedDriver(self)
+
+    # notifications
+
+    def __timestamp_ms(self) -> int:
+        return int(self.simulator.time * 1000) & 0xFFFFFFFF
+
+    def __event(self, event_id: EventId, body: bytes = b""):
+        payload = struct.pack(">BL", event_id, self.__timestamp_ms()) + body
+        self.driver.notify(bytes([0xE0, len(payload)]) + payload)
+
+    def movement_packet(self) -> bytes:
+        pwm = int(min(self.speed_cmps / MAX_SPEED_CMPS, 1.0) * 255)
+        payload = struct.pack(
+            ">BHB?HBB?BBLBB",
+            self.direction,
+            int(self.speed_cmps * 10),
+            0xFF - pwm,
+            True,
+            int(self.target_speed_cmps * 10),
+            0,
+            _OLD_DECISIONS.get(self.next_split_decision, 0),
+            False,
+            0,
+            0,
+            int(self.odometer_cm),
+            0,
+            0,
+        )
+        return bytes([0xB7, len(payload)]) + payload
+
+    # commands
+
+    def __set_direction(self, direction: int):
+        if direction == MovementDirection.CURRENT:
+            return
+        if direction == MovementDirection.INVERT:
+            direction = (
+                MovementDirection.BACKWARD
+                if self.direction == MovementDirection.FORWARD
+                else MovementDirection.FORWARD
+            )
+        direction = MovementDirection(direction)
+        if direction != self.direction:
+            if MovementDirection.STOP not in (direction, self.direction):
+                # reversing stops the train first
+                self.speed_cmps = 0.0
+            self.direction = direction
+            self.__trailing.clear()
+            self.__event(EventId.MOVEMENT_DIRECTION_CHANGED, bytes([direction]))
+
+    def handle_command(self, command_id: int, payload: bytes):
+        if command_id == 0xBA:
+            self.__set_direction(payload[0])
+            self.target_speed_cmps = min(float(payload[1]), MAX_SPEED_CMPS)
+        elif command_id == 0xB8:
+            self.__set_direction(payload[0])
+            self.target_speed_cmps = SPEED_LEVELS_CMPS.get(payload[1], 0.0)
+        elif command_id == 0xBC:
+            self.__set_direction(payload[0])
+            self.target_speed_cmps = (0xFF - payload[1]) / 255 * MAX_SPEED_CMPS
+        elif command_id == 0xB9:
+            self.target_speed_cmps = 0.0
+        elif command_id == 0xBF:
+            self.next_split_decision = _NEW_DECISIONS.get(
+                payload[0], SteeringDecision.NONE
+            )
+        elif command_id == 0xB7:
+            flags = payload[0] if payload else 0
+            if flags & 0b100:
+                self.streaming = bool(flags & 0b010)
+                if len(payload) > 1:
+                    self.stream_interval_s = payload[1] / 100
+                self.next_stream_s = self.simulator.time + self.stream_interval_s
+            elif not flags & 0b001:
+                self.driver.notify(self.movement_packet())
+        elif command_id == 0x3E:
+            self.driver.notify(
+                bytes([0x3E, 4]) + struct.pack(">L", int(self.odometer_cm))
+            )
+        elif command_id == 0x80:
+            self.decouplings.append(self.simulator.time)
+        else:
+            self.settings[command_id] = list(payload)
+
+    # simulation
+
+    def __color(self, color: SnapColorValue):
+        """Color under the leading sensor changed."""
+        leading = (
+            EventId.FRONT_COLOR_CHANGED
+            if self.direction != MovementDirection.BACKWARD
+            else EventId.BACK_COLOR_CHANGED
+        )
+        self.__event(leading, struct.pack(">LB", 0, color))
+        self.__trailing.append((self.odometer_cm + self.length_cm, color))
+
+        # snap commands start with white or cyan and end with black
+        if color in (SnapColorValue.WHITE, SnapColorValue.CYAN):
+            self.__snap = [color]
+        elif self.__snap is not None:
+            if color == SnapColorValue.BLACK:
+                colors = (self.__snap + [SnapColorValue.BLACK] * 3)[:4]
+                self.__snap = None
+                self.__snap_counter = (self.__snap_counter + 1) & 0xFF
+                self.__event(
+                    EventId.SNAP_COMMAND_DETECTED,
+                    bytes([self.__snap_counter] + colors),
+                )
+            elif len(self.__snap) < 4:
+                self.__snap.append(color)
+
+    def __trailing_colors(self):
+        trailing = (
+            EventId.BACK_COLOR_CHANGED
+            if self.direction != MovementDirection.BACKWARD
+            else EventId.FRONT_COLOR_CHANGED
+        )
+        while self.__trailing and self.__trailing[0][0] <= self.odometer_cm:
+            _, color = self.__trailing.popleft()
+            self.__event(trailing, struct.pack(">LB", 0, color))
+
+    def __enter_next_segment(self) -> bool:
+        layout = self.simulator.layout
+        following = layout.segments[self.segment].next
+        if isinstance(following, Split):
+            decision = self.next_split_decision
+            if decision not in (SteeringDecision.LEFT, SteeringDecision.RIGHT):
+                decision = self.simulator.random.choice(
+                    [SteeringDecision.LEFT, SteeringDecision.RIGHT]
+                )
+            following = (
+                following.left if decision == SteeringDecision.LEFT else following.right
+            )
+            self.next_split_decision = SteeringDecision.NONE
+            self.__event(EventId.SPLIT_DECISION, struct.pack(">BL", decision, 0))
+        if following is None:
+            return False
+        self.segment = following
+        self.offset_cm = 0.0
+        return True
+
+    def __enter_previous_segment(self) -> bool:
+        layout = self.simulator.layout
+        previous = layout.previous.get(self.segment)
+        if previous is None:
+            return False
+        self.segment = previous
+        self.offset_cm = layout.segments[previous].length_cm
+        return True
+
+    def __move(self, distance_cm: float):
+        layout = self.simulator.layout
+        forward = self.direction == MovementDirection.FORWARD
+        while distance_cm > 0:
+            segment = layout.segments[self.segment]
+            if forward:
+                step = min(distance_cm, segment.length_cm - self.offset_cm)
+                start, end = self.offset_cm, self.offset_cm + step
+                crossed = [
+                    (position - start, color)
+                    for position, color in layout.forward_transitions[self.segment]
+                    if start <= position < end
+                ]
+            else:
+                step = min(distance_cm, self.offset_cm)
+                start, end = self.offset_cm, self.offset_cm - step
+                crossed = [
+                    (start - position, color)
+                    for position, color in layout.backward_transitions[self.segment]
+                    if end < position <= start
+                ]
+
+            odometer_cm = self.odometer_cm
+            for travelled, color in crossed:
+                self.odometer_cm = odometer_cm + travelled
+                self.__color(color)
+            self.odometer_cm = odometer_cm + step
+            self.offset_cm = end
+            distance_cm -= step
+
+            at_end = end >= segment.length_cm if forward else end <= 0
+            if at_end and distance_cm > 0:
+                entered = (
+                    self.__enter_next_segment()
+                    if forward
+                    else self.__enter_previous_segment()
+                )
+                if not entered:
+                    # dead end
+                    self.speed_cmps = self.target_speed_cmps = 0.0
+                    break
+            elif step == 0:
+                break
+
+        self.__trailing_colors()
+
+    def step(self, dt: float):
+        if self.speed_cmps < self.target_speed_cmps:
+            self.speed_cmps = min(
+                self.target_speed_cmps, self.speed_cmps + ACCELERATION_CMPS2 * dt
+            )
+        elif self.speed_cmps > self.target_speed_cmps:
+            self.speed_cmps = max(
+                self.target_speed_cmps, self.speed_cmps - ACCELERATION_CMPS2 * dt
+            )
+
+        if self.direction in (MovementDirection.FORWARD, MovementDirection.BACKWARD):
+            if self.speed_cmps > 0:
+                self.__move(self.speed_cmps * dt)
+            elif self.target_speed_cmps == 0:
+                self.__set_direction(MovementDirection.STOP)
+
+        if self.streaming and self.simulator.time >= self.next_stream_s:
+            self.driver.notify(self.movement_packet())
+            self.next_stream_s += self.stream_interval_s
+
+
+class SimulatedDriver(TrainBleDriver):
+    """BLE driver of a simulated train."""
+
+    def __init__(self, train: SimulatedTrain):
+        self.__train = train
+        self.__connected = False
+        self.__response_callback: Optional[Callable[[TrainBlePacket], None]] = None
+        self.__disconnect_callback: Optional[Callable] = None
+        # event loop of the connection (for settling the notifications)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self.__connected
+
+    @property
+    def id(self) -> str:
+        return self.__train.address
+
+    @property
+    def name(self) -> str:
+        return self.__train.name
+
+    @property
+    def raw(self) -> SimulatedTrain:
+        return self.__train
+
+    async def connect(self, **kwargs) -> bool:
+        self.loop = asyncio.get_running_loop()
+        self.__connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        self.__connected = False
+        self.loop = None
+        return True
+
+    async def send_command(self, data: TrainBlePacket) -> None:
+        with self.__train.simulator.lock:
+            self.__train.handle_command(data.command, bytes(data.payload))
+
+    def notify(self, data: bytes):
+        if not self.__train.simulator._post(self, data):
+            self._deliver(data)
+
+    def _deliver(self, data: bytes):
+        if self.__connected and self.__response_callback is not None:
+            self.__train.simulator._notified()
+            self.__response_callback(TrainBlePacket(bytearray(data)))
+
+    def set_response_listener(self, callback: Callable[[TrainBlePacket], None]) -> None:
+        self.__response_callback = callback
+
+    def set_disconnect_listener(self, callback: Callable) -> None:
+        self.__disconnect_callback = callback
+
+
+class Simulator:
+    """Simulated trains on a track layout with a virtual clock.
+
+    It also implements the train factory interface used by
+    :class:`TrainScanner` (see :meth:`install`).
+    """
+
+    def __init__(
+        self,
+        layout: TrackLayout,
+        step_s: float = 0.02,
+        seed: Optional[int] = None,
+        settle_timeout_s: float = 1.0,
+        clock: Optional[VirtualClock] = None,
+    ):
+        """
+        Args:
+            layout (TrackLayout): Track layout.
+            step_s (float): Simulation time step in seconds.
+            seed (int): Seed of the random split decisions.
+            settle_timeout_s (float): Maximum real time to wait for the
+                listeners after a step (a blocked listener must not stop the
+                simulation forever).
+            clock (VirtualClock): Clock of the simulated time. It must not
+                advance by itself (``auto_advance``).
+        """
+        self.layout = layout
+        self.step_s = step_s
+        self.settle_timeout_s = settle_timeout_s
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.collisions: List[Collision] = []
+
+        self.clock = clock or VirtualClock()
+        self.__trains: List[SimulatedTrain] = []
+        self.__async_trains: Dict[str, AsyncTrain] = {}
+        self.__notifications = 0
+        self.__contacts: Set[Tuple[str, str]] = set()
+        # notifications of a step, delivered after releasing the lock (the
+        # trains' event loops may be waiting for it to send a command)
+        self.__outbox: Optional[List[Tuple[SimulatedDriver, bytes]]] = None
+
+    @property
+    def time(self) -> float:
+        """Simulated time in seconds."""
+        return self.clock.time()
+
+    @property
+    def trains(self) -> List[SimulatedTrain]:
+        return list(self.__trains)
+
+    def add_train(
+        self,
+        segment: str,
+        offset_cm: float = 0.0,
+        name: Optional[str] = None,
+        address: Optional[str] = None,
+        length_cm: float = TRAIN_LENGTH_CM,
+    ) -> SimulatedTrain:
+        """Place a new train on the layout."""
+        if segment not in self.layout.segments:
+            raise ValueError(f"Unknown segment '{segment}'!")
+
+        number = len(self.__trains) + 1
+        train = SimulatedTrain(
+            self,
+            address or f"SIM:00:00:00:00:{number:02X}",
+            name or f"intelino sim {number}",
+            segment,
+            offset_cm,
+            length_cm,
+        )
+        self.__trains.append(train)
+        self.__async_trains[train.address] = AsyncTrain(TrainBleDevice(train.driver))
+        return train
+
+    def _post(self, driver: SimulatedDriver, data: bytes) -> bool:
+        """Queue a notification while stepping (the lock is held)."""
+        if self.__outbox is None:
+            return False
+        self.__outbox.append((driver, data))
+        return True
+
+    def _notified(self):
+        self.__notifications += 1
+
+    # train factory interface
+
+    def __available(self) -> List[AsyncTrain]:
+        return [
+            train for train in self.__async_trains.values() if not train.is_connected
+        ]
+
+    async def create_train(
+        self, device_identifier: str = None, connect: bool = True, **kwargs
+    ) -> Optional[AsyncTrain]:
+        """Same as :meth:`TrainFactory.create_train` for simulated trains."""
+        trains = self.__available()
+        if device_identifier:
+            trains = [t for t in trains if t.id == device_identifier]
+        if not trains:
+            return None
+        if connect:
+            await trains[0].connect()
+        return trains[0]
+
+    async def create_trains(
+        self, count: int = None, timeout: float = 5.0, connect: bool = True, **kwargs
+    ) -> List[AsyncTrain]:
+        """Same as :meth:`TrainFactory.create_trains` for simulated trains."""
+        trains = self.__available()[: count or None]
+        if connect:
+            for train in trains:
+                await train.connect()
+        return trains
+
+    @contextmanager
+    def install(self, background: bool = False) -> Iterator["Simulator"]:
+        """Make :class:`TrainScanner` discover the simulated trains and use
+        the simulated time as the process-wide clock.
+
+        Args:
+            background (bool): Step the simulation in a background thread
+                whenever a thread waits on the simulated time, so blocking
+                waits return without stepping the simulator explicitly. Do
+                not call :meth:`step` (or :meth:`run`) meanwhile.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .train_scanner import set_train_factory
+
+        previous_factory = set_train_factory(self)
+        previous_clock = set_clock(self.clock)
+        stop = threading.Event()
+        stepper = None
+        if background:
+            stepper = threading.Thread(
+                target=self.__step_while_waited, args=(stop,), daemon=True
+            )
+            stepper.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            if stepper is not None:
+                stepper.join()
+            set_clock(previous_clock)
+            set_train_factory(previous_factory)
+
+    def __step_while_waited(self, stop: threading.Event):
+        while not stop.is_set():
+            if self.clock.sleeping:
+                self.step()
+            else:
+                stop.wait(BACKGROUND_POLL_S)
+
+    # simulation
+
+    def __settle(self):
+        deadline = time.monotonic() + self.settle_timeout_s
+        metrics = {m.train_id: m for m in REGISTRY.trains()}
+        while True:
+            notifications = self.__notifications
+            for train in self.__trains:
+                loop = train.driver.loop
+                if loop is not None and not loop.is_closed():
+                    try:
+                        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(
+                            self.settle_timeout_s
+                        )
+                    except Exception:  # pylint: disable=broad-except
+                        # the loop is stopping (disconnect)
+                        pass
+
+            # listeners sleeping on the simulated time are idle
+            while (
+                sum(
+                    metrics[train.address].listeners_in_flight
+                    for train in self.__trains
+                    if train.address in metrics
+                )
+                > self.clock.sleeping
+                and time.monotonic() < deadline
+            ):
+                time.sleep(0.0002)
+
+            if notifications == self.__notifications or time.monotonic() >= deadline:
+                break
+
+    def __detect_collisions(self):
+        contacts = set()
+        for i, a in enumerate(self.__trains):
+            for b in self.__trains[i + 1 :]:
+                if a.segment == b.segment and abs(a.offset_cm - b.offset_cm) < max(
+                    a.length_cm, b.length_cm
+                ):
+                    contacts.add((a.address, b.address))
+                    if (a.address, b.address) not in self.__contacts:
+                        self.collisions.append(
+                            Collision(self.time, (a.address, b.address), a.segment)
+                        )
+        self.__contacts = contacts
+
+    def step(self):
+        """Advance the simulation by one time step."""
+        notifications = self.__notifications
+        now = self.time + self.step_s
+        deadline = self.clock.next_deadline
+        # wake the waits first, their commands apply to this step
+        self.clock.advance_to(now)
+        if deadline is not None and deadline <= now:
+            self.__settle()
+
+        with self.lock:
+            self.__outbox = []
+            try:
+                for train in self.__trains:
+                    train.step(self.step_s)
+                self.__detect_collisions()
+            finally:
+                outbox, self.__outbox = self.__outbox, None
+        for driver, data in outbox:
+            driver._deliver(data)
+
+        if notifications != self.__notifications:
+            self.__settle()
+
+    def run(self, duration_s: float):
+        """Advance the simulation by the duration."""
+        end = self.time + duration_s
+        while self.time + self.step_s / 2 < end:
+            self.step()
+
+    def run_until(
+        self, condition: Callable[[], bool], timeout_s: float = float("inf")
+    ) -> bool:
+        """Advance the simulation until the condition is true or the
+        simulated timeout expires.
+
+        Returns:
+            Whether the condition was met.
+        """
+        end = self.time + timeout_s
+        while not condition():
+            if self.time >= end:
+                return False
+            self.step()
+        return True
@@ -0,0 +1,129 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Snap command pattern matching.
+
+Snap patterns are tuples of :class:`SnapColorValue` where ``ANY`` matches
+any color. Exact patterns are padded with black to 4 colors (like
+:class:`SnapCommand` comparisons), a trailing ``...`` makes a prefix
+pattern::
+
+    train.on_snap((C.WHITE, C.RED), on_red)                # exact
+    train.on_snap((C.WHITE, C.BLUE, ...), on_blue)         # prefix
+    train.on_snap((C.WHITE, ANY, C.GREEN), on_any_green)   # wildcard
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .enums import SnapColorValue
+
+
+ANY = None
+"""Wildcard matching any single snap color."""
+
+SNAP_LENGTH = 4
+
+# (colors, is prefix)
+PatternKey = Tuple[Tuple[Optional[SnapColorValue], ...], bool]
+
+
+def compile_pattern(pattern: Sequence) -> PatternKey:
+    """Normalize a pattern to its colors and whether it is a prefix.
+
+    Raises:
+        ValueError: If the pattern is longer than a snap command.
+    """
+    colors = tuple(pattern)
+    prefix = bool(colors) and colors[-1] is Ellipsis
+    if prefix:
+        colors = colors[:-1]
+
+    if len(colors) > SNAP_LENGTH or Ellipsis in colors:
+        raise ValueError(f"Invalid snap pattern {pattern!r}!")
+
+    colors = tuple(ANY if c is ANY else SnapColorValue(c) for c in colors)
+    if not prefix:
+        colors += (SnapColorValue.BLACK,) * (SNAP_LENGTH - len(colors))
+
+    return colors, prefix
+
+
+class _Node:
+    __slots__ = ("children", "exact", "prefix")
+
+    def __init__(self):
+        self.children: Dict[Optional[SnapColorValue], _Node] = {}
+        self.exact: Tuple[Callable, ...] = ()
+        self.prefix: Tuple[Callable, ...] = ()
+
+
+class SnapPatternIndex:
+    """Trie of snap patterns.
+
+    Matching walks the trie along the colors of the snap command (and the
+    wildcard branches), so it takes the same time regardless of how many
+    patterns are registered. Mutations rebuild the trie and swap it in, so
+    :meth:`match` never locks.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__patterns: List[Tuple[PatternKey, Callable]] = []
+        self.__root = _Node()
+
+    def __rebuild(self):
+        root = _Node()
+        for (colors, prefix), callback in self.__patterns:
+            node = root
+            for color in colors:
+                node = node.children.setdefault(color, _Node())
+            if prefix:
+                node.prefix += (callback,)
+            else:
+                node.exact += (callback,)
+        self.__root = root
+
+    def add(self, pattern: Sequence, callback: Callable):
+        entry = (compile_pattern(pattern), callback)
+        with self.__lock:
+            if entry not in self.__patterns:
+                self.__patterns.append(entry)
+                self.__rebuild()
+
+    def remove(self, pattern: Sequence, callback: Callable):
+        """Remove a pattern callback. Raises ``KeyError`` if it is not
+        registered."""
+        entry = (compile_pattern(pattern), callback)
+        with self.__lock:
+            if entry not in self.__patterns:
+                raise KeyError(pattern)
+            self.__patterns.remove(entry)
+            self.__rebuild()
+
+    def __bool__(self) -> bool:
+        return bool(self.__patterns)
+
+    def match(self, colors: Sequence[SnapColorValue]) -> Tuple[Callable, ...]:
+        """Callbacks of all patterns matching the snap command colors."""
+        matched: Tuple[Callable, ...] = ()
+        nodes = [self.__root]
+        for color in colors[:SNAP_LENGTH]:
+            next_nodes = []
+            for node in nodes:
+                matched += node.prefix
+                for key in (color, ANY):
+                    child = node.children.get(key)
+                    if child is not None:
+                        next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                return matched
+
+        for node in nodes:
+            matched += node.prefix + node.exact
+        return matched
@@ -0,0 +1,143 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Closed-loop speed control.
+
+``drive_at_speed`` sets a target, but the speed reported by the train drifts
+on grades and under load. A :class:`SpeedController` runs on the train's
+event loop and corrects the commanded speed with every movement notification
+(a PID controller on top of an optional feed-forward of the target), so no
+polling thread is needed::
+
+    train.start_speed_control(SpeedController(40))
+    ...
+    train.speed_controller.target_cmps = 30
+    ...
+    train.stop_speed_control()
+
+The corrections are rate limited (``min_interval_s``) and skipped when they
+do not change the command by at least one speed increment of the train. If
+a correction is computed while the previous command is still being written,
+only the latest one is sent afterwards.
+"""
+
+from typing import Callable, Optional
+
+from .enums import MovementDirection
+
+
+# speed increment of the train's speed control in cm/s
+SPEED_INCREMENT_CMPS = 0.9425
+# drivable speed range in cm/s
+MIN_SPEED_CMPS = 15.0
+MAX_SPEED_CMPS = 75.0
+
+
+class SpeedController:
+    """PID speed controller with feed-forward, rate limit and dead band."""
+
+    def __init__(
+        self,
+        target_cmps: float,
+        direction: MovementDirection = MovementDirection.FORWARD,
+        kp: float = 0.4,
+        ki: float = 0.2,
+        kd: float = 0.0,
+        feed_forward: Optional[Callable[[float], float]] = None,
+        min_interval_s: float = 0.25,
+        deadband_cmps: float = SPEED_INCREMENT_CMPS,
+    ):
+        """
+        Args:
+            target_cmps (float): Target speed in cm/s.
+            direction (MovementDirection): Movement direction.
+            kp, ki, kd (float): Proportional, integral and derivative gains.
+            feed_forward: Command for a target speed, e.g. from a calibration
+                profile (:meth:`SpeedProfile.command_for`). Defaults to the
+                target itself.
+            min_interval_s (float): Minimal time between two corrections.
+            deadband_cmps (float): Minimal change of the command to send it.
+        """
+        self.target_cmps = target_cmps
+        self.direction = direction
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.feed_forward = feed_forward
+        self.min_interval_s = min_interval_s
+        self.deadband_cmps = deadband_cmps
+
+        # number of processed notifications and emitted commands
+        self.updates = 0
+        self.commands = 0
+
+        self.__integral = 0.0
+        self.__last_error: Optional[float] = None
+        self.__last_time: Optional[float] = None
+        self.__last_command: Optional[float] = None
+        self.__last_command_time = float("-inf")
+
+    @property
+    def command_cmps(self) -> Optional[float]:
+        """Last emitted command (``None`` before the start)."""
+        return self.__last_command
+
+    def __base(self) -> float:
+        if self.feed_forward is None:
+            return self.target_cmps
+        return self.feed_forward(self.target_cmps)
+
+    def start(self, now: float) -> float:
+        """Reset the controller state.
+
+        Returns:
+            The initial command (the feed-forward of the target).
+        """
+        self.__integral = 0.0
+        self.__last_error = None
+        self.__last_time = now
+        return self.__emit(self.__base(), now)
+
+    def update(self, speed_cmps: float, now: float) -> Optional[float]:
+        """Process a measured speed.
+
+        Returns:
+            The command to send, or ``None`` if it is rate limited or does
+            not change the last command.
+        """
+        self.updates += 1
+        error = self.target_cmps - speed_cmps
+        dt = 0.0 if self.__last_time is None else now - self.__last_time
+        derivative = 0.0
+        if self.__last_error is not None and dt > 0:
+            derivative = (error - self.__last_error) / dt
+        self.__last_error = error
+        self.__last_time = now
+
+        integral = self.__integral + error * dt
+        command = self.__base() + self.kp * error + self.ki * integral
+        command += self.kd * derivative
+        clamped = max(MIN_SPEED_CMPS, min(MAX_SPEED_CMPS, command))
+        # no integration while saturated (anti-windup)
+        if clamped == command:
+            self.__integral = integral
+
+        if now - self.__last_command_time < self.min_interval_s:
+            return None
+        if (
+            self.__last_command is not None
+            and abs(clamped - self.__last_command) < self.deadband_cmps
+        ):
+            return None
+        return self.__emit(clamped, now)
+
+    def __emit(self, command: float, now: float) -> float:
+        command = max(MIN_SPEED_CMPS, min(MAX_SPEED_CMPS, command))
+        self.commands += 1
+        self.__last_command = command
+        self.__last_command_time = now
+        return command
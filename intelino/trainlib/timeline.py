@@ -0,0 +1,181 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Timelines of commands across many trains.
+
+A :class:`Timeline` is a show or an operating schedule: commands of the
+awaitable train API (:class:`~intelino.trainlib.train_aio.AioTrain`) with
+time triggers (seconds since the start) or distance triggers (centimeters
+travelled by the train since the start)::
+
+    timeline = Timeline()
+    for train in trains:
+        timeline.at(0.0, train, "set_top_led_color", 255, 0, 0)
+        timeline.at(1.0, train, "drive_at_speed", 40)
+        timeline.at_distance(50, train, "stop_driving")
+    timeline.run()
+
+A single scheduler thread keeps the pending cues in a heap ordered by their
+dispatch time and submits each command to its train's event loop without
+waiting for it, so a slow train does not delay the cues of the others.
+Every command is dispatched ahead of its cue by the mean round trip of the
+command measured on its train (:meth:`TrainMetrics.command_latency`), and a
+distance cue is re-planned from the train's speed until it is due. The
+lateness of the dispatched time cues is collected in :attr:`Timeline.lateness`.
+"""
+
+import concurrent.futures
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .clock import Clock, get_clock
+from .metrics import Histogram
+
+if TYPE_CHECKING:
+    from .train import Train
+
+
+TIME = "time"
+DISTANCE = "distance"
+
+# longest scheduler sleep, i.e. the reaction time to stop() and the period
+# of re-planning the distance cues
+POLL_INTERVAL_S = 0.05
+# lateness histogram buckets in seconds
+LATENESS_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+@dataclass
+class Cue:
+    """Command of a train triggered at a time or a distance."""
+
+    # seconds since the start (TIME) or cm travelled by the train (DISTANCE)
+    at: float
+    train: "Train"
+    # name of an AioTrain method
+    command: str
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    by: str = TIME
+
+
+class Timeline:
+    """Cues of many trains dispatched by a single scheduler."""
+
+    def __init__(self, clock: Optional[Clock] = None, compensate_latency: bool = True):
+        """
+        Args:
+            clock (Clock): Time source of the scheduler. Defaults to the
+                process-wide clock (:func:`trainlib.clock.get_clock`).
+            compensate_latency (bool): Dispatch the commands ahead of their
+                cues by their measured round trips.
+        """
+        self.clock = clock
+        self.compensate_latency = compensate_latency
+        self.cues: List[Cue] = []
+        # how late the time cues were dispatched (in seconds)
+        self.lateness = Histogram(LATENESS_BUCKETS)
+
+        self.__stop = threading.Event()
+
+    def at(self, seconds: float, train: "Train", command: str, *args, **kwargs):
+        """Add a command dispatched ``seconds`` after the start.
+
+        Example:
+            >>> timeline.at(2.5, train, "set_next_split_steering_decision",
+            ...             SteeringDecision.LEFT)
+        """
+        return self.add(Cue(seconds, train, command, args, kwargs, TIME))
+
+    def at_distance(
+        self, distance_cm: float, train: "Train", command: str, *args, **kwargs
+    ):
+        """Add a command dispatched when the train travelled ``distance_cm``
+        since the start."""
+        return self.add(Cue(distance_cm, train, command, args, kwargs, DISTANCE))
+
+    def add(self, cue: Cue) -> "Timeline":
+        """Add a cue.
+
+        Raises:
+            ValueError: If the trigger or the command is unknown.
+        """
+        if cue.by not in (TIME, DISTANCE):
+            raise ValueError(f"Unknown cue trigger {cue.by!r}!")
+        if not callable(getattr(cue.train.aio, cue.command, None)):
+            raise ValueError(f"Unknown train command {cue.command!r}!")
+        self.cues.append(cue)
+        return self
+
+    def stop(self):
+        """Stop a running timeline (from another thread or a listener); the
+        pending cues are dropped."""
+        self.__stop.set()
+
+    def __lead(self, cue: Cue) -> float:
+        if not self.compensate_latency:
+            return 0.0
+        return cue.train.metrics.command_latency(cue.command)
+
+    def run(self):
+        """Dispatch all cues and wait for their commands (blocking).
+
+        Raises:
+            Exception: The first error of a dispatched command.
+        """
+        clock = self.clock or get_clock()
+        self.__stop.clear()
+        start = clock.time()
+        start_distances = {id(cue.train): cue.train.distance_cm for cue in self.cues}
+
+        # (dispatch time, sequence, cue); the sequence keeps the order of
+        # cues with the same time
+        sequence = itertools.count()
+        pending: List[Tuple[float, int, Cue]] = []
+        for cue in self.cues:
+            when = start + cue.at - self.__lead(cue) if cue.by == TIME else start
+            pending.append((when, next(sequence), cue))
+        heapq.heapify(pending)
+
+        futures: List["concurrent.futures.Future[Any]"] = []
+        while pending and not self.__stop.is_set():
+            when, _, cue = pending[0]
+            now = clock.time()
+            if when > now:
+                clock.sleep(min(when - now, POLL_INTERVAL_S))
+                continue
+            heapq.heappop(pending)
+
+            if cue.by == DISTANCE:
+                travelled = cue.train.distance_cm - start_distances[id(cue.train)]
+                remaining = cue.at - travelled
+                speed = abs(cue.train.speed_cmps)
+                eta = remaining / speed - self.__lead(cue) if speed else None
+                if remaining > 0 and (eta is None or eta > 0.001):
+                    # not there yet, re-plan with the current speed
+                    delay = POLL_INTERVAL_S if eta is None else eta
+                    heapq.heappush(
+                        pending,
+                        (now + min(delay, POLL_INTERVAL_S), next(sequence), cue),
+                    )
+                    continue
+            else:
+                self.lateness.observe(max(0.0, now - when))
+
+            futures.append(self.__dispatch(cue))
+
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def __dispatch(cue: Cue) -> "concurrent.futures.Future[Any]":
+        command = getattr(cue.train.aio, cue.command)
+        # the awaitable API runs directly on the train's own event loop
+        return cue.train._schedule(command(*cue.args, **cue.kwargs))
@@ -0,0 +1,189 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Tracing hooks around train commands and event listeners.
+
+A :class:`TraceHook` receives a :class:`TraceSpan` when a command or a
+listener starts and the same span (completed) when it ends. The hook can be
+set per train (:attr:`Train.trace_hook`) or for all trains in the process
+(:func:`set_trace_hook`).
+
+Recording a session for ``chrome://tracing`` or https://ui.perfetto.dev::
+
+    with ChromeTraceWriter("session.json") as writer:
+        tracing.set_trace_hook(writer)
+        ...
+"""
+
+from dataclasses import dataclass, field
+import json
+import os
+import threading
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class TraceSpan:
+    """Traced command or listener invocation.
+
+    All timestamps are ``time.monotonic()`` values in seconds.
+    """
+
+    # "command" or "listener"
+    kind: str
+    train_id: str
+    # command type (e.g. "drive_at_speed") or listener name
+    name: str
+    # when the call was requested (before waiting for the command lock)
+    queued: float
+    start: float
+    end: Optional[float] = None
+    # BLE command ids written (commands) or the event id (listeners)
+    command_ids: List[int] = field(default_factory=list)
+    # total payload size of the written commands in bytes
+    payload_size: int = 0
+    thread_id: int = field(default_factory=threading.get_ident)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) if self.end is not None else 0.0
+
+
+class TraceHook:
+    """Base trace hook. Override the callbacks that are needed.
+
+    Callbacks are called from user threads, the train's event loop thread and
+    listener threads, so implementations must be thread-safe and fast.
+    """
+
+    def on_start(self, span: TraceSpan) -> None:
+        pass
+
+    def on_end(self, span: TraceSpan) -> None:
+        pass
+
+
+_trace_hook: Optional[TraceHook] = None
+
+
+def set_trace_hook(hook: Optional[TraceHook]):
+    """Set (or reset with ``None``) the process-wide trace hook used by all
+    trains without their own hook."""
+    global _trace_hook
+    _trace_hook = hook
+
+
+def get_trace_hook() -> Optional[TraceHook]:
+    return _trace_hook
+
+
+class ChromeTraceWriter(TraceHook):
+    """Stream spans to a file in the Chrome trace-event JSON (array) format.
+
+    Every train has its own command track and every listener thread its own
+    track. The time between the request and the start (waiting for the
+    command lock, or from the notification to the listener start) is shown
+    as a separate ``queued`` slice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__pid = os.getpid()
+        self.__file: Optional[IO[str]] = None
+        self.__tracks: Dict[Tuple[str, Any], int] = {}
+
+    def __write(self, event: Dict[str, Any]):
+        # called with the lock held
+        if self.__file is None:
+            self.__file = open(self.path, "w", encoding="utf-8")
+            self.__file.write("[\n")
+        self.__file.write(json.dumps(event) + ",\n")
+
+    def __track(self, span: TraceSpan) -> int:
+        # called with the lock held
+        if span.kind == "command":
+            key: Tuple[str, Any] = (span.train_id, "commands")
+            track_name = f"{span.train_id} commands"
+        else:
+            key = (span.train_id, span.thread_id)
+            track_name = f"{span.train_id} listener {span.thread_id}"
+
+        tid = self.__tracks.get(key)
+        if tid is None:
+            tid = self.__tracks[key] = len(self.__tracks) + 1
+            self.__write(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.__pid,
+                    "tid": tid,
+                    "args": {"name": track_name},
+                }
+            )
+        return tid
+
+    def on_end(self, span: TraceSpan) -> None:
+        end = span.end if span.end is not None else span.start
+        args: Dict[str, Any] = {
+            "train": span.train_id,
+            "command_ids": [f"0x{command_id:02X}" for command_id in span.command_ids],
+            "payload_size": span.payload_size,
+        }
+        if span.error:
+            args["error"] = span.error
+
+        with self.__lock:
+            tid = self.__track(span)
+            if span.start > span.queued:
+                self.__write(
+                    {
+                        "name": "queued",
+                        "cat": span.kind,
+                        "ph": "X",
+                        "ts": span.queued * 1e6,
+                        "dur": (span.start - span.queued) * 1e6,
+                        "pid": self.__pid,
+                        "tid": tid,
+                    }
+                )
+            self.__write(
+                {
+                    "name": span.name,
+                    "cat": span.kind,
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": (end - span.start) * 1e6,
+                    "pid": self.__pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+    def flush(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.flush()
+
+    def close(self):
+        """Finish the JSON array and close the file."""
+        with self.__lock:
+            if self.__file is None:
+                self.__file = open(self.path, "w", encoding="utf-8")
+                self.__file.write("[\n")
+            # the trailing element keeps the array valid after the last comma
+            self.__file.write("{}]\n")
+            self.__file.close()
+            self.__file = None
+            self.__tracks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -8,47 +8,116 @@
 """Synchronous (blocking) train class."""
 
 import asyncio
-from collections import defaultdict
+from collections import deque
+import concurrent.futures
+import contextvars
 import threading
-from typing import Any, Callable, Coroutine, Iterable, List, TypeVar, Union, get_args
+import time
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+    get_args,
+)
 from rx import operators as ops
 from rx.core.typing import Disposable
 
 from intelino.trainlib_async import Train as AsyncTrain
+from intelino.trainlib_async.train_ble_packet import TrainBlePacket
 
+from . import animations, device_state
+from .animations import LedAnimation
+from .clock import Clock, get_clock
+from .device_state import DeviceStateCache
 from .enums import (
     MovementDirection,
     SteeringDecision,
     SpeedLevel,
     StopDrivingFeedbackType,
 )
+from .errors import TrainTimeoutError
+from .filters import ColorEventFilter
+from .listeners import ListenerRegistry, TrainEventListeners
 from .messages import (
     EventId,
     TrainMsg,
     TrainMsgEvent,
-    TrainMsgEventBackColorChanged,
-    TrainMsgEventButtonPressDetected,
-    TrainMsgEventFrontColorChanged,
-    TrainMsgEventLowBattery,
-    TrainMsgEventMovementDirectionChanged,
+    TrainMsgEventSensorColorChangedBase,
     TrainMsgEventSnapCommandDetected,
     TrainMsgEventSnapCommandExecuted,
     TrainMsgEventSplitDecision,
     TrainMsgMovement,
 )
+from .metrics import REGISTRY, TrainMetrics, command_name
+from .sequences import ColorSequence, ColorSequenceRecognizers
+from .snaps import SnapPatternIndex
+from .speed_control import SpeedController
+from .tracing import TraceHook, TraceSpan, get_trace_hook
+from .train_aio import AioTrain
 
 
 T = TypeVar("T")
 
+# time the wagon magnet needs to release the wagon
+DECOUPLE_RELEASE_S = 1.5
+# movement notifications contradicting an optimistic split decision before
+# the train's value is accepted
+SPLIT_DECISION_RECONCILE_COUNT = 3
+
+# span of the traced command running in the current task; the writes stream
+# delivers every write in the context of the task that wrote it
+_traced_span: "contextvars.ContextVar[Optional[TraceSpan]]" = contextvars.ContextVar(
+    "trainlib_traced_span", default=None
+)
+
 
-class Train:
+class Train(TrainEventListeners):
     """Synchronous (blocking) version of the intelino train class."""
 
-    def __init__(self, train: AsyncTrain):
+    def __init__(
+        self,
+        train: AsyncTrain,
+        timeout: Optional[float] = None,
+        adapter: Optional[str] = None,
+        clock: Optional[Clock] = None,
+        lazy: bool = False,
+    ):
+        """
+        Args:
+            train (AsyncTrain): Not connected async train.
+            timeout (float): Default deadline in seconds for every blocking
+                call (see :attr:`default_timeout`). Defaults to no deadline.
+            adapter (str): Bluetooth adapter the async train was created for
+                (bleak binds the adapter when creating its client, see
+                :class:`TrainScanner`). Defaults to the system default adapter.
+            clock (Clock): Clock of the waits and timeouts. Defaults to the
+                process-wide clock (see :mod:`trainlib.clock`).
+            lazy (bool): Do not connect now, but on the first command or with
+                :meth:`connect` / :meth:`connect_nowait`. The train's state
+                (distance, speed etc.) keeps its defaults until then.
+
+        Example:
+            >>> trains = [Train(t, lazy=True) for t in async_trains]
+            >>> print([train.name for train in trains])  # no connection yet
+            >>> ready = [train.connect_nowait() for train in trains]
+        """
         self.__train = train
+        self.__adapter = adapter
+        self.__clock = clock
+        self.default_timeout = timeout
 
         self.__event_loop = asyncio.new_event_loop()
         self.__lock = threading.Lock()
+        # orders the blocking and the awaitable commands on the event loop
+        # (created there on the first command)
+        self.__command_lock: Optional[asyncio.Lock] = None
         self.__thread = threading.Thread(target=self.__event_loop.run_forever)
         self.__thread.start()
 
@@ -58,14 +127,104 @@ class Train:
         self.__direction = MovementDirection.STOP
         self.__speed_cmps = 0
         self.__next_split_decision = SteeringDecision.NONE
+        # split decision set without waiting for a notification (event loop
+        # only) and the number of notifications contradicting it so far
+        self.__optimistic_split_decision: Optional[SteeringDecision] = None
+        self.__split_decision_mismatches = 0
+        # queued decisions of the next splits, the first one is set on the
+        # train (event loop only)
+        self.__split_decisions: Deque[SteeringDecision] = deque()
+        # last applied device settings (event loop only)
+        self.__device_state = DeviceStateCache()
+        # running top LED animation and its wake-up event (event loop only)
+        self.__led_animation: Optional[LedAnimation] = None
+        self.__led_animation_task: Optional["asyncio.Task[None]"] = None
+        self.__led_animation_wake: Optional[asyncio.Event] = None
+        # closed-loop speed control and the latest correction waiting for the
+        # command in flight (event loop only)
+        self.__speed_controller: Optional[SpeedController] = None
+        self.__speed_command: Optional[float] = None
+        self.__speed_command_task: Optional["asyncio.Task[None]"] = None
+        # futures resolved by the next movement notification (event loop only)
+        self.__movement_waiters: List["asyncio.Future[TrainMsgMovement]"] = []
+
+        # noise filter of the color sensor events
+        self.__color_event_filter: Optional[ColorEventFilter] = None
 
         # rx subscriptions
         self.__subscriptions: List[Disposable] = []
         # user listeners
-        self.__listeners: dict[EventId, dict[Callable, Callable]] = defaultdict(dict)
+        self.__listeners = ListenerRegistry()
+        self.__snap_patterns = SnapPatternIndex()
+        self.__color_sequences = ColorSequenceRecognizers()
+
+        # runtime metrics (also registered process-wide)
+        self.__metrics = TrainMetrics(train.id)
+        REGISTRY.register(self.__metrics)
+
+        # tracing (the process-wide hook is used if not set)
+        self.__trace_hook: Optional[TraceHook] = None
+
+        # awaitable facade sharing this connection and event loop
+        self.__aio = AioTrain(self)
 
-        # connect and setup the train
-        self.__execute(self.__setup())
+        # connection and initial state sync (see connect_nowait)
+        self.__setup_lock = threading.Lock()
+        self.__setup_future: Optional["concurrent.futures.Future[None]"] = None
+        self.__ready = False
+
+        if not lazy:
+            self.connect()
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the train is connected and its state synced."""
+        return self.__ready
+
+    def connect_nowait(self) -> "concurrent.futures.Future[None]":
+        """Start connecting to the train in the background (unless it is
+        connected or connecting already).
+
+        Returns:
+            Future completed when the train is ready. A failed connection is
+            retried by the next call.
+        """
+        with self.__setup_lock:
+            future = self.__setup_future
+            if future is None or (
+                future.done() and (future.cancelled() or future.exception() is not None)
+            ):
+                future = self.__setup_future = self._schedule(
+                    self._traced(self.__setup(), time.monotonic())
+                )
+            return future
+
+    def connect(self, timeout: Optional[float] = None) -> None:
+        """Connect to the train and sync its state (if not done yet). The
+        commands connect a lazy train automatically.
+
+        Args:
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+                The connection continues in the background if it expires.
+
+        Raises:
+            TrainTimeoutError: If the deadline expires.
+        """
+        if self.__ready:
+            return
+        if timeout is None:
+            timeout = self.default_timeout
+
+        future = self.connect_nowait()
+        start = time.perf_counter()
+        try:
+            self.clock.result(future, timeout)
+        except concurrent.futures.TimeoutError:
+            raise TrainTimeoutError(
+                f"Connecting to the train {self.id} timed out!"
+            ) from None
+        finally:
+            self.__metrics.observe_command("setup", time.perf_counter() - start)
 
     async def __setup(self):
         await self.__train.connect()
@@ -80,10 +239,24 @@ class Train:
         movement_stream = await self.__train.movement_notification_stream()
 
         def sync_local_state(msg: TrainMsgMovement):
+            self.__metrics.mark_movement_notification()
             self.__odometer_last = msg.lifetime_odometer_meters
             self.__direction = msg.direction
             self.__speed_cmps = msg.speed_cmps
-            self.__next_split_decision = msg.next_split_decision
+            self.__reconcile_split_decision(msg.next_split_decision)
+            if self.__led_animation_wake is not None:
+                self.__led_animation_wake.set()
+            controller = self.__speed_controller
+            if controller is not None:
+                command = controller.update(abs(msg.speed_cmps), self.clock.time())
+                if command is not None:
+                    self.__request_speed(command)
+
+            if self.__movement_waiters:
+                waiters, self.__movement_waiters = self.__movement_waiters, []
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(msg)
 
         self.__subscriptions.append(movement_stream.subscribe(sync_local_state))
 
@@ -92,39 +265,392 @@ class Train:
             ops.filter(lambda msg: isinstance(msg, get_args(TrainMsgEvent)))
         )
 
-        def handle_event_listeners(msg: TrainMsgEvent):
-            for func in self.__listeners[msg.event_id].values():
+        def record_write(packet: TrainBlePacket):
+            span = _traced_span.get()
+            if span is not None and span.train_id == self.id:
+                span.command_ids.append(packet.command)
+                span.payload_size += len(packet.payload)
+
+        self.__subscriptions.append(self.__train.writes.subscribe(record_write))
+
+        def invalidate_device_state(_connected: bool):
+            # the train resets its settings when it reconnects
+            self.__device_state.invalidate()
+
+        self.__subscriptions.append(
+            self.__train.connection_status.subscribe(invalidate_device_state)
+        )
+
+        def dispatch(msg: TrainMsgEvent):
+            notified = time.perf_counter()
+            notified_monotonic = time.monotonic()
+            listeners = self.__listeners.get(msg.event_id)
+            if isinstance(msg, TrainMsgEventSnapCommandDetected):
+                listeners += self.__snap_patterns.match(msg.colors)
+            for func in listeners:
+                self.__metrics.listener_dispatched()
                 # NOTE: consider using a thread pool to improve performance
-                threading.Thread(target=func, args=(self, msg)).start()
+                threading.Thread(
+                    target=self.__run_listener,
+                    args=(func, msg, notified, notified_monotonic),
+                ).start()
+
+            if self.__color_sequences and isinstance(
+                msg, TrainMsgEventSensorColorChangedBase
+            ):
+                for func, match in self.__color_sequences.feed(msg, self.distance_cm):
+                    self.__metrics.listener_dispatched()
+                    threading.Thread(
+                        target=self.__run_listener,
+                        args=(func, match, notified, notified_monotonic),
+                    ).start()
+
+        def handle_event_listeners(msg: TrainMsgEvent):
+            self.__metrics.mark_event(msg.event_id)
+            if isinstance(msg, TrainMsgEventSplitDecision):
+                self.__split_passed()
+            elif isinstance(msg, TrainMsgEventSnapCommandExecuted):
+                # snap commands may change the top LED color
+                self.__device_state.invalidate(device_state.TOP_LED)
+            color_filter = self.__color_event_filter
+            if color_filter is not None and isinstance(
+                msg, TrainMsgEventSensorColorChangedBase
+            ):
+                color_filter.process(
+                    msg, self.distance_cm, dispatch, self.__event_loop, self.clock
+                )
+            else:
+                dispatch(msg)
 
         self.__subscriptions.append(event_stream.subscribe(handle_event_listeners))
+        self.__ready = True
+
+    def __reconcile_split_decision(self, decision: SteeringDecision):
+        optimistic = self.__optimistic_split_decision
+        if optimistic is not None and decision != optimistic:
+            # the notification may precede the command
+            self.__split_decision_mismatches += 1
+            if self.__split_decision_mismatches < SPLIT_DECISION_RECONCILE_COUNT:
+                return
+        self.__optimistic_split_decision = None
+        self.__next_split_decision = decision
+
+    async def __steer(self, decision: SteeringDecision):
+        await self.__train.set_next_split_steering_decision(decision)
+        self.__next_split_decision = decision
+        self.__optimistic_split_decision = decision
+        self.__split_decision_mismatches = 0
+
+    def __split_passed(self):
+        # the train used (and reset) its decision
+        self.__optimistic_split_decision = None
+        self.__next_split_decision = SteeringDecision.NONE
+        if self.__split_decisions:
+            self.__split_decisions.popleft()
+            if self.__split_decisions:
+                self.__event_loop.create_task(
+                    self._serialized(self.__steer(self.__split_decisions[0]))
+                )
+
+    def __run_listener(
+        self,
+        listener: Callable,
+        msg: TrainMsgEvent,
+        notified: float,
+        notified_monotonic: float,
+    ):
+        self.__metrics.listener_started(time.perf_counter() - notified)
+
+        hook = self.trace_hook
+        span = None
+        if hook is not None:
+            span = TraceSpan(
+                kind="listener",
+                train_id=self.id,
+                name=getattr(listener, "__qualname__", repr(listener)),
+                queued=notified_monotonic,
+                start=time.monotonic(),
+                command_ids=[msg.event_id],
+            )
+            hook.on_start(span)
+
+        try:
+            listener(self, msg)
+        except BaseException as error:
+            if span is not None:
+                span.error = repr(error)
+            raise
+        finally:
+            self.__metrics.listener_finished()
+            if hook is not None and span is not None:
+                span.end = time.monotonic()
+                hook.on_end(span)
+
+    def __execute(
+        self,
+        coroutine: Coroutine[Any, Any, T],
+        timeout: Optional[float] = None,
+        connect: bool = True,
+    ) -> T:
+        command = command_name(coroutine)
+        if timeout is None:
+            timeout = self.default_timeout
+
+        clock = self.clock
+        if connect and not self.__ready:
+            start = clock.time()
+            try:
+                self.connect(timeout)
+            except BaseException:
+                coroutine.close()
+                raise
+            if timeout is not None:
+                timeout = max(0.0, timeout - (clock.time() - start))
+
+        queued = time.monotonic()
+        requested = time.perf_counter()
+        requested_clock = clock.time()
+        if not clock.acquire(self.__lock, timeout):
+            coroutine.close()
+            raise TrainTimeoutError(
+                f"Command '{command}' timed out waiting for the train {self.id}!"
+            )
+
+        try:
+            acquired = time.perf_counter()
+            self.__metrics.observe_lock_wait(acquired - requested)
+            if timeout is not None:
+                timeout = max(0.0, timeout - (clock.time() - requested_clock))
+
+            future = self._schedule(self._serialized(self._traced(coroutine, queued)))
+            try:
+                return clock.result(future, timeout)
+            except concurrent.futures.TimeoutError:
+                # cancels the coroutine on the train's event loop
+                future.cancel()
+                raise TrainTimeoutError(
+                    f"Command '{command}' timed out on the train {self.id}!"
+                ) from None
+            finally:
+                self.__metrics.observe_command(command, time.perf_counter() - acquired)
+        finally:
+            self.__lock.release()
+
+    async def _serialized(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run a command coroutine after the commands submitted before it
+        (blocking or awaitable) finished. The background writes (speed
+        control corrections, LED animation frames and queued split
+        decisions) take their turns the same way."""
+        if self.__command_lock is None:
+            self.__command_lock = asyncio.Lock()
+        try:
+            async with self.__command_lock:
+                return await coroutine
+        finally:
+            # not started if cancelled while waiting
+            coroutine.close()
+
+    def _traced(
+        self, coroutine: Coroutine[Any, Any, T], queued: Optional[float] = None
+    ) -> Coroutine[Any, Any, T]:
+        """Wrap a command coroutine with the trace hook (if there is any)."""
+        hook = self.trace_hook
+        if hook is None:
+            return coroutine
+        return self.__trace_command(hook, coroutine, queued)
+
+    async def __trace_command(
+        self,
+        hook: TraceHook,
+        coroutine: Coroutine[Any, Any, T],
+        queued: Optional[float],
+    ) -> T:
+        start = time.monotonic()
+        span = TraceSpan(
+            kind="command",
+            train_id=self.id,
+            name=command_name(coroutine),
+            queued=start if queued is None else queued,
+            start=start,
+        )
+        hook.on_start(span)
+        token = _traced_span.set(span)
+        try:
+            return await coroutine
+        except BaseException as error:
+            span.error = repr(error)
+            raise
+        finally:
+            # let the pending write notifications reach the span
+            await asyncio.sleep(0)
+            _traced_span.reset(token)
+            span.end = time.monotonic()
+            hook.on_end(span)
+
+    def _schedule(
+        self, coroutine: Coroutine[Any, Any, T]
+    ) -> "concurrent.futures.Future[T]":
+        """Submit a coroutine to the train's event loop without waiting."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__event_loop)
+
+    @property
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        return self.__event_loop
 
-    def __execute(self, coroutine: Coroutine[Any, Any, T], timeout: float = None) -> T:
-        with self.__lock:
-            return asyncio.run_coroutine_threadsafe(
-                coroutine, self.__event_loop
-            ).result(timeout)
+    @property
+    def _async_train(self) -> AsyncTrain:
+        return self.__train
 
     def _add_listener(self, event_id: EventId, listener: Callable):
-        self.__listeners[event_id][listener] = listener
+        self.__listeners.add(event_id, listener)
 
     def _remove_listener(self, event_id: EventId, listener: Callable):
-        self.__listeners[event_id].pop(listener)
+        self.__listeners.remove(event_id, listener)
+
+    def _add_snap_pattern(self, pattern: Sequence, listener: Callable):
+        self.__snap_patterns.add(pattern, listener)
 
-    def disconnect(self):
+    def _remove_snap_pattern(self, pattern: Sequence, listener: Callable):
+        self.__snap_patterns.remove(pattern, listener)
+
+    def _add_color_sequence(self, sequence: ColorSequence, listener: Callable):
+        self.__color_sequences.add(sequence, listener)
+
+    def _remove_color_sequence(self, sequence: ColorSequence, listener: Callable):
+        self.__color_sequences.remove(sequence, listener)
+
+    def disconnect(self, timeout: Optional[float] = None):
         """Disconnects from the train and cleans up all resources.
 
         Reconnection of the same blocking train instance is not possible. Create
         a new instance.
+
+        Args:
+            timeout: Deadline in seconds for the disconnection (defaults to
+                :attr:`default_timeout`). The resources are cleaned up even
+                if it expires.
+
+        Raises:
+            TrainTimeoutError: If the deadline expires.
         """
+        if timeout is None:
+            timeout = self.default_timeout
+        end = None if timeout is None else self.clock.time() + timeout
+
+        with self.__setup_lock:
+            setup = self.__setup_future
+            if setup is not None:
+                # stops a connection still in progress
+                setup.cancel()
+            self.__setup_future = None
+            self.__ready = False
+
         for subscription in self.__subscriptions:
             subscription.dispose()
-        self.__execute(self.__train.disconnect())
 
-        with self.__lock:
+        try:
+            if setup is not None:
+                self.__execute(self._disconnect(), timeout, connect=False)
+        finally:
+            try:
+                # a command still holding the lock past the deadline does
+                # not keep the event loop alive
+                remaining = None if end is None else max(0.0, end - self.clock.time())
+                locked = self.clock.acquire(self.__lock, remaining)
+                try:
+                    self._force_stop()
+                    self.__thread.join()
+                finally:
+                    if locked:
+                        self.__lock.release()
+                self.__event_loop.close()
+            finally:
+                REGISTRY.unregister(self.__metrics)
+
+    def _force_stop(self):
+        """Stop the event loop without waiting for the lock or the running
+        commands (after a disconnection stalled). A pending :meth:`disconnect`
+        then finishes its cleanup."""
+        if not self.__event_loop.is_closed():
             self.__event_loop.call_soon_threadsafe(self.__event_loop.stop)
-            self.__thread.join()
-        self.__event_loop.close()
+
+    @property
+    def _loop_running(self) -> bool:
+        return self.__thread.is_alive()
+
+    async def _disconnect(self):
+        self.__cancel_led_animation()
+        self.__cancel_speed_control()
+        await self.__train.disconnect()
+
+    @property
+    def aio(self) -> AioTrain:
+        """Awaitable API of this train sharing the same connection.
+
+        Example:
+            >>> await train.aio.drive_at_speed(40)
+        """
+        return self.__aio
+
+    @property
+    def trace_hook(self) -> Optional[TraceHook]:
+        """Trace hook of this train or the process-wide one if not set
+        (see :mod:`trainlib.tracing`)."""
+        return self.__trace_hook or get_trace_hook()
+
+    @trace_hook.setter
+    def trace_hook(self, hook: Optional[TraceHook]) -> None:
+        self.__trace_hook = hook
+
+    @property
+    def clock(self) -> Clock:
+        """Clock of the waits and timeouts of this train or the process-wide
+        one if not set (see :mod:`trainlib.clock`)."""
+        return self.__clock or get_clock()
+
+    @clock.setter
+    def clock(self, clock: Optional[Clock]) -> None:
+        self.__clock = clock
+
+    @property
+    def default_timeout(self) -> Optional[float]:
+        """Default deadline in seconds of blocking calls without an explicit
+        ``timeout`` (``None`` waits forever).
+
+        The deadline includes waiting for other commands of this train. When
+        it expires, the command is cancelled and :class:`TrainTimeoutError`
+        is raised.
+        """
+        return self.__default_timeout
+
+    @default_timeout.setter
+    def default_timeout(self, value: Optional[float]) -> None:
+        self.__default_timeout = value
+
+    @property
+    def color_event_filter(self) -> Optional[ColorEventFilter]:
+        """Filter of the color sensor events applied before the listeners
+        are called (``None`` delivers all events).
+
+        Example:
+            >>> train.color_event_filter = ColorEventFilter(
+            ...     min_dwell_s=0.05, min_distance_cm=2
+            ... )
+        """
+        return self.__color_event_filter
+
+    @color_event_filter.setter
+    def color_event_filter(self, value: Optional[ColorEventFilter]) -> None:
+        previous = self.__color_event_filter
+        self.__color_event_filter = value
+        if previous is not None and previous is not value:
+            # drop the events held back by the previous filter
+            self.__event_loop.call_soon_threadsafe(previous.reset)
+
+    @property
+    def metrics(self) -> TrainMetrics:
+        """Runtime metrics of this train (see :mod:`trainlib.metrics`)."""
+        return self.__metrics
 
     @property
     def id(self) -> str:
@@ -145,6 +671,11 @@ class Train:
     def alias(self, value: str) -> None:
         self.__train.alias = value
 
+    @property
+    def adapter(self) -> Optional[str]:
+        """Bluetooth adapter of the connection (``None`` for the default)."""
+        return self.__adapter
+
     @property
     def is_connected(self) -> bool:
         return self.__train.is_connected
@@ -169,14 +700,35 @@ class Train:
     def next_split_decision(self) -> SteeringDecision:
         return self.__next_split_decision
 
-    def send_command(self, command_id: int, payload: Iterable[int] = None) -> None:
-        return self.__execute(self.__train.send_command(command_id, payload))
+    def send_command(
+        self,
+        command_id: int,
+        payload: Iterable[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        return self.__execute(self.__train.send_command(command_id, payload), timeout)
 
     def send_command_with_response(
-        self, command_id: int, payload: Iterable[int] = None, timeout: float = 3.0
+        self,
+        command_id: int,
+        payload: Iterable[int] = None,
+        timeout: float = 3.0,
+        deadline: Optional[float] = None,
     ) -> TrainMsg:
+        """Send a command and wait for the train's response.
+
+        Args:
+            command_id: Command ID.
+            payload: Command payload.
+            timeout: Time in seconds to wait for the response once the command
+                is sent.
+            deadline: Deadline in seconds for the whole call, including the
+                wait for the previous commands (defaults to
+                :attr:`default_timeout`).
+        """
         return self.__execute(
-            self.__train.send_command_with_response(command_id, payload, timeout)
+            self.__train.send_command_with_response(command_id, payload, timeout),
+            deadline,
         ).msg
 
     def drive_at_speed(
@@ -184,6 +736,7 @@ class Train:
         speed_cmps: Union[int, float],
         direction: MovementDirection = MovementDirection.FORWARD,
         play_feedback: bool = True,
+        timeout: Optional[float] = None,
     ) -> None:
         """Drive with speed control at the given speed in cm/s.
 
@@ -193,16 +746,27 @@ class Train:
                 desired speed might get adjusted by the train.
             direction: Movement direction forward, backward, stop etc.
             play_feedback: Sound and lights.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
         """
         return self.__execute(
-            self.__train.drive_at_speed(speed_cmps, direction, play_feedback)
+            self._drive_at_speed(speed_cmps, direction, play_feedback), timeout
         )
 
+    async def _drive_at_speed(
+        self,
+        speed_cmps: Union[int, float],
+        direction: MovementDirection,
+        play_feedback: bool,
+    ):
+        self.__cancel_speed_control()
+        await self.__train.drive_at_speed(speed_cmps, direction, play_feedback)
+
     def drive_at_speed_level(
         self,
         speed_level: SpeedLevel,
         direction: MovementDirection = MovementDirection.FORWARD,
         play_feedback: bool = True,
+        timeout: Optional[float] = None,
     ) -> None:
         """Start driving at a speed level defined by the train (and green snaps).
 
@@ -210,51 +774,312 @@ class Train:
             speed_level: 1, 2, 3.
             direction: Movement direction forward, backward, stop etc.
             play_feedback: Sound and lights.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
         """
         return self.__execute(
-            self.__train.drive_at_speed_level(speed_level, direction, play_feedback)
+            self._drive_at_speed_level(speed_level, direction, play_feedback), timeout
         )
 
+    async def _drive_at_speed_level(
+        self,
+        speed_level: SpeedLevel,
+        direction: MovementDirection,
+        play_feedback: bool,
+    ):
+        self.__cancel_speed_control()
+        await self.__train.drive_at_speed_level(speed_level, direction, play_feedback)
+
     def stop_driving(
         self,
         play_feedback_type: StopDrivingFeedbackType = StopDrivingFeedbackType.MOVEMENT_STOP,
+        timeout: Optional[float] = None,
     ):
         """Stop the train.
 
         Args:
             play_feedback_type: Sound and lights.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+        """
+        return self.__execute(self._stop_driving(play_feedback_type), timeout)
+
+    async def _stop_driving(self, play_feedback_type: StopDrivingFeedbackType):
+        self.__cancel_speed_control()
+        await self.__train.stop_driving(play_feedback_type)
+
+    @property
+    def speed_controller(self) -> Optional[SpeedController]:
+        """The running speed controller (see :mod:`trainlib.speed_control`).
+        Its target can be changed while it runs."""
+        return self.__speed_controller
+
+    def start_speed_control(
+        self, controller: SpeedController, timeout: Optional[float] = None
+    ) -> None:
+        """Drive at the controller's target speed and correct the commanded
+        speed with every movement notification on the train's event loop.
+
+        The control stops with :meth:`stop_speed_control` and with every
+        manual driving command (:meth:`drive_at_speed`,
+        :meth:`drive_at_speed_level` and :meth:`stop_driving`, also through
+        :attr:`aio` and :class:`~intelino.trainlib.fleet.Fleet`), so the
+        controller never overrides them.
+
+        Args:
+            controller: Speed controller (replaces the running one).
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+
+        Example:
+            >>> train.start_speed_control(SpeedController(40))
         """
-        return self.__execute(self.__train.stop_driving(play_feedback_type))
+        self.__execute(self._start_speed_control(controller), timeout)
+
+    async def _start_speed_control(self, controller: SpeedController):
+        self.__cancel_speed_control()
+        command = controller.start(self.clock.time())
+        self.__speed_controller = controller
+        await self.__train.drive_at_speed(command, controller.direction, False)
+
+    def stop_speed_control(self, timeout: Optional[float] = None) -> None:
+        """Stop correcting the speed (the train keeps the last command).
 
-    def set_next_split_steering_decision(self, next_decision: SteeringDecision) -> None:
+        Args:
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+        """
+        self.__execute(self._stop_speed_control(), timeout)
+
+    async def _stop_speed_control(self):
+        self.__cancel_speed_control()
+
+    def __cancel_speed_control(self):
+        if self.__speed_command_task is not None:
+            self.__speed_command_task.cancel()
+        self.__speed_controller = None
+        self.__speed_command = None
+        self.__speed_command_task = None
+
+    def __request_speed(self, command: float):
+        # coalesce: only the latest correction is sent after the one in flight
+        self.__speed_command = command
+        if self.__speed_command_task is None or self.__speed_command_task.done():
+            self.__speed_command_task = self.__event_loop.create_task(
+                self.__send_speed_commands()
+            )
+
+    async def __send_speed_commands(self):
+        while self.__speed_command is not None:
+            command, self.__speed_command = self.__speed_command, None
+            controller = self.__speed_controller
+            if controller is None:
+                return
+            await self._serialized(
+                self.__train.drive_at_speed(command, controller.direction, False)
+            )
+
+    def set_next_split_steering_decision(
+        self,
+        next_decision: SteeringDecision,
+        timeout: Optional[float] = None,
+        wait_for_state: bool = True,
+    ) -> None:
         """This steering decision is valid for the next split (detected by it’s snaps).
 
         It overrides the snap value (if set) or the random choice.
 
         Args:
             next: The next decision.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+            wait_for_state: Wait for a movement notification with the new
+                decision. Otherwise return once the command is written and
+                update :attr:`next_split_decision` optimistically; the
+                following notifications reconcile it.
         """
+        self.__execute(
+            self._set_next_split_steering_decision(next_decision, wait_for_state),
+            timeout,
+        )
 
-        async def helper():
-            await self.__train.set_next_split_steering_decision(next_decision)
-            # wait for the local state to be updated
-            await self.__train.get_movement_notification()
-            await asyncio.sleep(0)
+    async def _set_next_split_steering_decision(
+        self, next_decision: SteeringDecision, wait_for_state: bool = True
+    ):
+        # an explicit decision replaces the queued ones
+        self.__split_decisions.clear()
+        if not wait_for_state:
+            await self.__steer(next_decision)
+            return
+
+        await self.__train.set_next_split_steering_decision(next_decision)
+        self.__optimistic_split_decision = None
+        # wait for the local state to be updated
+        await self.__train.get_movement_notification()
+        await asyncio.sleep(0)
+
+    @property
+    def split_decisions(self) -> Sequence[SteeringDecision]:
+        """Queued decisions of the next splits (see
+        :meth:`queue_split_decisions`)."""
+        return tuple(self.__split_decisions)
+
+    def queue_split_decisions(
+        self, decisions: Iterable[SteeringDecision], timeout: Optional[float] = None
+    ) -> None:
+        """Steer the next splits by a sequence of decisions.
+
+        The decisions are appended to the queue. The first queued decision is
+        set on the train; after every split (the split decision event), the
+        next one is sent from the train's event loop without blocking any
+        caller.
+
+        Args:
+            decisions: Decisions of the upcoming splits in order.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+
+        Example:
+            >>> from intelino.trainlib.enums import SteeringDecision as D
+            >>> # left at the next split, then right, then straight
+            >>> train.queue_split_decisions([D.LEFT, D.RIGHT, D.STRAIGHT])
+        """
+        self.__execute(
+            self._queue_split_decisions([SteeringDecision(d) for d in decisions]),
+            timeout,
+        )
+
+    async def _queue_split_decisions(self, decisions: List[SteeringDecision]):
+        steer = not self.__split_decisions and decisions
+        self.__split_decisions.extend(decisions)
+        if steer:
+            await self.__steer(self.__split_decisions[0])
 
-        self.__execute(helper())
+    def clear_split_decisions(self, timeout: Optional[float] = None) -> None:
+        """Drop the queued split decisions. The decision already set on the
+        train still applies to the next split (the train cannot unset it).
 
-    def set_top_led_color(self, r: int, g: int, b: int) -> None:
+        Args:
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+        """
+        self.__execute(self._clear_split_decisions(), timeout)
+
+    async def _clear_split_decisions(self):
+        self.__split_decisions.clear()
+
+    @property
+    def device_state(self) -> DeviceStateCache:
+        """Cache of the applied device settings with its hit and miss
+        counters (see :mod:`trainlib.device_state`)."""
+        return self.__device_state
+
+    async def __write_through(
+        self, key: str, value: Any, coroutine: Coroutine[Any, Any, T], force: bool
+    ) -> Optional[T]:
+        if not self.__device_state.update(key, value, force):
+            coroutine.close()
+            return None
+        try:
+            return await coroutine
+        except BaseException:
+            self.__device_state.invalidate(key)
+            raise
+
+    def set_top_led_color(
+        self,
+        r: int,
+        g: int,
+        b: int,
+        timeout: Optional[float] = None,
+        force: bool = False,
+    ) -> None:
         """Set the top RGB LED color.
 
         Args:
             r (int): 8bit RGB value for red.
             g (int): 8bit RGB value for green.
             b (int): 8bit RGB value for blue.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+            force: Write the command even if the train has the color already.
+        """
+        return self.__execute(self._set_top_led_color(r, g, b, force), timeout)
+
+    async def _set_top_led_color(self, r: int, g: int, b: int, force: bool = False):
+        await self.__write_through(
+            device_state.TOP_LED,
+            (r, g, b),
+            self.__train.set_top_led_color(r, g, b),
+            force,
+        )
+
+    @property
+    def led_animation(self) -> Optional[LedAnimation]:
+        """The running top LED animation (see :mod:`trainlib.animations`)."""
+        return self.__led_animation
+
+    def start_led_animation(
+        self, animation: LedAnimation, timeout: Optional[float] = None
+    ) -> None:
+        """Run a top LED animation on the train's event loop, replacing the
+        running one.
+
+        Args:
+            animation: Color function of the distance or the time.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+
+        Example:
+            >>> train.start_led_animation(
+            ...     LedAnimation(lambda cm: (0, 0, 255) if cm % 20 < 10 else (0, 0, 0))
+            ... )
+        """
+        self.__execute(self._start_led_animation(animation), timeout)
+
+    async def _start_led_animation(self, animation: LedAnimation):
+        self.__cancel_led_animation()
+        animation.reset()
+        self.__led_animation = animation
+        self.__led_animation_wake = asyncio.Event()
+        self.__led_animation_task = asyncio.get_running_loop().create_task(
+            self.__animate(animation, self.__led_animation_wake)
+        )
+
+    def stop_led_animation(self, timeout: Optional[float] = None) -> None:
+        """Stop the running top LED animation (the LED keeps its color).
+
+        Args:
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
         """
-        return self.__execute(self.__train.set_top_led_color(r, g, b))
+        self.__execute(self._stop_led_animation(), timeout)
+
+    async def _stop_led_animation(self):
+        self.__cancel_led_animation()
+
+    def __cancel_led_animation(self):
+        if self.__led_animation_task is not None:
+            self.__led_animation_task.cancel()
+        self.__led_animation = None
+        self.__led_animation_task = None
+        self.__led_animation_wake = None
+
+    async def __animate(self, animation: LedAnimation, wake: asyncio.Event):
+        clock = self.clock
+        start = clock.time()
+        while True:
+            if animation.by == animations.DISTANCE:
+                # the distance changes with the movement notifications only
+                await wake.wait()
+                wake.clear()
+                x = float(self.distance_cm)
+            else:
+                x = clock.time() - start
+
+            color = animation.frame(x)
+            if color is not None:
+                # sequential writes, so a slow link drops frames instead of
+                # queueing them
+                await self._serialized(self._set_top_led_color(*color))
+            await clock.sleep_async(animation.frame_interval_s)
 
     def set_headlight_color(
-        self, front: Iterable[int] = None, back: Iterable[int] = None
+        self,
+        front: Iterable[int] = None,
+        back: Iterable[int] = None,
+        timeout: Optional[float] = None,
+        force: bool = False,
     ):
         """Set front and back headlight color (for driving). They switch based
             on movement direction. To reset colors call without parameters.
@@ -262,124 +1087,159 @@ class Train:
         Args:
             front: Front 8bit RGB value array [red, green, blue].
             back: Back 8bit RGB value array [red, green, blue].
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+            force: Write the command even if the train has the colors already.
         """
-        return self.__execute(self.__train.set_headlight_color(front, back))
+        return self.__execute(self._set_headlight_color(front, back, force), timeout)
 
-    def set_snap_command_feedback(self, sound: bool, lights: bool):
+    async def _set_headlight_color(
+        self,
+        front: Iterable[int] = None,
+        back: Iterable[int] = None,
+        force: bool = False,
+    ):
+        # the colors are padded to 3 values like the command does
+        front = None if front is None else tuple([*front, 0, 0, 0][:3])
+        back = None if back is None else tuple([*back, 0, 0, 0][:3])
+        await self.__write_through(
+            device_state.HEADLIGHT,
+            (front, back),
+            self.__train.set_headlight_color(front, back),
+            force,
+        )
+
+    def set_snap_command_feedback(
+        self,
+        sound: bool,
+        lights: bool,
+        timeout: Optional[float] = None,
+        force: bool = False,
+    ):
         """Set snap command behavior feedback.
 
         Args:
             sound (bool): Sounds on/off.
             lights (bool): Blink top LED on/off.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+            force: Write the command even if the train has the setting already.
         """
         return self.__execute(
-            self.__train.set_snap_command_feedback(sound, lights)
+            self._set_snap_command_feedback(sound, lights, force), timeout
+        )
+
+    async def _set_snap_command_feedback(
+        self, sound: bool, lights: bool, force: bool = False
+    ):
+        await self.__write_through(
+            device_state.SNAP_COMMAND_FEEDBACK,
+            (bool(sound), bool(lights)),
+            self.__train.set_snap_command_feedback(sound, lights),
+            force,
         )
 
-    def set_snap_command_execution(self, on: bool):
+    def set_snap_command_execution(
+        self, on: bool, timeout: Optional[float] = None, force: bool = False
+    ):
         """Enable or disable snap command execution on the train (from BLE API v1.2).
 
         Args:
             on (bool): Snap command execution on/off.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+            force: Write the command even if the train has the setting already.
         """
-        return self.__execute(self.__train.set_snap_command_execution(on))
+        return self.__execute(self._set_snap_command_execution(on, force), timeout)
+
+    async def _set_snap_command_execution(self, on: bool, force: bool = False):
+        await self.__write_through(
+            device_state.SNAP_COMMAND_EXECUTION,
+            bool(on),
+            self.__train.set_snap_command_execution(on),
+            force,
+        )
 
-    def clear_custom_snap_commands(self):
+    def clear_custom_snap_commands(self, timeout: Optional[float] = None):
         """Clear user defined custom snap commands stored in the train to avoid
         collisions in behavior in case we would listen and react to these
         events.
-        """
-        return self.__execute(self.__train.clear_custom_snap_commands())
-
-    def decouple_wagon(self, play_feedback: bool = True):
-        """Decouple wagon.
 
         Args:
-            play_feedback: Sound and lights.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
         """
+        return self.__execute(self.__train.clear_custom_snap_commands(), timeout)
 
-        async def helper():
-            await self.__train.decouple_wagon(play_feedback)
-            await asyncio.sleep(1.5)
-
-        return self.__execute(helper())
-
-    def add_movement_direction_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventMovementDirectionChanged], None]
-    ):
-        self._add_listener(EventId.MOVEMENT_DIRECTION_CHANGED, listener)
-
-    def remove_movement_direction_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventMovementDirectionChanged], None]
-    ):
-        self._remove_listener(EventId.MOVEMENT_DIRECTION_CHANGED, listener)
-
-    def add_low_battery_listener(
-        self, listener: Callable[["Train", TrainMsgEventLowBattery], None]
+    def decouple_wagon(
+        self, play_feedback: bool = True, timeout: Optional[float] = None
     ):
-        self._add_listener(EventId.LOW_BATTERY, listener)
+        """Decouple wagon and wait until it is released.
 
-    def remove_low_battery_listener(
-        self, listener: Callable[["Train", TrainMsgEventLowBattery], None]
-    ):
-        self._remove_listener(EventId.LOW_BATTERY, listener)
-
-    def add_button_press_listener(
-        self, listener: Callable[["Train", TrainMsgEventButtonPressDetected], None]
-    ):
-        self._add_listener(EventId.BUTTON_PRESS_DETECTED, listener)
+        Other commands (e.g. :meth:`stop_driving` from a listener) can be sent
+        to the train while the wagon is being released.
 
-    def remove_button_press_listener(
-        self, listener: Callable[["Train", TrainMsgEventButtonPressDetected], None]
-    ):
-        self._remove_listener(EventId.BUTTON_PRESS_DETECTED, listener)
-
-    def add_snap_command_detection_listener(
-        self, listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None]
-    ):
-        self._add_listener(EventId.SNAP_COMMAND_DETECTED, listener)
-
-    def remove_snap_command_detection_listener(
-        self, listener: Callable[["Train", TrainMsgEventSnapCommandDetected], None]
-    ):
-        self._remove_listener(EventId.SNAP_COMMAND_DETECTED, listener)
-
-    def add_snap_command_execution_listener(
-        self, listener: Callable[["Train", TrainMsgEventSnapCommandExecuted], None]
-    ):
-        self._add_listener(EventId.SNAP_COMMAND_EXECUTED, listener)
-
-    def remove_snap_command_execution_listener(
-        self, listener: Callable[["Train", TrainMsgEventSnapCommandExecuted], None]
-    ):
-        self._remove_listener(EventId.SNAP_COMMAND_EXECUTED, listener)
-
-    def add_front_color_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventFrontColorChanged], None]
-    ):
-        self._add_listener(EventId.FRONT_COLOR_CHANGED, listener)
-
-    def remove_front_color_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventFrontColorChanged], None]
-    ):
-        self._remove_listener(EventId.FRONT_COLOR_CHANGED, listener)
+        Args:
+            play_feedback: Sound and lights.
+            timeout: Deadline in seconds (defaults to :attr:`default_timeout`).
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+
+        clock = self.clock
+        start = clock.time()
+        future = self.decouple_wagon_nowait(play_feedback, timeout=timeout)
+        if timeout is not None:
+            timeout = max(0.0, timeout - (clock.time() - start))
+        try:
+            clock.result(future, timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TrainTimeoutError(
+                f"Command 'decouple_wagon' timed out on the train {self.id}!"
+            ) from None
+
+    def decouple_wagon_nowait(
+        self,
+        play_feedback: bool = True,
+        release_s: float = DECOUPLE_RELEASE_S,
+        confirm_timeout_s: float = 0.5,
+        timeout: Optional[float] = None,
+    ) -> "concurrent.futures.Future[Optional[TrainMsgMovement]]":
+        """Decouple wagon without waiting for the release.
 
-    def add_back_color_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventBackColorChanged], None]
-    ):
-        self._add_listener(EventId.BACK_COLOR_CHANGED, listener)
+        The method returns once the command is written. The returned future
+        completes with the first movement notification after the release time
+        (confirming the train's state after decoupling), or with ``None`` if
+        no notification arrives within ``confirm_timeout_s``.
 
-    def remove_back_color_change_listener(
-        self, listener: Callable[["Train", TrainMsgEventBackColorChanged], None]
-    ):
-        self._remove_listener(EventId.BACK_COLOR_CHANGED, listener)
+        Args:
+            play_feedback: Sound and lights.
+            release_s: Time the wagon magnet needs to release the wagon.
+            confirm_timeout_s: Maximum wait for the confirming notification
+                after the release time.
+            timeout: Deadline in seconds of the command write (defaults to
+                :attr:`default_timeout`).
+
+        Example:
+            >>> released = train.decouple_wagon_nowait()
+            >>> train.drive_at_speed(30)  # not blocked by the decoupling
+            >>> released.result()
+        """
+        self.__execute(self.__train.decouple_wagon(play_feedback), timeout)
+        return self._schedule(self._wagon_released(release_s, confirm_timeout_s))
 
-    def add_split_decision_listener(
-        self, listener: Callable[["Train", TrainMsgEventSplitDecision], None]
-    ):
-        self._add_listener(EventId.SPLIT_DECISION, listener)
+    async def _wagon_released(
+        self, release_s: float = DECOUPLE_RELEASE_S, confirm_timeout_s: float = 0.5
+    ) -> Optional[TrainMsgMovement]:
+        clock = self.clock
+        await clock.sleep_async(release_s)
 
-    def remove_split_decision_listener(
-        self, listener: Callable[["Train", TrainMsgEventSplitDecision], None]
-    ):
-        self._remove_listener(EventId.SPLIT_DECISION, listener)
+        waiter: "asyncio.Future[TrainMsgMovement]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.__movement_waiters.append(waiter)
+        # the deadline is a sleep (not a timeout) so that it also passes on a
+        # virtual clock advancing by itself
+        deadline = asyncio.ensure_future(clock.sleep_async(confirm_timeout_s))
+        try:
+            await asyncio.wait({waiter, deadline}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            deadline.cancel()
+        return waiter.result() if waiter.done() else None
@@ -0,0 +1,253 @@
+# Copyright 2021 Innokind, Inc. DBA Intelino
+#
+# Licensed under the Intelino Public License Agreement, Version 1.0 located at
+# https://intelino.com/intelino-public-license.
+# BY INSTALLING, DOWNLOADING, ACCESSING, USING OR DISTRIBUTING ANY OF
+# THE SOFTWARE, YOU AGREE TO THE TERMS OF SUCH LICENSE AGREEMENT.
+
+"""Awaitable facade of the synchronous (blocking) train class."""
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Coroutine, Iterable, TypeVar, Union
+
+from .enums import (
+    MovementDirection,
+    SteeringDecision,
+    SpeedLevel,
+    StopDrivingFeedbackType,
+)
+from .errors import TrainTimeoutError
+from .messages import TrainMsg
+from .metrics import command_name
+
+if TYPE_CHECKING:
+    from .animations import LedAnimation
+    from .speed_control import SpeedController
+    from .train import Train
+
+
+T = TypeVar("T")
+
+
+class AioTrain:
+    """Awaitable API of a connected blocking :class:`Train`.
+
+    It shares the connection, the event loop and the local state of the
+    blocking train, so asyncio code can control the same train without
+    opening a second connection or calling blocking methods from an executor::
+
+        train = TrainScanner().get_train()
+        await train.aio.drive_at_speed(40)
+
+    The commands always run on the train's event loop. When awaited from that
+    loop they are awaited directly, otherwise they are awaited from the
+    caller's loop through a thread-safe future. The train's
+    :attr:`Train.default_timeout` applies to them as well.
+
+    The awaitable and the blocking commands of a train, and the writes of its
+    background tasks (speed control, LED animations, queued split
+    decisions), run one at a time in the order they reach the train's event
+    loop, so a command never interleaves with another one.
+    """
+
+    def __init__(self, train: "Train"):
+        self.__train = train
+
+    async def __run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        command = command_name(coroutine)
+        start = time.perf_counter()
+        coroutine = self.__train._serialized(self.__train._traced(coroutine))
+        clock = self.__train.clock
+        timeout = self.__train.default_timeout
+        try:
+            if not self.__train.is_ready:
+                connect_start = clock.time()
+                try:
+                    # shielded: the connection continues in the background
+                    # on timeout (like Train.connect)
+                    await clock.wait_for(
+                        asyncio.shield(
+                            asyncio.wrap_future(self.__train.connect_nowait())
+                        ),
+                        timeout,
+                    )
+                except BaseException:
+                    coroutine.close()
+                    raise
+                if timeout is not None:
+                    timeout = max(0.0, timeout - (clock.time() - connect_start))
+
+            if asyncio.get_running_loop() is self.__train._event_loop:
+                awaitable: Awaitable[T] = coroutine
+            else:
+                awaitable = asyncio.wrap_future(self.__train._schedule(coroutine))
+
+            return await clock.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise TrainTimeoutError(
+                f"Command '{command}' timed out on the train {self.id}!"
+            ) from None
+        finally:
+            self.__train.metrics.observe_command(command, time.perf_counter() - start)
+
+    @property
+    def train(self) -> "Train":
+        """The blocking train sharing this connection."""
+        return self.__train
+
+    @property
+    def id(self) -> str:
+        """Connection ID / address."""
+        return self.__train.id
+
+    @property
+    def name(self) -> str:
+        """Advertised name."""
+        return self.__train.name
+
+    @property
+    def is_connected(self) -> bool:
+        return self.__train.is_connected
+
+    @property
+    def distance_cm(self) -> int:
+        return self.__train.distance_cm
+
+    @property
+    def direction(self) -> MovementDirection:
+        return self.__train.direction
+
+    @property
+    def speed_cmps(self) -> float:
+        return self.__train.speed_cmps
+
+    @property
+    def next_split_decision(self) -> SteeringDecision:
+        return self.__train.next_split_decision
+
+    async def send_command(self, command_id: int, payload: Iterable[int] = None):
+        return await self.__run(
+            self.__train._async_train.send_command(command_id, payload)
+        )
+
+    async def send_command_with_response(
+        self, command_id: int, payload: Iterable[int] = None, timeout: float = 3.0
+    ) -> TrainMsg:
+        packet = await self.__run(
+            self.__train._async_train.send_command_with_response(
+                command_id, payload, timeout
+            )
+        )
+        return packet.msg
+
+    async def drive_at_speed(
+        self,
+        speed_cmps: Union[int, float],
+        direction: MovementDirection = MovementDirection.FORWARD,
+        play_feedback: bool = True,
+    ):
+        """See :meth:`Train.drive_at_speed`."""
+        return await self.__run(
+            self.__train._drive_at_speed(speed_cmps, direction, play_feedback)
+        )
+
+    async def drive_at_speed_level(
+        self,
+        speed_level: SpeedLevel,
+        direction: MovementDirection = MovementDirection.FORWARD,
+        play_feedback: bool = True,
+    ):
+        """See :meth:`Train.drive_at_speed_level`."""
+        return await self.__run(
+            self.__train._drive_at_speed_level(speed_level, direction, play_feedback)
+        )
+
+    async def stop_driving(
+        self,
+        play_feedback_type: StopDrivingFeedbackType = StopDrivingFeedbackType.MOVEMENT_STOP,
+    ):
+        """See :meth:`Train.stop_driving`."""
+        return await self.__run(self.__train._stop_driving(play_feedback_type))
+
+    async def start_speed_control(self, controller: "SpeedController"):
+        """See :meth:`Train.start_speed_control`."""
+        return await self.__run(self.__train._start_speed_control(controller))
+
+    async def stop_speed_control(self):
+        """See :meth:`Train.stop_speed_control`."""
+        return await self.__run(self.__train._stop_speed_control())
+
+    async def set_next_split_steering_decision(
+        self, next_decision: SteeringDecision, wait_for_state: bool = True
+    ):
+        """See :meth:`Train.set_next_split_steering_decision`."""
+        return await self.__run(
+            self.__train._set_next_split_steering_decision(
+                next_decision, wait_for_state
+            )
+        )
+
+    async def queue_split_decisions(self, decisions: Iterable[SteeringDecision]):
+        """See :meth:`Train.queue_split_decisions`."""
+        return await self.__run(self.__train._queue_split_decisions(list(decisions)))
+
+    async def clear_split_decisions(self):
+        """See :meth:`Train.clear_split_decisions`."""
+        return await self.__run(self.__train._clear_split_decisions())
+
+    async def set_top_led_color(self, r: int, g: int, b: int, force: bool = False):
+        """See :meth:`Train.set_top_led_color`."""
+        return await self.__run(self.__train._set_top_led_color(r, g, b, force))
+
+    async def start_led_animation(self, animation: "LedAnimation"):
+        """See :meth:`Train.start_led_animation`."""
+        return await self.__run(self.__train._start_led_animation(animation))
+
+    async def stop_led_animation(self):
+        """See :meth:`Train.stop_led_animation`."""
+        return await self.__run(self.__train._stop_led_animation())
+
+    async def set_headlight_color(
+        self,
+        front: Iterable[int] = None,
+        back: Iterable[int] = None,
+        force: bool = False,
+    ):
+        """See :meth:`Train.set_headlight_color`."""
+        return await self.__run(self.__train._set_headlight_color(front, back, force))
+
+    async def set_snap_command_feedback(
+        self, sound: bool, lights: bool, force: bool = False
+    ):
+        """See :meth:`Train.set_snap_command_feedback`."""
+        return await self.__run(
+            self.__train._set_snap_command_feedback(sound, lights, force)
+        )
+
+    async def set_snap_command_execution(self, on: bool, force: bool = False):
+        """See :meth:`Train.set_snap_command_execution`."""
+        return await self.__run(self.__train._set_snap_command_execution(on, force))
+
+    async def clear_custom_snap_commands(self):
+        """See :meth:`Train.clear_custom_snap_commands`."""
+        return await self.__run(self.__train._async_train.clear_custom_snap_commands())
+
+    async def decouple_wagon(self, play_feedback: bool = True):
+        """See :meth:`Train.decouple_wagon`."""
+        clock = self.__train.clock
+        timeout = self.__train.default_timeout
+        start = clock.time()
+        await self.__run(self.__train._async_train.decouple_wagon(play_feedback))
+        if timeout is not None:
+            timeout = max(0.0, timeout - (clock.time() - start))
+
+        # the release is awaited outside of the command order, so other
+        # commands (e.g. stop_driving) are not blocked meanwhile
+        released = self.__train._schedule(self.__train._wagon_released())
+        try:
+            await clock.wait_for(asyncio.wrap_future(released), timeout)
+        except asyncio.TimeoutError:
+            raise TrainTimeoutError(
+                f"Command 'decouple_wagon' timed out on the train {self.id}!"
+            ) from None
@@ -8,14 +8,119 @@
 """Simplified train scanning and instantiation."""
 
 import asyncio
-from typing import List
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import weakref
 
+from intelino.trainlib_async import Train as AsyncTrain
+from intelino.trainlib_async.drivers.bleak_driver import BleakDriver
+from intelino.trainlib_async.train_ble_device import TrainBleDevice
 from intelino.trainlib_async.train_factory import TrainFactory
 
+from .clock import Clock
 from .train import Train
 from .exc import TrainNotFoundError
 
 
+# trains connected through the scanner, for balancing the adapters
+_scanned_trains: "weakref.WeakSet[Train]" = weakref.WeakSet()
+
+# factory of the discovered async trains (see set_train_factory)
+_factory: Any = TrainFactory
+
+
+def set_train_factory(factory: Any) -> Any:
+    """Replace the factory creating the discovered trains, e.g. with a
+    :class:`~intelino.trainlib.simulator.Simulator`.
+
+    The factory implements the ``create_train`` and ``create_trains``
+    coroutines of :class:`TrainFactory`.
+
+    Returns:
+        The previous factory.
+    """
+    global _factory
+    previous = _factory
+    _factory = factory
+    return previous
+
+
+def adapter_connections() -> Dict[Optional[str], int]:
+    """Current number of connected trains per Bluetooth adapter (``None`` is
+    the default adapter)."""
+    return Counter(
+        train.adapter for train in list(_scanned_trains) if train.is_connected
+    )
+
+
+async def _discover(
+    create: Callable[..., Awaitable[Any]], adapters: List[Optional[str]], **kwargs
+) -> List[Tuple[AsyncTrain, Optional[str]]]:
+    """Run the discovery on all adapters at once, merge the trains found by
+    address and assign each one to the least loaded adapter that sees it."""
+    results = await asyncio.gather(
+        *(
+            create(**kwargs, **({"adapter": adapter} if adapter else {}))
+            for adapter in adapters
+        ),
+        return_exceptions=True,
+    )
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+
+    found: Dict[str, Tuple[AsyncTrain, List[Optional[str]]]] = {}
+    for adapter, result in zip(adapters, results):
+        if result is None or isinstance(result, BaseException):
+            continue
+        for train in result if isinstance(result, list) else [result]:
+            found.setdefault(train.id, (train, []))[1].append(adapter)
+
+    load = adapter_connections()
+    assigned = []
+    for train, seen_by in found.values():
+        adapter = min(seen_by, key=lambda a: load[a])
+        load[adapter] += 1
+        assigned.append((train, adapter))
+
+    return assigned
+
+
+def _adapters(kwargs: Dict[str, Any]) -> List[Optional[str]]:
+    adapter = kwargs.pop("adapter", None)
+    if adapter is None or isinstance(adapter, str):
+        return [adapter]
+    return list(dict.fromkeys(adapter))
+
+
+def _bind_adapter(train: AsyncTrain, adapter: Optional[str]) -> AsyncTrain:
+    """Train connecting through the adapter.
+
+    Bleak assigns the adapter of a client when creating it (not when
+    connecting), and the factory creates the discovered trains for the
+    default adapter, so a train assigned to another adapter gets a new client.
+    Trains of other factories are returned as they are.
+    """
+    driver = getattr(getattr(train, "_device", None), "_driver", None)
+    if adapter is None or not isinstance(driver, BleakDriver):
+        return train
+    driver = BleakDriver(train.id, train.name, bluez={"adapter": adapter})
+    return AsyncTrain(TrainBleDevice(driver))
+
+
+def _connect(
+    train: AsyncTrain,
+    adapter: Optional[str],
+    clock: Optional[Clock] = None,
+    lazy: bool = False,
+) -> Train:
+    train = _bind_adapter(train, adapter)
+    blocking_train = Train(train, adapter=adapter, clock=clock, lazy=lazy)
+    _scanned_trains.add(blocking_train)
+    return blocking_train
+
+
 class TrainScanner:
     """Obtaining a :class:`Train` object using the ``with`` statement.
 
@@ -30,9 +135,21 @@ class TrainScanner:
         for train in trains:
             train.drive_at_speed(40)
 
+    Listing trains fast and connecting to them in the background::
+
+        trains = TrainScanner(lazy=True).get_trains()
+        for train in trains:
+            train.connect_nowait()
+
     """
 
-    def __init__(self, device_identifier: str = None, timeout: float = 5.0):
+    def __init__(
+        self,
+        device_identifier: str = None,
+        timeout: float = 5.0,
+        clock: Optional[Clock] = None,
+        lazy: bool = False,
+    ):
         """
         Args:
             device_identifier (str): The Bluetooth/UUID address of the Bluetooth
@@ -40,9 +157,15 @@ class TrainScanner:
                 found intelino train.
             timeout (float): Optional timeout to wait for detection of specified
                 peripheral before giving up. Defaults to 5.0 seconds.
+            clock (Clock): Clock of the waits and timeouts of the trains.
+                Defaults to the process-wide clock (see :mod:`trainlib.clock`).
+            lazy (bool): Return the trains without connecting to them; they
+                connect on first use (see :meth:`Train.connect_nowait`).
         """
         self.device_identifier = device_identifier
         self.timeout = timeout
+        self.clock = clock
+        self.lazy = lazy
 
     # Synchronous (blocking) Context managers
 
@@ -57,7 +180,10 @@ class TrainScanner:
         """Get a blocking train instance synchronously.
 
         Keyword Args:
-            adapter (str): Bluetooth adapter to use for discovery.
+            adapter (str or list): Bluetooth adapter(s) to use for discovery.
+                With several adapters, the discovery runs on all of them at
+                once and the train is connected through the one with the
+                fewest connected trains.
 
         Raises:
             TrainNotFoundError: If no train is found.
@@ -65,8 +191,11 @@ class TrainScanner:
         Returns:
             A connected :class:`Train` instance.
         """
-        train = asyncio.run(
-            TrainFactory.create_train(
+        adapters = _adapters(kwargs)
+        trains = asyncio.run(
+            _discover(
+                _factory.create_train,
+                adapters,
                 device_identifier=kwargs.pop(
                     "device_identifier", self.device_identifier
                 ),
@@ -76,10 +205,10 @@ class TrainScanner:
             )
         )
 
-        if train is None:
+        if not trains:
             raise TrainNotFoundError("Train not found!")
 
-        return Train(train)
+        return _connect(*trains[0], self.clock, self.lazy)
 
     def get_trains(self, count: int = None, **kwargs) -> List[Train]:
         """Get a list of blocking train instances synchronously.
@@ -92,7 +221,10 @@ class TrainScanner:
         Keyword Args:
             at_most (int): Connect to at most N trains. No exception is raised
                 if the `count` argument is omitted.
-            adapter (str): Bluetooth adapter to use for discovery.
+            adapter (str or list): Bluetooth adapter(s) to use for discovery.
+                With several adapters, the discovery runs on all of them at
+                once, duplicates are merged by address and the connections
+                are spread across the adapters by their connection count.
 
         Raises:
             TrainNotFoundError: If the requested number of trains is not found.
@@ -107,20 +239,31 @@ class TrainScanner:
             >>> trains = TrainScanner(timeout=3.0).get_trains(2)
             >>> # connect to 0 - 4 trains within 10 seconds
             >>> trains = TrainScanner(timeout=10.0).get_trains(at_most=4)
+            >>> # discover on two adapters and balance the connections
+            >>> trains = TrainScanner().get_trains(adapter=["hci0", "hci1"])
 
         """
+        adapters = _adapters(kwargs)
+        limit = kwargs.pop("count", kwargs.pop("at_most", count))
         trains = asyncio.run(
-            TrainFactory.create_trains(
-                count=kwargs.pop("count", kwargs.pop("at_most", count)),
+            _discover(
+                _factory.create_trains,
+                adapters,
+                count=limit,
                 timeout=kwargs.pop("timeout", self.timeout),
                 connect=False,
                 **kwargs,
             )
         )
+        if limit:
+            # every adapter stops at the limit, the merged list may be longer
+            trains = trains[:limit]
 
         if count and (len(trains) != count):
             raise TrainNotFoundError(
                 f"Could not find all the requested trains (got {len(trains)} instead of {count})!"
             )
 
-        return list(map(Train, trains))
+        return [
+            _connect(train, adapter, self.clock, self.lazy) for train, adapter in trains
+        ]